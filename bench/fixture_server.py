@@ -0,0 +1,343 @@
+"""Serveur http local qui simule un catalogue de livres au format de books.toscrape.com,
+utilisé par les benchmarks pour mesurer les performances sans accès au réseau
+
+Utilisation :
+    python bench/fixture_server.py --books 1000 --latency 0.05
+"""
+import argparse
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STARS = ('One', 'Two', 'Three', 'Four', 'Five')
+WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit',
+         'sed', 'do', 'eiusmod', 'tempor', 'incididunt', 'ut', 'labore', 'magna')
+
+
+def category_slug(name, index):
+    """Renvoie le répertoire de la catégorie dans l'url (ex: travel_2)
+
+    Args:
+        name (str): nom de la catégorie
+        index (int): position de la catégorie
+
+    Returns:
+        str: répertoire de la catégorie
+    """
+    return f"{name.lower().replace(' ', '-')}_{index+2}"
+
+
+def render_listing(books, nb_results, prefix, num_page, nb_pages, side_categories):
+    """Renvoie le html d'une page de liste
+
+    Args:
+        books (list[dict]): livres de la page
+        nb_results (int): nombre total de livres de la liste (affiché comme sur le site)
+        prefix (str): préfixe relatif des liens vers les pages livres
+        num_page (int): numéro de la page
+        nb_pages (int): nombre de pages de la liste
+        side_categories (str): html du menu des catégories
+
+    Returns:
+        str: html de la page
+    """
+    items = ''.join(f'''
+    <li class="col-xs-6 col-sm-4 col-md-3 col-lg-3">
+      <article class="product_pod">
+        <div class="image_container"><a href="{prefix}{b['slug']}/index.html"><img src="{prefix}../{b['image']}" class="thumbnail"></a></div>
+        <p class="star-rating {b['stars']}"><i class="icon-star"></i></p>
+        <h3><a href="{prefix}{b['slug']}/index.html" title="{b['title']}">{b['title']}</a></h3>
+        <div class="product_price">
+          <p class="price_color">£{b['price']:.2f}</p>
+          <p class="instock availability"><i class="icon-ok"></i>
+            {'In stock' if b['stock'] else 'Out of stock'}
+          </p>
+        </div>
+      </article>
+    </li>''' for b in books)
+    pager = f'''<ul class="pager"><li class="current">
+            Page {num_page} of {nb_pages}
+        </li></ul>''' if nb_pages > 1 else ''
+    return f'''<!DOCTYPE html>
+<html lang="en-us"><head><meta charset="utf-8"><title>All products | Books to Scrape</title></head>
+<body><div class="container-fluid page"><div class="row">
+<aside class="sidebar col-sm-4 col-md-3"><div class="side_categories"><ul class="nav nav-list">
+<li><a href="{prefix}category/books_1/index.html">Books</a><ul>{side_categories}</ul></li></ul></div></aside>
+<div class="col-sm-8 col-md-9"><form class="form-horizontal"><strong>{nb_results}</strong> results.</form>
+<section><ol class="row">{items}</ol><div>{pager}</div></section></div></div></div></body></html>'''
+
+
+def render_product(book):
+    """Renvoie le html de la page d'un livre
+
+    Args:
+        book (dict): le livre
+
+    Returns:
+        str: html de la page
+    """
+    return f'''<!DOCTYPE html>
+<html lang="en-us"><head><meta charset="utf-8"><title>{book['title']} | Books to Scrape</title></head>
+<body><div class="container-fluid page"><div class="page_inner">
+<ul class="breadcrumb">
+  <li><a href="../../index.html">Home</a></li>
+  <li><a href="../category/books_1/index.html">Books</a></li>
+  <li><a href="../category/books/{book['category_slug']}/index.html">{book['category']}</a></li>
+  <li class="active">{book['title']}</li>
+</ul>
+<article class="product_page">
+  <div class="row">
+    <div class="col-sm-6"><div id="product_gallery" class="carousel"><div class="thumbnail"><div class="carousel-inner">
+      <div class="item active"><img src="../../{book['image']}" alt="{book['title']}" /></div>
+    </div></div></div></div>
+    <div class="col-sm-6 product_main">
+      <h1>{book['title']}</h1>
+      <p class="price_color">£{book['price']:.2f}</p>
+      <p class="instock availability"><i class="icon-ok"></i> In stock ({book['stock']} available)</p>
+      <p class="star-rating {book['stars']}"><i class="icon-star"></i></p>
+      <hr/>
+      <div class="alert alert-warning" role="alert"><strong>Warning!</strong> This is a demo website.</div>
+    </div>
+  </div>
+  <div id="product_description" class="sub-header"><h2>Product Description</h2></div>
+  <p>{book['description']}</p>
+  <div class="sub-header"><h2>Product Information</h2></div>
+  <table class="table table-striped">
+    <tr><th>UPC</th><td>{book['upc']}</td></tr>
+    <tr><th>Product Type</th><td>Books</td></tr>
+    <tr><th>Price (excl. tax)</th><td>£{book['price']:.2f}</td></tr>
+    <tr><th>Price (incl. tax)</th><td>£{book['price']:.2f}</td></tr>
+    <tr><th>Tax</th><td>£0.00</td></tr>
+    <tr><th>Availability</th><td>In stock ({book['stock']} available)</td></tr>
+    <tr><th>Number of reviews</th><td>0</td></tr>
+  </table>
+</article></div></div></body></html>'''
+
+
+def build_catalogue(nb_books=1000, nb_categories=50, page_size=20, image_size=20000, seed=0):
+    """Génère un catalogue synthétique et renvoie toutes ses pages
+
+    Args:
+        nb_books (int, optional): nombre de livres. Defaults to 1000.
+        nb_categories (int, optional): nombre de catégories. Defaults to 50.
+        page_size (int, optional): nombre de livres par page de liste. Defaults to 20.
+        image_size (int, optional): taille des images en octets. Defaults to 20000.
+        seed (int, optional): graine du générateur aléatoire. Defaults to 0.
+
+    Returns:
+        dict: contenu de chaque page {chemin: bytes}
+    """
+    rnd = random.Random(seed)
+    categories = [f'Category {i}' for i in range(max(1, nb_categories))]
+    books = []
+    for i in range(nb_books):
+        index = i % len(categories)
+        books.append({
+            'slug': f'book-{i}_{i+1}',
+            'title': f'Book number {i}',
+            'upc': hashlib.md5(str(i).encode()).hexdigest()[:16],
+            'price': round(rnd.uniform(10, 60), 2),
+            'stock': rnd.randint(1, 30),
+            'stars': rnd.choice(STARS),
+            'category': categories[index],
+            'category_slug': category_slug(categories[index], index),
+            'image': f'media/cache/{i % 256:02x}/{i:06d}.jpg',
+            'description': ' '.join(rnd.choice(WORDS) for _ in range(150)),
+        })
+
+    pages = {}
+    side = ''.join(f'<li><a href="CATEGORY_PREFIXcategory/books/{category_slug(c, i)}/index.html">'
+                   f'\n {c}\n</a></li>' for i, c in enumerate(categories))
+
+    def add_listing(list_book, base, prefix, side_prefix, first_page_names):
+        nb_pages = max(1, -(-len(list_book)//page_size))
+        for num in range(nb_pages):
+            html = render_listing(list_book[num*page_size:(num+1)*page_size], len(list_book),
+                                  prefix, num+1, nb_pages,
+                                  side.replace('CATEGORY_PREFIX', side_prefix))
+            names = first_page_names if num == 0 else [f'page-{num+1}.html']
+            for name in names:
+                pages[base+name] = html.encode()
+
+    add_listing(books, '/catalogue/', '', '', ['page-1.html'])
+    pages['/'] = render_listing(books[:page_size], len(books), 'catalogue/', 1,
+                                max(1, -(-len(books)//page_size)),
+                                side.replace('CATEGORY_PREFIX', 'catalogue/')).encode()
+    pages['/index.html'] = pages['/']
+    for i, c in enumerate(categories):
+        add_listing([b for b in books if b['category'] == c],
+                    f'/catalogue/category/books/{category_slug(c, i)}/', '../../../',
+                    '../../', ['index.html'])
+    for book in books:
+        pages[f"/catalogue/{book['slug']}/index.html"] = render_product(book).encode()
+        pages['/'+book['image']] = (rnd.getrandbits(8*image_size).to_bytes(image_size, 'big')
+                                    if image_size else b'')
+    return pages
+
+
+class FixtureServer():
+    """Serveur http local (dans un thread) qui sert les pages d'un catalogue synthétique,
+    avec une latence ajoutée à chaque requête et la gestion des ETag (réponses 304).
+    Le serveur peut aussi limiter son débit (réponses 429 avec Retry-After au-delà de
+    {rate_limit} requêtes par seconde) et publier un crawl-delay dans son robots.txt
+    """
+    def __init__(self, pages, port=0, latency=0.0, rate_limit=0.0, crawl_delay=0.0):
+        self.pages = dict(pages)
+        if crawl_delay:
+            #robotparser ne lit que les crawl-delay entiers : les délais courts sont publiés
+            #sous forme de Request-rate (requêtes/secondes)
+            if crawl_delay == int(crawl_delay):
+                rule = f'Crawl-delay: {int(crawl_delay)}'
+            else:
+                rule = f'Request-rate: {max(1, round(1/crawl_delay))}/1'
+            self.pages['/robots.txt'] = f'User-agent: *\n{rule}\n'.encode()
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.tokens = rate_limit
+        self.updated = time.monotonic()
+        self.nb_throttled = 0
+        self.etags = {path: '"%s"' % hashlib.md5(body).hexdigest()
+                      for path, body in self.pages.items()}
+        self.nb_requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self.get_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        """Renvoie l'url racine du serveur
+
+        Returns:
+            str: url du serveur
+        """
+        return f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def is_throttled(self):
+        """Consomme un jeton du débit autorisé par le serveur
+
+        Returns:
+            bool: True si la requête dépasse le débit autorisé
+        """
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate_limit, self.tokens+(now-self.updated)*self.rate_limit)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return False
+            self.nb_throttled += 1
+            return True
+
+    def get_handler(self):
+        """Renvoie la classe de traitement des requêtes http
+
+        Returns:
+            type: classe dérivée de BaseHTTPRequestHandler
+        """
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True #en-têtes et corps sont envoyés séparément
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with fixture.lock:
+                    fixture.nb_requests += 1
+                if fixture.latency:
+                    time.sleep(fixture.latency)
+                if fixture.is_throttled():
+                    self.send_response(429)
+                    self.send_header('Retry-After', '1')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                path = self.path.split('?')[0].replace('//', '/')
+                body = fixture.pages.get(path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = fixture.etags[path]
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                #comme books.toscrape.com, pas de charset dans l'en-tête des pages html
+                self.send_header('Content-Type',
+                                 'image/jpeg' if path.endswith('.jpg') else 'text/html')
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def start(self):
+        """Démarre le serveur dans un thread
+
+        Returns:
+            FixtureServer: le serveur
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Arrête le serveur
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def get_parser():
+    """Renvoie le parseur d'arguments du catalogue synthétique (partagé avec les benchmarks)
+
+    Returns:
+        argparse.ArgumentParser: parseur d'arguments
+    """
+    parser = argparse.ArgumentParser(description='Serveur local de catalogue synthétique')
+    parser.add_argument('--books', type=int, default=1000, help='Nombre de livres (1000)')
+    parser.add_argument('--categories', type=int, default=50, help='Nombre de catégories (50)')
+    parser.add_argument('--page-size', type=int, default=20,
+                        help='Nombre de livres par page de liste (20)')
+    parser.add_argument('--image-size', type=int, default=20000,
+                        help='Taille des images en octets (20000)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Latence ajoutée à chaque requête en secondes (0)')
+    parser.add_argument('--rate-limit', type=float, default=0,
+                        help='Débit maximum du serveur en requêtes par seconde, '
+                             'réponses 429 au-delà (0 : sans limite)')
+    parser.add_argument('--crawl-delay', type=float, default=0,
+                        help='Crawl-delay publié dans le robots.txt (0 : pas de robots.txt)')
+    parser.add_argument('--port', type=int, default=0, help='Port du serveur (aléatoire)')
+    return parser
+
+
+if __name__ == '__main__':
+    args = get_parser().parse_args()
+    fixture_pages = build_catalogue(args.books, args.categories, args.page_size, args.image_size)
+    with FixtureServer(fixture_pages, args.port, args.latency, args.rate_limit,
+                       args.crawl_delay) as fixture_server:
+        print(f'Catalogue de {args.books} livres servi sur {fixture_server.url} (Ctrl+C pour arrêter)')
+        try:
+            fixture_server.thread.join()
+        except KeyboardInterrupt:
+            pass
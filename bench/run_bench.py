@@ -0,0 +1,311 @@
+"""Benchmarks hors ligne du scrapper contre le serveur local de catalogue synthétique :
+    - scénario complet (découverte, téléchargement, analyse, sauvegarde csv et images)
+      lancé en sous-processus, avec débit (livres/s) et mémoire maximale
+    - micro-benchmarks des fonctions critiques (get_book_from_url, find_specific_td_in_table,
+      convert_price, save_list_book) avec durée par appel et pic de mémoire (tracemalloc)
+
+Utilisation :
+    python bench/run_bench.py --books 1000 --latency 0.02 --json bench.json -- -w 16
+Les arguments situés après "--" sont transmis au scrapper pour le scénario complet.
+Les résultats sont comparés à la référence bench/baseline.json : le programme se termine
+en erreur si une mesure se dégrade de plus de --max-regression % (avertissement seulement
+avec --warn-only), --update-baseline remplace la référence par les résultats.
+"""
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+try:
+    import resource
+except ImportError: #windows
+    resource = None
+
+from fixture_server import FixtureServer, build_catalogue, get_parser
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', 'src')
+SCRAPPER = os.path.join(SRC_DIR, 'scrap_book')
+BASELINE_FILE = os.path.join(BENCH_DIR, 'baseline.json')
+#mesures comparées à la référence : (mesure, True si une valeur plus grande est meilleure)
+PIPELINE_METRICS = (('books_per_s', True), ('max_rss_mb', False))
+FUNCTION_METRICS = (('us_per_call', False), ('peak_kb', False))
+
+
+def get_max_rss_child():
+    """Renvoie la mémoire résidente maximale des sous-processus terminés
+
+    Returns:
+        float: mémoire en Mo (None si indisponible)
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    #ru_maxrss est en octets sur macOS et en Ko sous linux
+    return round(rss/2**20 if sys.platform == 'darwin' else rss/2**10, 1)
+
+
+def bench_pipeline(url, nb_books, extra_args=(), repeat=1):
+    """Lance le scrapper complet sur le serveur local
+
+    Args:
+        url (str): url du serveur
+        nb_books (int): nombre de livres attendus
+        extra_args (list[str], optional): arguments supplémentaires du scrapper. Defaults to ().
+        repeat (int, optional): nombre d'exécutions. Defaults to 1.
+
+    Returns:
+        dict: durée, débit et mémoire de la meilleure exécution
+    """
+    runs = []
+    for _ in range(repeat):
+        work_dir = tempfile.mkdtemp(prefix='bench_scrap_')
+        output_dir = os.path.join(work_dir, 'output') #le scrapper crée lui-même le répertoire
+        try:
+            command = [sys.executable, SCRAPPER, '-s', url, '-o', output_dir,
+                       '--no-remote-log', '--no-cache', *extra_args]
+            start = time.perf_counter()
+            result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                    text=True, cwd=work_dir) #log.log est créé dans work_dir
+            duration = time.perf_counter()-start
+            if result.returncode != 0:
+                raise RuntimeError(f'Echec du scrapper : {result.stderr[-2000:]}')
+            nb_csv_books = 0
+            for root, _dirs, files in os.walk(os.path.join(output_dir, 'books')):
+                for name in files:
+                    if name.endswith('.csv'):
+                        with open(os.path.join(root, name), encoding='utf-8') as f:
+                            nb_csv_books += sum(1 for _ in f)-1
+            runs.append((duration, nb_csv_books))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    best, nb_saved = min(runs)
+    return {
+        'args': list(extra_args),
+        'books': nb_books,
+        'books_saved': nb_saved,
+        'duration_s': round(best, 3),
+        #débit des livres réellement enregistrés : un livre perdu n'est pas compté
+        'books_per_s': round(nb_saved/best, 1),
+        'max_rss_mb': get_max_rss_child(),
+    }
+
+
+def bench_function(name, func, number):
+    """Mesure la durée moyenne d'un appel et le pic de mémoire d'une fonction
+
+    Args:
+        name (str): nom du benchmark
+        func (callable): fonction sans argument à mesurer
+        number (int): nombre d'appels
+
+    Returns:
+        dict: durée par appel (µs), appels par seconde et pic de mémoire (Ko)
+    """
+    func() #échauffement (imports, caches, connexions)
+    duration = timeit.timeit(func, number=number)
+    tracemalloc.start()
+    func()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'name': name,
+        'calls': number,
+        'us_per_call': round(duration/number*1e6, 2),
+        'calls_per_s': round(number/duration, 1),
+        'peak_kb': round(peak/1024, 1),
+    }
+
+
+def bench_functions(url, number=200):
+    """Micro-benchmarks des fonctions critiques du scrapper
+
+    Args:
+        url (str): url du serveur
+        number (int, optional): nombre d'appels des fonctions les plus lentes. Defaults to 200.
+
+    Returns:
+        list[dict]: résultats de chaque benchmark
+    """
+    from bs4 import BeautifulSoup
+    sys.path.insert(0, SRC_DIR)
+    from scrap_book import parsing, sinks, utils
+    from scrap_book.context import ScrapeContext
+
+    url_book = url+'catalogue/book-0_1/index.html'
+    page = ScrapeContext().http.get_session().get(url_book).text
+    table = BeautifulSoup(page, 'html.parser').find('table')
+    book = parsing.get_book_from_url(url_book)
+    list_book = [book]*1000
+    work_dir = tempfile.mkdtemp(prefix='bench_save_')
+    output_dir = os.path.join(work_dir, 'output')
+    sinks.creation_repertoire_sortie(output_dir)
+
+    def find_fields():
+        for field in ('UPC', 'Price (incl. tax)', 'Price (excl. tax)', 'Availability'):
+            utils.find_specific_td_in_table(table, field)
+
+    results = []
+    try:
+        for parser_name in parsing.BOOK_PARSERS:
+            context = ScrapeContext(parser=parser_name)
+            results.append(bench_function(f'get_book_from_url[{parser_name}]',
+                                          lambda: parsing.get_book_from_url(url_book, context),
+                                          number))
+        for parser_name, parse in parsing.BOOK_PARSERS.items():
+            results.append(bench_function(f'parse_book_{parser_name}',
+                                          lambda: parse(url_book, page), number))
+        results.append(bench_function('find_specific_td_in_table (4 champs)', find_fields,
+                                      number*10))
+        results.append(bench_function('convert_price', lambda: utils.convert_price('£51.77'),
+                                      number*100))
+        results.append(bench_function('save_list_book (1000 livres)',
+                                      lambda: sinks.save_list_book(list_book, output_dir),
+                                      max(1, number//20)))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def compare_metric(name, value, reference, higher_is_better, max_regression):
+    """Compare une mesure à sa valeur de référence
+
+    Args:
+        name (str): nom de la mesure
+        value (float): valeur mesurée
+        reference (float): valeur de référence
+        higher_is_better (bool): True si une valeur plus grande est meilleure
+        max_regression (float): dégradation maximale tolérée en %
+
+    Returns:
+        str: description de la dégradation (None si la mesure ne s'est pas dégradée au-delà
+             de {max_regression} % ou si elle n'est pas comparable)
+    """
+    if value is None or not reference:
+        return None
+    change = (value-reference)/reference*100
+    regression = -change if higher_is_better else change
+    if regression > max_regression:
+        return f'{name} : {reference} -> {value} ({change:+.1f} %)'
+    return None
+
+
+def compare_with_baseline(report, baseline, max_regression):
+    """Compare les résultats des benchmarks à ceux de la référence
+
+    Args:
+        report (dict): résultats des benchmarks
+        baseline (dict): résultats de référence
+        max_regression (float): dégradation maximale tolérée en %
+
+    Returns:
+        list[str]: mesures dégradées au-delà de {max_regression} %
+    """
+    if report['fixture'] != baseline.get('fixture'):
+        print('Référence ignorée : le catalogue synthétique est différent')
+        return []
+    regressions = []
+    pipeline, pipeline_ref = report.get('pipeline'), baseline.get('pipeline')
+    if pipeline and pipeline_ref:
+        if pipeline['args'] != pipeline_ref['args']:
+            print('Scénario complet non comparé : arguments du scrapper différents')
+        else:
+            for metric, higher_is_better in PIPELINE_METRICS:
+                regressions.append(compare_metric(f'scénario complet {metric}',
+                                                  pipeline.get(metric), pipeline_ref.get(metric),
+                                                  higher_is_better, max_regression))
+    functions_ref = {result['name']: result for result in baseline.get('functions', [])}
+    for result in report.get('functions', []):
+        result_ref = functions_ref.get(result['name'])
+        if result_ref is None:
+            continue
+        for metric, higher_is_better in FUNCTION_METRICS:
+            regressions.append(compare_metric(f"{result['name']} {metric}", result.get(metric),
+                                              result_ref.get(metric), higher_is_better,
+                                              max_regression))
+    return [regression for regression in regressions if regression is not None]
+
+
+def print_results(report):
+    """Affiche les résultats des benchmarks sous forme de tableau
+
+    Args:
+        report (dict): résultats des benchmarks
+    """
+    pipeline = report.get('pipeline')
+    if pipeline:
+        print(f"Scénario complet : {pipeline['books']} livres ({pipeline['books_saved']} enregistrés)"
+              f" en {pipeline['duration_s']} s - {pipeline['books_per_s']} livres/s"
+              f" - mémoire max {pipeline['max_rss_mb']} Mo - requêtes {pipeline['requests']}"
+              f" (429 : {pipeline['throttled']})")
+    if report.get('functions'):
+        print(f"{'fonction':<40}{'µs/appel':>12}{'appels/s':>14}{'pic Ko':>10}")
+        for result in report['functions']:
+            print(f"{result['name']:<40}{result['us_per_call']:>12}{result['calls_per_s']:>14}"
+                  f"{result['peak_kb']:>10}")
+
+
+if __name__ == '__main__':
+    parser = get_parser()
+    parser.description = 'Benchmarks hors ligne du scrapper'
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="Nombre d'exécutions du scénario complet, la meilleure est gardée (1)")
+    parser.add_argument('--number', type=int, default=200,
+                        help="Nombre d'appels des micro-benchmarks (200)")
+    parser.add_argument('--no-pipeline', action='store_true', help='Sans le scénario complet')
+    parser.add_argument('--no-functions', action='store_true', help='Sans les micro-benchmarks')
+    parser.add_argument('--json', help='Enregistre les résultats dans ce fichier json')
+    parser.add_argument('--baseline', default=BASELINE_FILE,
+                        help='Résultats de référence (bench/baseline.json)')
+    parser.add_argument('--max-regression', type=float, default=20,
+                        help='Dégradation maximale tolérée par rapport à la référence en %% (20)')
+    parser.add_argument('--warn-only', action='store_true',
+                        help='Avertit des dégradations sans terminer le programme en erreur')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='Remplace la référence par les résultats')
+    parser.add_argument('scrapper_args', nargs='*',
+                        help='Arguments du scrapper pour le scénario complet (après "--")')
+    args = parser.parse_args()
+
+    report = {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'fixture': {'books': args.books, 'categories': args.categories,
+                    'page_size': args.page_size, 'image_size': args.image_size,
+                    'latency': args.latency, 'rate_limit': args.rate_limit,
+                    'crawl_delay': args.crawl_delay},
+    }
+    fixture_pages = build_catalogue(args.books, args.categories, args.page_size, args.image_size)
+    with FixtureServer(fixture_pages, args.port, args.latency, args.rate_limit,
+                       args.crawl_delay) as fixture_server:
+        if not args.no_pipeline:
+            report['pipeline'] = bench_pipeline(fixture_server.url, args.books,
+                                                args.scrapper_args, args.repeat)
+            report['pipeline']['requests'] = fixture_server.nb_requests
+            report['pipeline']['throttled'] = fixture_server.nb_throttled
+        if not args.no_functions:
+            report['functions'] = bench_functions(fixture_server.url,
+                                                  args.number)
+
+    print_results(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f'Référence mise à jour : {args.baseline}')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_with_baseline(report, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f'Dégradation de plus de {args.max_regression} % : {regression}')
+        if regressions and not args.warn_only:
+            sys.exit(1)
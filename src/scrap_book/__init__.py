@@ -0,0 +1,30 @@
+"""Scrapper du catalogue de livres d'un site (books.toscrape.com par défaut)
+
+Utilisation :
+    from scrap_book import Scraper
+    for book in Scraper(workers=16).scrape(['travel', 'sci*'], output='data'):
+        print(book.title, book.price_including_tax)
+
+Les modules des différentes étapes ne sont importés qu'à leur première utilisation :
+l'import du paquet est quasiment instantané et sans effet de bord.
+"""
+import importlib
+
+__all__ = ['Book', 'CatalogueStore', 'Scraper', 'scrape']
+
+#objets publics et module qui les définit, importés à la première utilisation
+_LAZY_ATTRIBUTES = {'Book': 'book', 'CatalogueStore': 'catalogue', 'Scraper': 'scraper',
+                    'scrape': 'scraper'}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(f'.{_LAZY_ATTRIBUTES[name]}', __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals())+__all__)
@@ -0,0 +1,13 @@
+"""Point d'entrée en ligne de commande : python -m scrap_book ou python src/scrap_book"""
+import os
+import sys
+
+if not __package__:
+    #lancé comme un répertoire (python src/scrap_book) : le paquet est importé depuis src
+    #plutôt que ses modules depuis le répertoire du paquet
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from scrap_book.cli import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,668 @@
+"""Moteur asynchrone (asyncio) : découverte, récupération, analyse et téléchargement des images
+dans une seule boucle d'évènements, les étapes communiquent par des files bornées"""
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from tqdm import tqdm
+
+from . import cache, discovery, network
+from .book import Book
+from .context import get_context
+from .fetch import parse_book_page
+from .images import IMAGE_CHUNK_SIZE, ImageDownloader
+from .logs import get_process_pool_logging, log_error, log_info
+from .metrics import stage_metrics
+
+QUEUE_FACTOR = 2 #taille des files entre deux étapes : éléments en attente par tâche consommatrice
+IO_WORKERS = 1 #threads des accès disque (cache, empreintes, journal, images) : les bases SQLite
+               #sont de toute façon protégées par un verrou
+DONE = object() #marqueur de fin d'une file
+
+class AsyncResponse():
+    """Réponse http lue en entier par le client asynchrone, avec les attributs de
+    requests.Response utilisés par le scrapper et le cache http
+    """
+    __slots__ = ('url', 'status_code', 'headers', 'content', 'encoding')
+
+    def __init__(self, url, status_code, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = requests.utils.get_encoding_from_headers(headers)
+
+    @property
+    def text(self):
+        """Contenu de la réponse décodé avec l'encodage des en-têtes (utf-8 à défaut)
+
+        Returns:
+            str: contenu de la réponse
+        """
+        return str(self.content, self.encoding or 'utf-8', errors='replace')
+
+async def read_response(response):
+    """Lit en entier le contenu d'une réponse aiohttp
+
+    Args:
+        response (aiohttp.ClientResponse): la réponse
+
+    Returns:
+        AsyncResponse: la réponse lue
+    """
+    content = await response.read()
+    return AsyncResponse(str(response.url), response.status, response.headers, content)
+
+def count_connection(http, name):
+    """Renvoie la fonction de suivi aiohttp qui incrémente un compteur des statistiques http
+
+    Args:
+        http (HttpClient): client http dont les statistiques sont mises à jour
+        name (str): nom du compteur (HttpClient.stats)
+
+    Returns:
+        coroutine: fonction appelée par aiohttp.TraceConfig
+    """
+    async def on_connection(_session, _context, _params):
+        http.count_stat(name)
+    return on_connection
+
+def get_file_size(path):
+    """Renvoie la taille d'un fichier
+
+    Args:
+        path (str): chemin du fichier
+
+    Returns:
+        int: taille en octets (None si le fichier n'existe pas)
+    """
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+async def acquire_limiter(limiter):
+    """Attend, sans bloquer la boucle, qu'une requête soit autorisée par le limiteur de débit
+
+    Args:
+        limiter (HostRateLimiter): limiteur de débit du site
+
+    Returns:
+        float: date d'autorisation de la requête (time.monotonic)
+    """
+    while True:
+        sent_at, delay = limiter.reserve()
+        if sent_at is not None:
+            return sent_at
+        await asyncio.sleep(delay)
+
+class AsyncHttpClient():
+    """Client http asynchrone (aiohttp) : le nombre total de requêtes en cours est borné par
+    {max_in_flight} et le nombre de requêtes simultanées par site par le client http du contexte.
+    Les limiteurs de débit, les nouvelles tentatives, les statistiques et le cache http sont
+    ceux du contexte du scrapping. Les accès disque (cache http, fichiers) sont exécutés
+    dans un thread dédié pour ne pas bloquer la boucle
+    """
+    def __init__(self, context=None, max_in_flight=64):
+        self.context = get_context(context)
+        self.http = self.context.http
+        self.max_in_flight = max(1, max_in_flight)
+        self.session = None
+        self.in_flight = None
+        self.errors = ()
+        self.host_semaphores = {} #sémaphore de chaque site {netloc: asyncio.Semaphore}
+        self.limiters = {} #limiteur de débit de chaque site {netloc: HostRateLimiter}
+        self.io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS)
+
+    async def open(self):
+        """Ouvre la session aiohttp (dans la boucle d'évènements)
+        """
+        import aiohttp #dépendance optionnelle, uniquement pour le moteur asynchrone
+        self.errors = (aiohttp.ClientError, asyncio.TimeoutError)
+        self.in_flight = asyncio.Semaphore(self.max_in_flight)
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight,
+                                         limit_per_host=self.http.max_per_host)
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(count_connection(self.http,
+                                                                   'async_connections'))
+        trace_config.on_connection_reuseconn.append(count_connection(self.http, 'async_reused'))
+        self.session = aiohttp.ClientSession(
+            connector=connector, trace_configs=[trace_config],
+            timeout=aiohttp.ClientTimeout(total=self.http.timeout),
+            headers={'User-Agent': requests.utils.default_user_agent()})
+
+    async def close(self):
+        """Ferme la session aiohttp et ses connexions, attend la fin des accès disque
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        self.io_executor.shutdown(wait=True)
+
+    async def run_io(self, func, *args):
+        """Exécute un accès disque (SQLite, fichier) dans le thread dédié sans bloquer la boucle
+
+        Args:
+            func (callable): fonction à exécuter
+            *args: paramètres de la fonction
+
+        Returns:
+            object: résultat de la fonction
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.io_executor, func, *args)
+
+    def get_host_semaphore(self, host):
+        """Renvoie le sémaphore qui limite les requêtes simultanées vers le site
+
+        Args:
+            host (str): site (netloc)
+
+        Returns:
+            asyncio.Semaphore: sémaphore du site
+        """
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(self.http.max_per_host)
+        return self.host_semaphores[host]
+
+    async def get_limiter(self, url):
+        """Renvoie le limiteur de débit du site de l'url (HttpClient.get_host_limiter),
+        le robots.txt du site est lu une seule fois dans un thread pour ne pas bloquer la boucle
+
+        Args:
+            url (str): url à requêter
+
+        Returns:
+            HostRateLimiter: limiteur du site
+        """
+        host = urlparse(url).netloc
+        if host not in self.limiters:
+            loop = asyncio.get_running_loop()
+            self.limiters[host] = await loop.run_in_executor(None, self.http.get_host_limiter,
+                                                             url)
+        return self.limiters[host]
+
+    async def get(self, url, headers=None, read=read_response):
+        """Effectue une requête GET au rythme autorisé par le limiteur de débit du site,
+        les erreurs de connexion et les réponses 429/5xx sont retentées comme HttpClient.get
+
+        Args:
+            url (str): url à requêter
+            headers (dict, optional): en-têtes de la requête. Defaults to None.
+            read (coroutine, optional): lecture de la réponse aiohttp finale.
+                                        Defaults to read_response.
+
+        Returns:
+            object: valeur renvoyée par {read} (par défaut AsyncResponse)
+        """
+        host = urlparse(url).netloc
+        limiter = await self.get_limiter(url)
+        attempt = 0
+        while True:
+            self.http.count_stat('requests')
+            throttled = False
+            start = time.perf_counter()
+            try:
+                #comme HttpClient.get, l'attente du limiteur ne bloque pas de place du site
+                sent_at = await acquire_limiter(limiter)
+                async with self.get_host_semaphore(host):
+                    async with self.in_flight:
+                        start = time.perf_counter()
+                        async with self.session.get(url, headers=headers) as response:
+                            final = response.status not in network.RETRY_STATUS or \
+                                    attempt >= self.http.retries
+                            result = await read(response) if final else None
+                            duration = time.perf_counter()-start
+                            stage_metrics.record('http', duration, response.content.total_bytes,
+                                                 host, error=response.status >= 400)
+                if response.status in network.THROTTLE_STATUS:
+                    self.http.count_stat('throttled')
+                    limiter.throttle(sent_at, network.get_retry_after(response))
+                    throttled = True
+                elif response.status < 400:
+                    limiter.record_latency(sent_at, duration)
+                if final:
+                    return result
+            except self.errors as _e:
+                stage_metrics.record('http', time.perf_counter()-start, host=host, error=True)
+                if attempt >= self.http.retries:
+                    self.http.count_stat('errors')
+                    raise
+            self.http.count_stat('retries')
+            if not throttled: #le limiteur du site attend déjà le délai demandé
+                await asyncio.sleep(self.http.get_backoff_delay(attempt))
+            attempt += 1
+
+    async def cached_get(self, url):
+        """Effectue une requête GET en passant par le cache http du contexte (cache.cached_get)
+
+        Args:
+            url (str): url à requêter
+
+        Returns:
+            AsyncResponse | requests.Response: la réponse (éventuellement reconstruite
+                                               depuis le cache)
+        """
+        http_cache = self.context.http_cache
+        if http_cache is None:
+            return await self.get(url)
+        cached_headers = await self.run_io(http_cache.get, url)
+        _reponse = await self.get(url, headers=cache.get_conditional_headers(cached_headers))
+        if _reponse.status_code == 304 and cached_headers is not None:
+            cached_response = await self.run_io(http_cache.get_response, url)
+            if cached_response is not None:
+                return cached_response
+            return await self.get(url)
+        if _reponse.status_code == 200:
+            await self.run_io(http_cache.store, url, _reponse)
+        return _reponse
+
+    async def download_image(self, url, path, etag=None):
+        """Télécharge une image par blocs dans un fichier temporaire puis le renomme en {path}
+        (images.download_image)
+
+        Args:
+            url (str): url de l'image
+            path (str): chemin du fichier de destination
+            etag (str, optional): ETag connu du fichier existant. Defaults to None.
+
+        Returns:
+            tuple(bool, str): (True si l'image a été téléchargée, ETag de l'image)
+        """
+        existing_size = await self.run_io(get_file_size, path)
+        exists = existing_size is not None
+        headers = {'If-None-Match': etag} if exists and etag else None
+
+        async def write_image(response):
+            if response.status == 304:
+                return False, etag
+            if response.status >= 400:
+                raise requests.HTTPError(f'{response.status} Error: {response.reason} '
+                                         f'for url: {url}')
+            new_etag = response.headers.get('ETag')
+            size = response.content_length
+            if exists and size is not None and size == existing_size:
+                return False, new_etag
+            fd, tmp_path = await self.run_io(tempfile.mkstemp, '.part', None,
+                                             os.path.dirname(path) or '.')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    async for chunk in response.content.iter_chunked(IMAGE_CHUNK_SIZE):
+                        await self.run_io(f.write, chunk)
+                await self.run_io(os.replace, tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            return True, new_etag
+
+        return await self.get(url, headers=headers, read=write_image)
+
+class AsyncImageDownloader(ImageDownloader):
+    """Téléchargement des images dans la boucle du moteur asynchrone, même interface
+    qu'ImageDownloader : les url sont transmises par une file bornée à {workers} tâches
+    """
+    def __init__(self, pipeline, output_dir, workers=4, journal=None):
+        super().__init__(output_dir, workers, journal)
+        self.pipeline = pipeline
+        self.queue, self.tasks = pipeline.run(self.start(max(1, workers)))
+
+    async def start(self, workers):
+        """Démarre les tâches de téléchargement
+
+        Args:
+            workers (int): nombre de tâches
+
+        Returns:
+            tuple(asyncio.Queue, list[asyncio.Task]): (file des url, tâches)
+        """
+        queue = asyncio.Queue(workers*QUEUE_FACTOR)
+        return queue, [asyncio.ensure_future(self.download_all(queue)) for _ in range(workers)]
+
+    def submit(self, book, download=True):
+        """Ajoute l'image du livre à la file de téléchargement, si la file est pleine
+        la boucle (toutes les étapes) avance jusqu'à ce qu'une place se libère
+
+        Args:
+            book (Book): le livre dont il faut télécharger l'image
+            download (bool, optional): False pour un livre dont l'image n'est pas
+                                       téléchargée (livre inchangé). Defaults to True.
+        """
+        if book is None or not download or book.image_url in self.seen_url:
+            return
+        self.seen_url.add(book.image_url)
+        self.pipeline.run(self.queue.put(book.image_url))
+
+    async def download_all(self, queue):
+        """Télécharge les images de la file jusqu'au marqueur de fin
+
+        Args:
+            queue (asyncio.Queue): file des url des images
+        """
+        while True:
+            url = await queue.get()
+            if url is DONE:
+                return
+            image_name = url.split('/')[-1]
+            try:
+                with stage_metrics.timer('image'):
+                    downloaded, etag = await self.pipeline.client.download_image(
+                        url, f'{self.image_dir}/{image_name}', self.etags.get(url))
+                if etag:
+                    self.etags[url] = etag
+                self.stats['downloaded' if downloaded else 'skipped'] += 1
+                if self.journal is not None:
+                    await self.pipeline.client.run_io(self.journal.add_image, url)
+            except Exception as _e:
+                self.stats['errors'] += 1
+                log_error('',[url,image_name],_e)
+
+    def close(self):
+        """Attend la fin des téléchargements en cours et enregistre les ETag
+
+        Returns:
+            dict: nombre d'images téléchargées, ignorées (déjà présentes) et en erreur
+        """
+        async def finish():
+            for _task in self.tasks:
+                await self.queue.put(DONE)
+            await asyncio.gather(*self.tasks)
+        self.pipeline.run(finish())
+        self.executor.shutdown(wait=False)
+        self.save_etags()
+        return self.stats
+
+class AsyncPipeline():
+    """Scrapping dans une seule boucle d'évènements :
+        - la découverte parcourt les pages de liste (de toutes les catégories en même temps)
+          et transmet les url des livres à récupérer dans une file bornée
+        - {workers} tâches téléchargent les pages des livres, l'analyse est déléguée à un pool
+          ({parse_workers} processus, ou un thread si 0) et les livres sont transmis dans une
+          file bornée
+        - les images sont téléchargées par les tâches d'AsyncImageDownloader
+    Les étapes se chevauchent et le nombre total de requêtes en cours est borné par
+    {max_in_flight}. La boucle avance pendant les appels à run : les livres sont renvoyés
+    par un générateur synchrone et toutes les étapes progressent pendant l'attente du suivant
+    """
+    def __init__(self, url, workers=8, parse_workers=0, max_in_flight=64, context=None):
+        self.url = url
+        self.workers = max(1, workers)
+        self.context = get_context(context)
+        self.parser_name = self.context.parser
+        if parse_workers > 0:
+            self.parse_executor = ProcessPoolExecutor(max_workers=parse_workers,
+                                                      **get_process_pool_logging())
+        else:
+            self.parse_executor = ThreadPoolExecutor(max_workers=1)
+        self.loop = asyncio.new_event_loop()
+        self.client = AsyncHttpClient(self.context, max_in_flight)
+        self.run(self.client.open())
+
+    def run(self, coro):
+        """Fait avancer la boucle d'évènements jusqu'à la fin de la coroutine
+
+        Args:
+            coro (coroutine): la coroutine
+
+        Returns:
+            object: résultat de la coroutine
+        """
+        return self.loop.run_until_complete(coro)
+
+    def get_image_downloader(self, output_dir, workers=4, journal=None):
+        """Renvoie le téléchargeur d'images du moteur asynchrone
+
+        Args:
+            output_dir (str): le répertoire de sortie
+            workers (int, optional): nombre d'images téléchargées en parallèle. Defaults to 4.
+            journal (CrawlJournal, optional): journal de reprise. Defaults to None.
+
+        Returns:
+            AsyncImageDownloader: le téléchargeur
+        """
+        return AsyncImageDownloader(self, output_dir, workers, journal)
+
+    async def parse(self, func, *args):
+        """Exécute une fonction d'analyse dans le pool d'analyse sans bloquer la boucle
+
+        Args:
+            func (callable): fonction d'analyse
+            *args: paramètres de la fonction
+
+        Returns:
+            object: résultat de la fonction
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.parse_executor, func, *args)
+
+    def iter_books(self, categories, all_categories, select_url, journal=None):
+        """Scrappe les livres du site (ou des catégories) et les renvoie dans l'ordre de leur
+        récupération
+
+        Args:
+            categories (list[str]): catégories ou motifs de catégories (None pour tout le site)
+            all_categories (bool): scrappe toutes les catégories du site
+            select_url (callable): fonction appelée avec les informations de chaque livre
+                                   découvert, renvoie l'url à récupérer (None pour l'écarter)
+            journal (CrawlJournal, optional): journal de reprise. Defaults to None.
+
+        Yields:
+            Book: les livres récupérés
+        """
+        books = self.run(self.start(categories, all_categories, select_url, journal))
+
+        def iter_queue():
+            while True:
+                book = self.run(books.get())
+                if book is DONE:
+                    return
+                yield book
+
+        yield from tqdm(iter_queue())
+
+    async def start(self, categories, all_categories, select_url, journal):
+        """Démarre la découverte et la récupération des livres
+
+        Returns:
+            asyncio.Queue: file des livres récupérés (terminée par DONE)
+        """
+        urls = asyncio.Queue(self.workers*QUEUE_FACTOR)
+        books = asyncio.Queue(self.workers*QUEUE_FACTOR)
+        asyncio.ensure_future(self.discover(categories, all_categories, select_url, journal,
+                                            urls))
+        asyncio.ensure_future(self.fetch_all(urls, books))
+        return books
+
+    async def discover(self, categories, all_categories, select_url, journal, urls):
+        """Découvre les livres et transmet les url à récupérer (Scraper.iter_discovery)
+
+        Args:
+            categories (list[str]): catégories ou motifs de catégories (None pour tout le site)
+            all_categories (bool): scrappe toutes les catégories du site
+            select_url (callable): sélection des url à récupérer
+            journal (CrawlJournal): journal de reprise (None si aucun)
+            urls (asyncio.Queue): file des url à récupérer
+        """
+        async def on_page(list_info, record=True):
+            if journal is not None and record:
+                await self.client.run_io(journal.add_discovered, list_info)
+            for info in list_info:
+                url = select_url(info)
+                if url is not None:
+                    await urls.put(url)
+
+        try:
+            if journal is not None and journal.discovery_done:
+                log_info(f"Reprise : {journal.nb_discovered} livre(s) déjà découvert(s)")
+                await on_page(journal.iter_previous_discovered(), record=False)
+            else:
+                if categories is not None or all_categories:
+                    await self.load_category_index()
+                    liste_category = discovery.resolve_categories(self.url, categories,
+                                                                  self.context)
+                    log_info(f"{len(liste_category)} catégorie(s) à scrapper : {liste_category}")
+                    await asyncio.gather(*(self.discover_list(category, on_page)
+                                           for category in liste_category))
+                else:
+                    await self.discover_list(None, on_page)
+                if journal is not None:
+                    await self.client.run_io(journal.set_discovery_done)
+        except Exception as _e:
+            log_error('',[self.url,categories],_e)
+        for _i in range(self.workers):
+            await urls.put(DONE)
+
+    async def load_category_index(self):
+        """Télécharge et analyse la page d'accueil du site pour construire l'index
+        des catégories (discovery.get_category_index)
+        """
+        if self.url in discovery.category_index:
+            return
+        try:
+            _reponse = await self.client.cached_get(self.url)
+            index = await self.parse(discovery.parse_category_index, self.url, _reponse.text)
+            with discovery.category_index_lock:
+                discovery.category_index.setdefault(self.url, index)
+        except Exception as _e:
+            log_error('',self.url,_e)
+
+    async def discover_list(self, category, on_page):
+        """Parcourt les pages de liste du site (ou de la catégorie) :
+        la première page donne le nombre de pages, les suivantes sont téléchargées en même temps
+        (discovery.iter_list_pages_info)
+
+        Args:
+            category (str): catégorie à scrapper, None pour tout le site
+            on_page (coroutine): appelée avec les informations des livres de chaque page
+        """
+        if category is not None:
+            log_info(f"Catégorie: {category} - Scrapping des url de chaque livre")
+            url_first_page = discovery.get_category(self.url,category,self.context)
+            if url_first_page is None:
+                log_error('Catégorie introuvable',[self.url,category],'')
+                return
+        else:
+            log_info(f"Aucune catégorie - Scrapping des url de chaque livre")
+            url_first_page = discovery.get_url_page(self.url,1)
+
+        try:
+            list_info, nb_pages = await self.get_list_page_info(url_first_page)
+        except Exception as _e:
+            log_error('',url_first_page,_e)
+            return
+        log_info(f"Catégorie: {category or 'toutes'} - {nb_pages} page(s) de liste à scrapper")
+        nb_book = len(list_info)
+        await on_page(list_info)
+
+        if category is not None:
+            list_url_page = [discovery.get_url_category_page(url_first_page,n)
+                             for n in range(2,nb_pages+1)]
+        else:
+            list_url_page = [discovery.get_url_page(self.url,n) for n in range(2,nb_pages+1)]
+        for page in asyncio.as_completed([self.get_list_books_info(url)
+                                          for url in list_url_page]):
+            list_info = await page
+            nb_book += len(list_info)
+            await on_page(list_info)
+        if category is not None:
+            log_info(f"Catégorie: {category} - {nb_book} livre(s) trouvé(s)")
+
+    async def get_list_page_info(self, url):
+        """Télécharge et analyse une page de liste (discovery.get_list_page_info)
+
+        Args:
+            url (str): url de la page
+
+        Returns:
+            tuple(list[dict], int): (informations des livres, nombre de pages)
+        """
+        with stage_metrics.timer('discovery'):
+            _reponse = await self.client.cached_get(url)
+            return await self.parse(discovery.parse_list_page, url, _reponse.content)
+
+    async def get_list_books_info(self, url):
+        """Renvoie les informations des livres d'une page de liste
+
+        Args:
+            url (str): url de la page
+
+        Returns:
+            list[dict]: informations des livres (liste vide en cas d'erreur)
+        """
+        try:
+            return (await self.get_list_page_info(url))[0]
+        except Exception as _e:
+            log_error('',url,_e)
+            return []
+
+    async def fetch_all(self, urls, books):
+        """Lance les {workers} tâches de récupération et termine la file des livres
+
+        Args:
+            urls (asyncio.Queue): file des url à récupérer
+            books (asyncio.Queue): file des livres récupérés
+        """
+        await asyncio.gather(*(self.fetch_books(urls, books) for _i in range(self.workers)))
+        await books.put(DONE)
+
+    async def fetch_books(self, urls, books):
+        """Récupère les livres de la file des url jusqu'au marqueur de fin
+
+        Args:
+            urls (asyncio.Queue): file des url à récupérer
+            books (asyncio.Queue): file des livres récupérés
+        """
+        while True:
+            url = await urls.get()
+            if url is DONE:
+                return
+            book = await self.get_book(url)
+            if book is not None:
+                await books.put(book)
+
+    async def get_book(self, url):
+        """Télécharge la page d'un livre et l'analyse dans le pool d'analyse
+        (si son empreinte a changé)
+
+        Args:
+            url (str): url du livre
+
+        Returns:
+            Book: le livre (None en cas d'erreur)
+        """
+        try:
+            with stage_metrics.timer('fetch'):
+                _reponse = await self.client.cached_get(url)
+            store = self.context.fingerprint_store
+            if store is not None:
+                book, content_hash = await self.client.run_io(store.lookup, url,
+                                                              _reponse.content)
+                if book is not None:
+                    return book
+            book_values, duration = await self.parse(parse_book_page, url, _reponse.content,
+                                                     _reponse.encoding or 'utf-8',
+                                                     self.parser_name)
+            stage_metrics.record('parse', duration)
+            book = Book.from_tuple(book_values)
+            if store is not None:
+                await self.client.run_io(store.record, url, content_hash, book)
+            return book
+        except Exception as _e:
+            log_error('',url,_e)
+            return None
+
+    def close(self):
+        """Annule les tâches en cours, ferme la session http, le pool d'analyse et la boucle
+        """
+        async def shutdown():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.client.close()
+        try:
+            self.run(shutdown())
+        finally:
+            self.parse_executor.shutdown(wait=True)
+            self.loop.close()
@@ -0,0 +1,322 @@
+"""Représentation d'un livre et nettoyage de ses champs"""
+from urllib.parse import urljoin
+
+from .constants import BOOK_FIELDS, IMAGE_PATH_FIELD
+from .logs import log_error
+from .metrics import stage_metrics
+from .utils import convert_price, get_number_in_string, get_stars_rating
+
+#entier isolé (utils.NUMBER_PATTERN) en syntaxe RE2 pour pyarrow.compute, sans assertions
+COLUMN_NUMBER_PATTERN = r'(?:^|\s)(?P<number>\d+)(?:\s|$)'
+
+class Book():
+    """Livre du catalogue. Les champs sont stockés dans des slots (pas de __dict__ par livre).
+    Par défaut les valeurs extraites de la page sont nettoyées à la création,
+    avec clean=False le livre garde les valeurs brutes (mode brut) : elles peuvent être
+    nettoyées plus tard avec transform_clean_book ou par lots avec BookBuffer.
+    Le chemin local de l'image (image_path) n'est connu qu'après le post-traitement des images,
+    il ne fait pas partie des valeurs extraites de la page (to_tuple)
+    """
+    __slots__ = BOOK_FIELDS + (IMAGE_PATH_FIELD,)
+
+    def __init__(self,product_page_url,universal_product_code,title,price_including_tax,
+                 price_excluding_tax,number_available,product_description,
+                 category,review_rating,image_url,clean=True):
+        self.product_page_url=product_page_url
+        self.universal_product_code=universal_product_code
+        self.title=title
+        self.price_including_tax=price_including_tax
+        self.price_excluding_tax=price_excluding_tax
+        self.number_available=number_available
+        self.product_description=product_description
+        self.category=category
+        self.review_rating=review_rating
+        self.image_url=image_url
+        self.image_path=None
+        #ensuite on nettoie les valeurs
+        if clean:
+            with stage_metrics.timer('clean'):
+                self.transform_clean_book()
+
+    def transform_clean_book(self):
+        """Traite et transforme les information du livre
+        """
+        self.price_including_tax=convert_price(self.price_including_tax)
+        self.price_excluding_tax=convert_price(self.price_excluding_tax)
+        self.number_available=get_number_in_string(self.number_available)
+        self.review_rating=get_stars_rating(self.review_rating)
+        self.image_url = urljoin(self.product_page_url,self.image_url)
+        self.category=clean_category(self.category)
+        self.product_description=clean_description(self.product_description)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Crée un livre à partir de valeurs déjà nettoyées (transform_clean_book n'est pas appelé)
+
+        Args:
+            data (dict): valeurs du livre, mêmes clés que to_dict
+
+        Returns:
+            Book: le livre
+        """
+        book = cls.__new__(cls)
+        for field in BOOK_FIELDS:
+            setattr(book, field, data.get(field))
+        book.image_path = data.get(IMAGE_PATH_FIELD) or None
+        return book
+
+    def to_dict(self):
+        """ renvoi le livre sous forme de dictionnaire
+
+        Returns:
+            dict: livre sous forme de dictionnaire
+        """
+        return dict(zip(BOOK_FIELDS, self.to_tuple()))
+
+    def to_tuple(self):
+        """Renvoie les valeurs du livre dans l'ordre de BOOK_FIELDS
+
+        Returns:
+            tuple: valeurs du livre
+        """
+        return (self.product_page_url, self.universal_product_code, self.title,
+                self.price_including_tax, self.price_excluding_tax, self.number_available,
+                self.product_description, self.category, self.review_rating, self.image_url)
+
+    @classmethod
+    def from_tuple(cls, values):
+        """Crée un livre à partir de valeurs déjà nettoyées dans l'ordre de BOOK_FIELDS
+        (transform_clean_book n'est pas appelé)
+
+        Args:
+            values (tuple): valeurs du livre (to_tuple)
+
+        Returns:
+            Book: le livre
+        """
+        book = cls.__new__(cls)
+        for field, value in zip(BOOK_FIELDS, values):
+            setattr(book, field, value)
+        book.image_path = None
+        return book
+
+    def to_pandas(self):
+        """ renvoi le livre sous forme de dataframe
+        (pour plusieurs livres, BookBuffer.to_pandas construit une seule dataframe)
+
+        Returns:
+            Pandas Dataframe: livre sous forme de dataframe
+        """
+        import pandas as pd #import coûteux, uniquement quand une dataframe est demandée
+        return pd.DataFrame([self.to_tuple()], columns=BOOK_FIELDS)
+
+    def __repr__(self):
+        return f'Book({self.universal_product_code!r}, {self.title!r})'
+
+
+def clean_category(category):
+    """Renvoie le nom de catégorie normalisé (minuscules, espaces remplacés par des tirets)
+
+    Args:
+        category (str): catégorie brute
+
+    Returns:
+        str: catégorie nettoyée
+    """
+    return category.strip().lower().replace(' ','-')
+
+def clean_description(description):
+    """Renvoie la description sans espaces superflus et sans ";" (séparateur des csv)
+
+    Args:
+        description (str): description brute
+
+    Returns:
+        str: description nettoyée
+    """
+    return description.strip().replace(';',',')
+
+def get_arrow_compute():
+    """Renvoie le module de calcul par colonne de pyarrow
+
+    Returns:
+        tuple(module, module): (pyarrow, pyarrow.compute), (None, None) si pyarrow
+                               n'est pas installé
+    """
+    try:
+        import pyarrow as pa #dépendance optionnelle, uniquement pour le nettoyage par colonne
+        import pyarrow.compute as pc
+    except ImportError:
+        return None, None
+    return pa, pc
+
+def to_arrow_column(pa, values):
+    """Convertit une colonne de textes bruts en tableau arrow
+
+    Args:
+        pa (module): pyarrow
+        values (list[str]): valeurs de la colonne
+
+    Returns:
+        pyarrow.StringArray: la colonne (None si une valeur n'est pas un texte)
+    """
+    try:
+        return pa.array(values, type=pa.string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return None
+
+def log_null_values(values, cleaned, message):
+    """Enregistre une erreur pour chaque valeur qui n'a pas pu être nettoyée
+
+    Args:
+        values (list[str]): valeurs brutes
+        cleaned (list): valeurs nettoyées (None en cas d'erreur)
+        message (str): message d'erreur
+    """
+    for raw, value in zip(values, cleaned):
+        if value is None:
+            log_error('',raw,message)
+
+def clean_price_column(values):
+    """Nettoie une colonne de prix (convert_price) : les symboles monétaires sont supprimés
+    puis la colonne est convertie en nombres par pyarrow.compute
+
+    Args:
+        values (list[str]): prix bruts
+
+    Returns:
+        list[float]: prix (None pour une valeur invalide)
+    """
+    pa, pc = get_arrow_compute()
+    column = to_arrow_column(pa, values) if pa is not None else None
+    if column is None:
+        return [convert_price(value) for value in values]
+    try:
+        cleaned = pc.cast(pc.replace_substring_regex(column, r'\p{Sc}', ''),
+                          pa.float64()).to_pylist()
+    except pa.ArrowInvalid: #une valeur n'est pas un nombre : conversion valeur par valeur
+        return [convert_price(value) for value in values]
+    log_null_values(values, cleaned, 'prix manquant')
+    return cleaned
+
+def clean_number_column(values):
+    """Nettoie une colonne de disponibilités (get_number_in_string) : le premier entier isolé
+    de chaque valeur est extrait par pyarrow.compute
+
+    Args:
+        values (list[str]): disponibilités brutes
+
+    Returns:
+        list[int]: nombres d'exemplaires (None si la valeur n'en contient pas)
+    """
+    pa, pc = get_arrow_compute()
+    column = to_arrow_column(pa, values) if pa is not None else None
+    if column is None:
+        return [get_number_in_string(value) for value in values]
+    numbers = pc.extract_regex(pc.replace_substring(column, '(', ''), COLUMN_NUMBER_PATTERN)
+    cleaned = pc.cast(pc.struct_field(numbers, [0]), pa.int64()).to_pylist()
+    log_null_values(values, cleaned, 'aucun entier isolé')
+    return cleaned
+
+def clean_text_column(values, clean, lower=False, old=' ', new=' '):
+    """Nettoie une colonne de textes par pyarrow.compute : espaces superflus supprimés,
+    minuscules si {lower} et {old} remplacé par {new}
+
+    Args:
+        values (list[str]): textes bruts
+        clean (callable): nettoyage d'une valeur, si pyarrow n'est pas installé
+        lower (bool, optional): passe les textes en minuscules. Defaults to False.
+        old (str, optional): texte à remplacer. Defaults to ' '.
+        new (str, optional): texte de remplacement. Defaults to ' '.
+
+    Returns:
+        list[str]: textes nettoyés
+    """
+    pa, pc = get_arrow_compute()
+    column = to_arrow_column(pa, values) if pa is not None else None
+    if column is None:
+        return [clean(value) for value in values]
+    column = pc.utf8_trim_whitespace(column)
+    if lower:
+        column = pc.utf8_lower(column)
+    return pc.replace_substring(column, old, new).to_pylist()
+
+def clean_book_columns(columns):
+    """Nettoie des livres bruts stockés par colonne, sans créer d'objet par livre :
+    les prix, disponibilités, catégories et descriptions sont traités par colonne entière
+    avec pyarrow.compute (valeur par valeur si pyarrow n'est pas installé), les notes
+    et les url des images valeur par valeur comme transform_clean_book
+
+    Args:
+        columns (dict): valeurs brutes {champ: [valeurs]} pour chaque champ de BOOK_FIELDS
+
+    Returns:
+        dict: valeurs nettoyées {champ: [valeurs]}
+    """
+    cleaned = dict(columns)
+    for field in ('price_including_tax', 'price_excluding_tax'):
+        cleaned[field] = clean_price_column(columns[field])
+    cleaned['number_available'] = clean_number_column(columns['number_available'])
+    cleaned['review_rating'] = [get_stars_rating(v) for v in columns['review_rating']]
+    cleaned['image_url'] = [urljoin(url, image) for url, image
+                            in zip(columns['product_page_url'], columns['image_url'])]
+    cleaned['category'] = clean_text_column(columns['category'], clean_category,
+                                            lower=True, new='-')
+    cleaned['product_description'] = clean_text_column(columns['product_description'],
+                                                       clean_description, old=';', new=',')
+    return cleaned
+
+
+class BookBuffer():
+    """Tampon de livres bruts stocké par colonne ({champ: [valeurs]}) :
+    les livres sont nettoyés par lots avec clean_book_columns et peuvent être convertis
+    en une seule dataframe
+    """
+    def __init__(self):
+        self.columns = {field: [] for field in BOOK_FIELDS}
+
+    def __len__(self):
+        return len(self.columns['product_page_url'])
+
+    def append(self, book):
+        """Ajoute un livre au tampon : brut (créé avec clean=False) pour clean,
+        brut ou déjà nettoyé pour to_pandas
+
+        Args:
+            book (Book): le livre (None est ignoré)
+        """
+        if book is None:
+            return
+        for field, value in zip(BOOK_FIELDS, book.to_tuple()):
+            self.columns[field].append(value)
+
+    def extend(self, books):
+        """Ajoute des livres bruts au tampon
+
+        Args:
+            books (iterable[Book]): les livres
+        """
+        for book in books:
+            self.append(book)
+
+    def clean(self):
+        """Nettoie les livres du tampon par lot puis vide le tampon
+
+        Returns:
+            list[Book]: livres nettoyés, dans l'ordre d'ajout
+        """
+        with stage_metrics.timer('clean'):
+            cleaned = clean_book_columns(self.columns)
+            books = [Book.from_tuple(values)
+                     for values in zip(*(cleaned[field] for field in BOOK_FIELDS))]
+        self.columns = {field: [] for field in BOOK_FIELDS}
+        return books
+
+    def to_pandas(self):
+        """Renvoie les livres du tampon sous forme d'une seule dataframe (valeurs telles quelles)
+
+        Returns:
+            Pandas Dataframe: une ligne par livre
+        """
+        import pandas as pd #import coûteux, uniquement quand une dataframe est demandée
+        return pd.DataFrame(self.columns, columns=BOOK_FIELDS)
@@ -0,0 +1,180 @@
+"""Cache http persistant (SQLite) et requêtes conditionnelles"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+
+from .context import get_context
+
+class HttpCache():
+    """Cache http persistant (base SQLite) indexé par url,
+    il conserve le contenu des pages avec leur ETag et Last-Modified pour les requêtes conditionnelles.
+    Les entrées non revalidées depuis {max_age} secondes sont supprimées et
+    les entrées les moins récemment utilisées sont supprimées au-delà de {max_size} octets
+    """
+    STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+    def __init__(self, cache_dir, max_age=30*24*3600, max_size=500*1024*1024):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.max_age = max_age
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.stats = {'hits':0, 'misses':0, 'stored':0, 'evicted':0}
+        #la base peut être partagée par plusieurs processus (workers locaux du mode distribué) :
+        #une écriture concurrente attend la fin de l'autre au lieu d'échouer (database is locked)
+        self.conn = sqlite3.connect(f'{cache_dir}/http_cache.sqlite', timeout=30,
+                                    check_same_thread=False)
+        with self.lock:
+            self.conn.execute('PRAGMA busy_timeout=30000')
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS pages (
+                                    url TEXT PRIMARY KEY,
+                                    headers TEXT,
+                                    content BLOB,
+                                    size INTEGER,
+                                    validated_at REAL,
+                                    accessed_at REAL)""")
+            self.conn.commit()
+        self.evict()
+
+    def get(self, url):
+        """Renvoie l'entrée du cache pour l'url
+
+        Args:
+            url (str): url recherchée
+
+        Returns:
+            dict: en-têtes http conservés ou None si l'url n'est pas en cache
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT headers FROM pages WHERE url=?', (url,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_response(self, url):
+        """Reconstruit la réponse http à partir du cache et met à jour ses dates d'utilisation
+
+        Args:
+            url (str): url recherchée
+
+        Returns:
+            requests.Response: réponse reconstruite ou None si l'url n'est pas en cache
+        """
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute('SELECT headers, content FROM pages WHERE url=?',
+                                    (url,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute('UPDATE pages SET validated_at=?, accessed_at=? WHERE url=?',
+                              (now, now, url))
+            self.conn.commit()
+            self.stats['hits'] += 1
+        response = requests.models.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = requests.structures.CaseInsensitiveDict(json.loads(row[0]))
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = zlib.decompress(row[1])
+        return response
+
+    def store(self, url, response):
+        """Enregistre une réponse dans le cache si elle peut être revalidée (ETag ou Last-Modified)
+
+        Args:
+            url (str): url de la réponse
+            response (requests.Response): réponse à enregistrer
+        """
+        with self.lock:
+            self.stats['misses'] += 1
+        if 'ETag' not in response.headers and 'Last-Modified' not in response.headers:
+            return
+        headers = {h: response.headers[h] for h in self.STORED_HEADERS if h in response.headers}
+        content = zlib.compress(response.content, 1)
+        now = time.time()
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO pages VALUES (?,?,?,?,?,?)',
+                              (url, json.dumps(headers), content, len(content), now, now))
+            self.conn.commit()
+            self.stats['stored'] += 1
+
+    def evict(self):
+        """Supprime les entrées trop anciennes puis les moins récemment utilisées
+        jusqu'à repasser sous la taille maximale du cache
+        """
+        with self.lock:
+            deleted = self.conn.execute('DELETE FROM pages WHERE validated_at<?',
+                                        (time.time()-self.max_age,)).rowcount
+            total = self.conn.execute('SELECT COALESCE(SUM(size),0) FROM pages').fetchone()[0]
+            if total > self.max_size:
+                to_delete = []
+                for url, size in self.conn.execute('SELECT url, size FROM pages '
+                                                   'ORDER BY accessed_at'):
+                    if total <= self.max_size:
+                        break
+                    to_delete.append((url,))
+                    total -= size
+                self.conn.executemany('DELETE FROM pages WHERE url=?', to_delete)
+                deleted += len(to_delete)
+            self.conn.commit()
+            self.stats['evicted'] += deleted
+
+    def close(self):
+        """Applique la politique d'éviction et ferme la base
+
+        Returns:
+            dict: statistiques du cache
+        """
+        self.evict()
+        with self.lock:
+            self.conn.close()
+        return self.stats
+
+def get_conditional_headers(cached_headers):
+    """Renvoie les en-têtes d'une requête conditionnelle pour une entrée du cache
+
+    Args:
+        cached_headers (dict): en-têtes http conservés (None si l'url n'est pas en cache)
+
+    Returns:
+        dict: en-têtes If-None-Match / If-Modified-Since
+    """
+    headers = {}
+    if cached_headers is not None:
+        if 'ETag' in cached_headers:
+            headers['If-None-Match'] = cached_headers['ETag']
+        if 'Last-Modified' in cached_headers:
+            headers['If-Modified-Since'] = cached_headers['Last-Modified']
+    return headers
+
+def cached_get(url, context=None):
+    """Effectue une requête GET en passant par le cache http du contexte :
+    si l'url est en cache, la requête est conditionnelle (If-None-Match / If-Modified-Since)
+    et le contenu du cache est renvoyé sur une réponse 304
+
+    Args:
+        url (str): url à requêter
+        context (ScrapeContext, optional): contexte du scrapping (client et cache http).
+                                           Defaults to None.
+
+    Returns:
+        requests.Response: la réponse (éventuellement reconstruite depuis le cache)
+    """
+    context = get_context(context)
+    http_cache = context.http_cache
+    if http_cache is None:
+        return context.http.get(url)
+    cached_headers = http_cache.get(url)
+    _reponse = context.http.get(url, headers=get_conditional_headers(cached_headers))
+    if _reponse.status_code == 304 and cached_headers is not None:
+        cached_response = http_cache.get_response(url)
+        if cached_response is not None:
+            return cached_response
+        return context.http.get(url)
+    if _reponse.status_code == 200:
+        http_cache.store(url, _reponse)
+    return _reponse
@@ -0,0 +1,208 @@
+"""Catalogue local des livres scrappés (base SQLite indexée) : enregistrement par lots,
+historique des prix et de la disponibilité à chaque exécution et requêtes rapides"""
+import os
+import sqlite3
+import threading
+import time
+
+from .book import Book
+from .constants import BOOK_FIELDS, IMAGE_PATH_FIELD
+from .metrics import stage_metrics
+
+CATALOGUE_FIELDS = BOOK_FIELDS + (IMAGE_PATH_FIELD,) #colonnes de la table books
+SORT_COLUMNS = {'price': 'price_including_tax', 'rating': 'review_rating',
+                'title': 'title', 'available': 'number_available'} #tris des requêtes
+PATTERN_CHARS = '*?[' #caractères des motifs de catégories (GLOB)
+
+class CatalogueStore():
+    """Catalogue des livres dans une base SQLite {path} :
+        - books : dernière version des champs nettoyés de chaque livre (clé : UPC), index sur
+          la catégorie et le prix, le prix et la note
+        - runs : exécutions du scrapper
+        - history : prix et nombre d'exemplaires disponibles de chaque livre à chaque exécution
+    Les livres sont écrits par lots de {batch_size} dans une seule transaction,
+    même interface que les objets d'enregistrement des livres (write, close)
+    """
+    def __init__(self, path, url=None, batch_size=500):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.url = url
+        self.batch_size = max(1, batch_size)
+        self.lock = threading.Lock()
+        self.pending = [] #livres en attente d'écriture
+        self.nb_book = 0
+        self.run_id = None
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.create_tables()
+
+    def create_tables(self):
+        """Crée les tables et les index de la base (appelé avec le verrou)
+        """
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS books (
+                universal_product_code TEXT PRIMARY KEY,
+                product_page_url TEXT,
+                title TEXT,
+                price_including_tax REAL,
+                price_excluding_tax REAL,
+                number_available INTEGER,
+                product_description TEXT,
+                category TEXT,
+                review_rating INTEGER,
+                image_url TEXT,
+                image_path TEXT,
+                run_id INTEGER);
+            CREATE INDEX IF NOT EXISTS books_category ON books (category, price_including_tax);
+            CREATE INDEX IF NOT EXISTS books_price ON books (price_including_tax);
+            CREATE INDEX IF NOT EXISTS books_rating ON books (review_rating);
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT,
+                started_at REAL,
+                finished_at REAL,
+                nb_book INTEGER);
+            CREATE TABLE IF NOT EXISTS history (
+                universal_product_code TEXT,
+                run_id INTEGER,
+                price_including_tax REAL,
+                price_excluding_tax REAL,
+                number_available INTEGER,
+                PRIMARY KEY (universal_product_code, run_id));
+            """)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, book):
+        """Ajoute le livre au lot en attente d'écriture
+
+        Args:
+            book (Book): le livre à enregistrer (None est ignoré)
+        """
+        if book is None or book.universal_product_code is None:
+            return
+        with self.lock, stage_metrics.timer('save'):
+            self.pending.append(book)
+            self.nb_book += 1
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """Écrit les livres en attente et leur historique dans une seule transaction
+        (appelé avec le verrou)
+        """
+        if not self.pending:
+            return
+        if self.run_id is None: #l'exécution est enregistrée avec son premier lot
+            self.conn.execute('INSERT INTO runs (url, started_at, nb_book) VALUES (?,?,0)',
+                              (self.url, time.time()))
+            self.run_id = self.conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+        rows = [(book.universal_product_code, book.product_page_url, book.title,
+                 book.price_including_tax, book.price_excluding_tax, book.number_available,
+                 book.product_description, book.category, book.review_rating, book.image_url,
+                 book.image_path, self.run_id) for book in self.pending]
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO books VALUES '
+                                  '(?,?,?,?,?,?,?,?,?,?,?,?)', rows)
+            self.conn.executemany('INSERT OR REPLACE INTO history VALUES (?,?,?,?,?)',
+                                  [(row[0], self.run_id, row[3], row[4], row[5])
+                                   for row in rows])
+        self.pending = []
+
+    def close(self):
+        """Écrit le dernier lot, termine l'exécution et ferme la base
+
+        Returns:
+            int: nombre de livres enregistrés
+        """
+        with self.lock:
+            try:
+                self.flush()
+                if self.run_id is not None:
+                    with self.conn:
+                        self.conn.execute('UPDATE runs SET finished_at=?, nb_book=? '
+                                          'WHERE run_id=?',
+                                          (time.time(), self.nb_book, self.run_id))
+            finally:
+                self.conn.close()
+        return self.nb_book
+
+    def query(self, categories=None, upc=None, title=None, min_price=None, max_price=None,
+              min_rating=None, available=False, sort='price', descending=False, limit=None):
+        """Renvoie les livres du catalogue qui correspondent aux critères
+
+        Args:
+            categories (list[str], optional): catégories ou motifs de catégories (ex: "sci*").
+                                              Defaults to None.
+            upc (str, optional): UPC du livre. Defaults to None.
+            title (str, optional): texte contenu dans le titre. Defaults to None.
+            min_price (float, optional): prix ttc minimum. Defaults to None.
+            max_price (float, optional): prix ttc maximum. Defaults to None.
+            min_rating (int, optional): note minimum. Defaults to None.
+            available (bool, optional): uniquement les livres disponibles. Defaults to False.
+            sort (str, optional): tri (clé de SORT_COLUMNS). Defaults to 'price'.
+            descending (bool, optional): tri décroissant. Defaults to False.
+            limit (int, optional): nombre maximum de livres. Defaults to None.
+
+        Returns:
+            list[Book]: les livres
+        """
+        conditions, params = [], []
+        if categories:
+            exact = [cat for cat in categories if not any(c in cat for c in PATTERN_CHARS)]
+            patterns = [cat for cat in categories if cat not in exact]
+            clauses = [f'category IN ({",".join("?"*len(exact))})'] if exact else []
+            clauses += ['category GLOB ?']*len(patterns)
+            conditions.append(f'({" OR ".join(clauses)})')
+            params += exact + patterns
+        for condition, value in (('universal_product_code = ?', upc),
+                                 ('title LIKE ?', f'%{title}%' if title else None),
+                                 ('price_including_tax >= ?', min_price),
+                                 ('price_including_tax <= ?', max_price),
+                                 ('review_rating >= ?', min_rating)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        if available:
+            conditions.append('number_available > 0')
+        sql = f'SELECT {", ".join(CATALOGUE_FIELDS)} FROM books'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += f' ORDER BY {SORT_COLUMNS[sort]} {"DESC" if descending else "ASC"}'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [Book.from_dict(dict(zip(CATALOGUE_FIELDS, row))) for row in rows]
+
+    def get_history(self, upc):
+        """Renvoie l'historique du prix et de la disponibilité d'un livre
+
+        Args:
+            upc (str): UPC du livre
+
+        Returns:
+            list[dict]: {run_id, date, price_including_tax, price_excluding_tax,
+                         number_available} pour chaque exécution, de la plus ancienne à la
+                        plus récente
+        """
+        with self.lock:
+            rows = self.conn.execute('SELECT history.run_id, runs.started_at, '
+                                     'history.price_including_tax, history.price_excluding_tax, '
+                                     'history.number_available FROM history '
+                                     'JOIN runs ON runs.run_id=history.run_id '
+                                     'WHERE history.universal_product_code=? '
+                                     'ORDER BY history.run_id', (upc,)).fetchall()
+        return [{'run_id': row[0],
+                 'date': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row[1])),
+                 'price_including_tax': row[2], 'price_excluding_tax': row[3],
+                 'number_available': row[4]} for row in rows]
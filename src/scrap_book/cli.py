@@ -0,0 +1,691 @@
+"""Ligne de commande du scrapper : lecture des paramètres, mise en place des logs,
+scrapping et affichage des statistiques"""
+import argparse
+import atexit
+import os
+import secrets
+import subprocess
+import sys
+
+from . import logs, metrics
+from .constants import DEFAULT_URL
+from .logs import LOKI_URL, error_registry, log_error, log_info, setup_logging, shutdown_logging
+from .metrics import ParseProfiler, stage_metrics
+from .scraper import Scraper, normalize_categories
+
+
+def get_parser():
+    """Renvoie le parseur d'arguments de la ligne de commande
+
+    Returns:
+        argparse.ArgumentParser: parseur d'arguments
+    """
+    parser = argparse.ArgumentParser(prog='scrap_book',
+                                     usage='use "%(prog)s --help" for more information',
+                                     description='Ce programme va extraire les informations \
+                                                  des livres du catalogue d\'un site internet. \n'+
+                                                 'Par défaut un dossier "data" sera créé pour \
+                                                sauvegarder les données extraites.',
+                                     allow_abbrev=True,
+                                    )
+
+    parser.add_argument("-s", "--src",
+                        metavar='\b', 
+                        help=f"Choisissez le site à scrapper (par defaut : {DEFAULT_URL})",
+                        default=DEFAULT_URL)
+
+    parser.add_argument("-o", "--outputdir",
+                        metavar='\b', 
+                        help="Choisissez en repertoire de sortie (par default : \"data\")",
+                        default="data")
+
+    parser.add_argument("-c", "--category",
+                        metavar='\b', 
+                        help="Choisissez la ou les catégories de livre à scrapper, séparées par \
+                             des espaces ou des virgules, les motifs sont acceptés (ex: \"sci*\") \
+                             (par default : Toutes (\"None\"))",
+                        nargs='+',
+                        default=None)
+
+    parser.add_argument("-a", "--all-categories",
+                        help="Scrappe toutes les catégories du site en parallèle",
+                        action='store_true',
+                        )
+
+    parser.add_argument("-w", "--workers",
+                        metavar='\b',
+                        help="Nombre de livres récupérés en parallèle (par default : 8)",
+                        type=int,
+                        default=8)
+
+    parser.add_argument("--parse-workers",
+                        metavar='\b',
+                        help="Nombre de processus dédiés à l'analyse des pages, 0 pour analyser \
+                             les pages dans les threads de téléchargement (par default : 0)",
+                        type=int,
+                        default=0)
+
+    parser.add_argument("--engine",
+                        metavar='\b',
+                        help="Moteur de scrapping : threads (pools de threads) ou async (une seule \
+                             boucle asyncio pour toutes les étapes, nécessite aiohttp) \
+                             (par default : threads)",
+                        choices=['threads', 'async'],
+                        default='threads')
+
+    parser.add_argument("--max-in-flight",
+                        metavar='\b',
+                        help="Nombre maximum de requêtes en cours avec le moteur async, tous sites \
+                             confondus (par default : 64)",
+                        type=int,
+                        default=64)
+
+    parser.add_argument("--image-workers",
+                        metavar='\b',
+                        help="Nombre d'images téléchargées en parallèle (par default : 4)",
+                        type=int,
+                        default=4)
+
+    parser.add_argument("--process-images",
+                        help="Post-traite les images dans un pool de processus : originaux \
+                             stockés par empreinte de contenu, vignettes, empreintes \
+                             perceptuelles et colonne image_path (nécessite Pillow)",
+                        action='store_true',
+                        )
+
+    parser.add_argument("--thumbnail-size",
+                        metavar='\b',
+                        help="Côté en pixels des vignettes de --process-images \
+                             (par default : 128)",
+                        type=int,
+                        default=128)
+
+    parser.add_argument("--max-per-host",
+                        metavar='\b',
+                        help="Nombre maximum de requêtes simultanées par site (par default : 8)",
+                        type=int,
+                        default=8)
+
+    parser.add_argument("--rate",
+                        metavar='\b',
+                        help="Nombre maximum de requêtes par seconde par site, adapté ensuite aux \
+                             réponses du site (par default : 0, sans limite)",
+                        type=float,
+                        default=0)
+
+    parser.add_argument("--no-robots",
+                        help="Ignore le crawl-delay du robots.txt des sites",
+                        action="store_true")
+
+    parser.add_argument("--timeout",
+                        metavar='\b',
+                        help="Délai maximum d'attente d'une réponse en secondes (par default : 10)",
+                        type=float,
+                        default=10)
+
+    parser.add_argument("--retries",
+                        metavar='\b',
+                        help="Nombre de nouvelles tentatives en cas d'erreur réseau (par default : 3)",
+                        type=int,
+                        default=3)
+
+    parser.add_argument("--cache-dir",
+                        metavar='\b',
+                        help="Répertoire du cache http (par default : \"{outputdir}/.cache\")",
+                        default=None)
+
+    parser.add_argument("--no-cache",
+                        help="Désactive le cache http",
+                        action='store_true',
+                        )
+
+    parser.add_argument("--cache-max-age",
+                        metavar='\b',
+                        help="Nombre de jours après lequel une page non revalidée est supprimée \
+                             du cache (par default : 30)",
+                        type=float,
+                        default=30)
+
+    parser.add_argument("--cache-max-size",
+                        metavar='\b',
+                        help="Taille maximale du cache en Mo (par default : 500)",
+                        type=float,
+                        default=500)
+
+    parser.add_argument("-f", "--format",
+                        metavar='\b',
+                        help="Format de sortie : csv (un fichier par catégorie), parquet ou feather \
+                             (un jeu de données partitionné par catégorie) (par default : csv)",
+                        choices=['csv', 'parquet', 'feather'],
+                        default='csv')
+
+    parser.add_argument("-p", "--parser",
+                        metavar='\b',
+                        help="Analyseur des pages livres : lxml (XPath) ou bs4 (BeautifulSoup) \
+                             (par default : lxml)",
+                        choices=['lxml', 'bs4'],
+                        default='lxml')
+
+    parser.add_argument("-i", "--incremental",
+                        help="Ne récupère que les livres nouveaux ou dont le prix ou la disponibilité \
+                             a changé depuis l'exécution précédente",
+                        action='store_true',
+                        )
+
+    parser.add_argument("-r", "--resume",
+                        help="Reprend l'exécution précédente interrompue à partir du journal \
+                             {outputdir}/journal.jsonl",
+                        action='store_true',
+                        )
+
+    parser.add_argument("--fingerprint",
+                        help="Conserve l'empreinte des pages livres dans \
+                             {outputdir}/fingerprints.sqlite : les pages inchangées ne sont pas \
+                             analysées et un livre publié sous plusieurs url n'est récupéré \
+                             qu'une fois",
+                        action='store_true',
+                        )
+
+    parser.add_argument("--changed-only",
+                        help="Avec --fingerprint, enregistre aussi les livres nouveaux ou \
+                             modifiés depuis l'exécution précédente dans {outputdir}/changes \
+                             (les fichiers complets restent écrits)",
+                        action='store_true',
+                        )
+
+    parser.add_argument("--catalogue",
+                        help="Enregistre aussi les livres dans le catalogue SQLite indexé \
+                             {outputdir}/catalogue.sqlite (historique des prix et de la \
+                             disponibilité, commande query)",
+                        action='store_true',
+                        )
+
+    parser.add_argument("--no-remote-log",
+                        help="Désactive l'envoi des logs au serveur Loki",
+                        action='store_true',
+                        )
+
+    parser.add_argument("--loki-url",
+                        metavar='\b',
+                        help=f"Url d'envoi des logs au serveur Loki (par default : {LOKI_URL})",
+                        default=LOKI_URL)
+
+    parser.add_argument("--profile",
+                        help="Mesure la durée de chaque étape, affiche un tableau récapitulatif et \
+                             l'enregistre dans {outputdir}/profile.json",
+                        action='store_true',
+                        )
+
+    parser.add_argument("--profile-parse",
+                        help="Profile l'analyse des pages avec cProfile dans \
+                             {outputdir}/profile_parse.prof",
+                        action='store_true',
+                        )
+
+    parser.add_argument("-v", "--verbose",
+                        help="Affiche les logs dans la console",
+                        action='store_true',
+                        )
+
+    return parser
+
+def add_queue_arguments(parser):
+    """Ajoute les paramètres de la file de travail du mode distribué
+
+    Args:
+        parser (argparse.ArgumentParser): parseur d'arguments
+    """
+    parser.add_argument("--visibility-timeout",
+                        metavar='\b',
+                        help="Délai en secondes après lequel les url prises par un worker qui n'a \
+                             pas répondu sont de nouveau distribuées (par default : 60)",
+                        type=float,
+                        default=60)
+
+    parser.add_argument("--batch-size",
+                        metavar='\b',
+                        help="Nombre d'url prises par un worker à chaque fois \
+                             (par default : 2 fois --workers)",
+                        type=int,
+                        default=None)
+
+    parser.add_argument("--token",
+                        metavar='\b',
+                        help="Secret partagé entre le courtier et les workers distants \
+                             (par default : variable d'environnement SCRAP_BOOK_TOKEN, \
+                             généré par le coordinateur si absent)",
+                        default=os.environ.get('SCRAP_BOOK_TOKEN'))
+
+def get_query_parser():
+    """Renvoie le parseur d'arguments de la commande query (recherche dans le catalogue)
+
+    Returns:
+        argparse.ArgumentParser: parseur d'arguments
+    """
+    from .catalogue import SORT_COLUMNS
+    parser = argparse.ArgumentParser(prog='scrap_book query',
+                                     usage='use "%(prog)s --help" for more information',
+                                     description='Recherche des livres dans le catalogue SQLite \
+                                                  créé par --catalogue.',
+                                    )
+
+    parser.add_argument("-o", "--outputdir",
+                        metavar='\b',
+                        help="Répertoire de sortie du scrapping (par default : \"data\")",
+                        default="data")
+
+    parser.add_argument("--db",
+                        metavar='\b',
+                        help="Base SQLite du catalogue (par default : \
+                             \"{outputdir}/catalogue.sqlite\")",
+                        default=None)
+
+    parser.add_argument("-c", "--category",
+                        metavar='\b',
+                        help="Catégorie(s) des livres, séparées par des espaces ou des virgules, \
+                             les motifs sont acceptés (ex: \"sci*\")",
+                        nargs='+',
+                        default=None)
+
+    parser.add_argument("--upc",
+                        metavar='\b',
+                        help="UPC du livre",
+                        default=None)
+
+    parser.add_argument("--title",
+                        metavar='\b',
+                        help="Texte contenu dans le titre",
+                        default=None)
+
+    parser.add_argument("--min-price",
+                        metavar='\b',
+                        help="Prix ttc minimum",
+                        type=float,
+                        default=None)
+
+    parser.add_argument("--max-price",
+                        metavar='\b',
+                        help="Prix ttc maximum",
+                        type=float,
+                        default=None)
+
+    parser.add_argument("--min-rating",
+                        metavar='\b',
+                        help="Note minimum (1 à 5)",
+                        type=int,
+                        default=None)
+
+    parser.add_argument("--available",
+                        help="Uniquement les livres disponibles",
+                        action='store_true',
+                        )
+
+    parser.add_argument("--sort",
+                        metavar='\b',
+                        help=f"Tri des livres : {', '.join(SORT_COLUMNS)} (par default : price)",
+                        choices=list(SORT_COLUMNS),
+                        default='price')
+
+    parser.add_argument("--desc",
+                        help="Tri décroissant",
+                        action='store_true',
+                        )
+
+    parser.add_argument("--limit",
+                        metavar='\b',
+                        help="Nombre maximum de livres, 0 pour tous (par default : 0)",
+                        type=int,
+                        default=0)
+
+    parser.add_argument("--history",
+                        help="Affiche l'historique du prix et de la disponibilité de chaque livre \
+                             (une ligne par exécution)",
+                        action='store_true',
+                        )
+
+    parser.add_argument("--json",
+                        help="Affiche les livres au format json (par default : csv)",
+                        action='store_true',
+                        )
+    return parser
+
+def main_query(argv):
+    """Point d'entrée de la commande query : affiche les livres du catalogue qui
+    correspondent aux critères (csv séparé par des ";" ou json)
+
+    Args:
+        argv (list[str]): arguments de la commande
+    """
+    import csv
+    import json
+    from .catalogue import CATALOGUE_FIELDS, CatalogueStore
+    args = get_query_parser().parse_args(argv)
+    path = args.db or f'{args.outputdir}/catalogue.sqlite'
+    if not os.path.exists(path):
+        sys.exit(f"Catalogue introuvable : {path} (scrapping avec --catalogue)")
+    store = CatalogueStore(path)
+    try:
+        books = store.query(categories=normalize_categories(args.category), upc=args.upc,
+                            title=args.title, min_price=args.min_price,
+                            max_price=args.max_price, min_rating=args.min_rating,
+                            available=args.available, sort=args.sort, descending=args.desc,
+                            limit=args.limit)
+        rows = [dict(zip(CATALOGUE_FIELDS, (getattr(book, field) for field in CATALOGUE_FIELDS)))
+                for book in books]
+        if args.history:
+            for row in rows:
+                row['history'] = store.get_history(row['universal_product_code'])
+    finally:
+        store.close()
+    if args.json:
+        json.dump(rows, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return
+    writer = csv.writer(sys.stdout, delimiter=';', lineterminator='\n')
+    if args.history:
+        #une ligne par livre et par exécution
+        history_fields = ('run_id', 'date', 'price_including_tax', 'price_excluding_tax',
+                          'number_available')
+        writer.writerow(('universal_product_code', 'title') + history_fields)
+        for row in rows:
+            for entry in row['history']:
+                writer.writerow([row['universal_product_code'], row['title']] +
+                                [entry[field] for field in history_fields])
+        return
+    writer.writerow(CATALOGUE_FIELDS)
+    for row in rows:
+        writer.writerow([row[field] for field in CATALOGUE_FIELDS])
+
+def get_coordinator_parser():
+    """Renvoie le parseur d'arguments de la commande coordinator : mêmes paramètres que
+    le scrapping classique, les livres sont récupérés par les workers
+
+    Returns:
+        argparse.ArgumentParser: parseur d'arguments
+    """
+    parser = get_parser()
+    parser.prog = 'scrap_book coordinator'
+    parser.usage = 'use "%(prog)s --help" for more information'
+    parser.add_argument("--queue",
+                        metavar='\b',
+                        help="Base SQLite de la file de travail (par default : \
+                             \"{outputdir}/queue.sqlite\")",
+                        default=None)
+
+    parser.add_argument("--listen",
+                        metavar='\b',
+                        help="Adresse hôte:port du courtier http qui donne accès à la file aux \
+                             workers d'autres machines, hôte 127.0.0.1 si seul le port est \
+                             donné (par default : aucun)",
+                        default=None)
+
+    parser.add_argument("--local-workers",
+                        metavar='\b',
+                        help="Nombre de processus workers lancés sur la machine du coordinateur \
+                             (par default : 0)",
+                        type=int,
+                        default=0)
+
+    parser.add_argument("--max-attempts",
+                        metavar='\b',
+                        help="Nombre maximum de distributions d'une url avant de la marquer en \
+                             échec (par default : 3)",
+                        type=int,
+                        default=3)
+    add_queue_arguments(parser)
+    return parser
+
+def get_worker_parser():
+    """Renvoie le parseur d'arguments de la commande worker : les paramètres http, de cache
+    et de log du scrapping classique sont utilisés, les autres sont ceux du coordinateur
+
+    Returns:
+        argparse.ArgumentParser: parseur d'arguments
+    """
+    parser = get_parser()
+    parser.prog = 'scrap_book worker'
+    parser.usage = 'use "%(prog)s --help" for more information'
+    parser.description = 'Récupère les livres de la file de travail d\'un coordinateur \
+                          jusqu\'à la fin du scrapping.'
+    parser.add_argument("--queue",
+                        metavar='\b',
+                        help="Base SQLite de la file de travail ou url du courtier du coordinateur \
+                             (ex: http://hote:8700) (par default : \"{outputdir}/queue.sqlite\")",
+                        default=None)
+
+    parser.add_argument("--worker-id",
+                        metavar='\b',
+                        help="Identifiant du worker (par default : \"{machine}-{pid}\")",
+                        default=None)
+    add_queue_arguments(parser)
+    return parser
+
+def main_worker(argv):
+    """Point d'entrée de la commande worker
+
+    Args:
+        argv (list[str]): arguments de la commande
+    """
+    from .distributed import open_work_queue, run_worker
+    args = get_worker_parser().parse_args(argv)
+    queue_location = args.queue or f'{args.outputdir}/queue.sqlite'
+    if args.verbose:
+        logs.is_verbose=True
+    setup_logging(remote=not args.no_remote_log, loki_url=args.loki_url)
+    log_info(f"Lecteur parametre queue : {queue_location}")
+
+    scraper = Scraper(workers=args.workers,
+                      parser=args.parser,
+                      max_per_host=args.max_per_host,
+                      rate=args.rate,
+                      robots=not args.no_robots,
+                      timeout=args.timeout,
+                      retries=args.retries,
+                      cache_dir=args.cache_dir,
+                      use_cache=not args.no_cache,
+                      cache_max_age=args.cache_max_age,
+                      cache_max_size=args.cache_max_size)
+    from .context import ScrapeContext
+    context = ScrapeContext(scraper.configure(), scraper.open_cache(args.outputdir),
+                            parser=args.parser)
+    stats = None
+    try:
+        work_queue = open_work_queue(queue_location, args.token)
+        try:
+            stats = run_worker(work_queue, args.workers, args.worker_id, args.batch_size,
+                               args.visibility_timeout, context)
+        finally:
+            work_queue.close()
+    except Exception as _e:
+        log_error('',queue_location,_e)
+    finally:
+        if context.http_cache is not None:
+            context.http_cache.close()
+    print(f'Worker : {stats}')
+    shutdown_logging()
+
+def start_local_workers(args, queue_path):
+    """Lance les processus workers sur la machine du coordinateur
+
+    Args:
+        args (argparse.Namespace): paramètres du coordinateur
+        queue_path (str): base SQLite de la file de travail
+
+    Returns:
+        list[subprocess.Popen]: processus lancés
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, package_dir, 'worker', '--queue', queue_path,
+               '-o', args.outputdir,
+               '-w', str(args.workers), '-p', args.parser,
+               '--max-per-host', str(args.max_per_host), '--rate', str(args.rate),
+               '--timeout', str(args.timeout), '--retries', str(args.retries),
+               '--visibility-timeout', str(args.visibility_timeout),
+               '--cache-max-age', str(args.cache_max_age),
+               '--cache-max-size', str(args.cache_max_size),
+               '--loki-url', args.loki_url]
+    if args.batch_size:
+        command += ['--batch-size', str(args.batch_size)]
+    if args.cache_dir:
+        command += ['--cache-dir', args.cache_dir]
+    for flag in ('no_robots', 'no_cache', 'no_remote_log'):
+        if getattr(args, flag):
+            command.append('--'+flag.replace('_', '-'))
+    return [subprocess.Popen(command+['--worker-id', f'local-{i}'], stdout=subprocess.DEVNULL)
+            for i in range(args.local_workers)]
+
+def main(argv=None):
+    """Point d'entrée de la ligne de commande : scrapping classique,
+    commandes coordinator / worker du mode distribué ou query (recherche dans le catalogue)
+
+    Args:
+        argv (list[str], optional): arguments de la ligne de commande,
+                                    None pour lire sys.argv. Defaults to None.
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] == 'worker':
+        main_worker(argv[1:])
+        return
+    if argv and argv[0] == 'query':
+        main_query(argv[1:])
+        return
+    coordinator = bool(argv) and argv[0] == 'coordinator'
+    if coordinator:
+        args = get_coordinator_parser().parse_args(argv[1:])
+    else:
+        args = get_parser().parse_args(argv)
+    url_to_scrap = args.src
+    category = normalize_categories(args.category)
+    output_dir = args.outputdir
+
+    if args.verbose:
+        logs.is_verbose=True
+        print("########## VERBOSE ############")
+
+    setup_logging(remote=not args.no_remote_log, loki_url=args.loki_url)
+    log_info(f"App Start")
+
+    stage_metrics.reset(enabled=args.profile)
+    if args.profile_parse:
+        if args.parse_workers > 0:
+            log_info("--profile-parse ignoré : l'analyse est exécutée dans des processus séparés")
+        elif args.engine == 'async':
+            log_info("--profile-parse ignoré : l'analyse est exécutée dans le pool du moteur async")
+        else:
+            metrics.parse_profiler = ParseProfiler()
+
+    log_info(f"Lecteur parametre url : {url_to_scrap}")       
+    log_info(f"Lecteur parametre category : {category}")  
+    log_info(f"Lecteur parametre all-categories : {args.all_categories}")
+    log_info(f"Lecteur parametre output : {output_dir}")
+    log_info(f"Lecteur parametre workers : {args.workers}")
+    log_info(f"Lecteur parametre engine : {args.engine}")
+    log_info(f"Lecteur parametre rate : {args.rate}")
+    log_info(f"Lecteur parametre parser : {args.parser}")
+
+    #le résumé des erreurs est écrit à la fin du programme, même en cas d'arrêt inattendu
+    atexit.register(error_registry.write_summary, f'{output_dir}/errors_summary.json')
+
+    work_queue = None
+    broker = None
+    local_workers = []
+    if coordinator:
+        from .distributed import BrokerServer, WorkQueue
+        queue_path = args.queue or f'{output_dir}/queue.sqlite'
+        log_info(f"Lecteur parametre queue : {queue_path}")
+        try:
+            work_queue = WorkQueue(queue_path, reset=True, max_attempts=args.max_attempts)
+            if args.listen:
+                host, _sep, port = args.listen.rpartition(':')
+                token = args.token
+                if not token:
+                    token = secrets.token_urlsafe(24)
+                    #affiché seulement dans la console : le secret n'est pas envoyé dans les logs
+                    print(f'Secret du courtier (--token des workers) : {token}')
+                broker = BrokerServer(work_queue, token, host or '127.0.0.1', int(port))
+                broker.start()
+            local_workers = start_local_workers(args, queue_path)
+        except Exception as _e:
+            log_error('',queue_path,_e)
+            shutdown_logging()
+            return
+
+    scraper = Scraper(url_to_scrap,
+                      workers=args.workers,
+                      parse_workers=args.parse_workers,
+                      parser=args.parser,
+                      image_workers=args.image_workers,
+                      max_per_host=args.max_per_host,
+                      rate=args.rate,
+                      robots=not args.no_robots,
+                      timeout=args.timeout,
+                      retries=args.retries,
+                      cache_dir=args.cache_dir,
+                      use_cache=not args.no_cache,
+                      cache_max_age=args.cache_max_age,
+                      cache_max_size=args.cache_max_size,
+                      fmt=args.format,
+                      engine=args.engine,
+                      max_in_flight=args.max_in_flight,
+                      work_queue=work_queue,
+                      fingerprint=args.fingerprint,
+                      changed_only=args.changed_only,
+                      process_images=args.process_images,
+                      thumbnail_size=args.thumbnail_size,
+                      catalogue=args.catalogue)
+    try:
+        for _book in scraper.scrape(category, output_dir, all_categories=args.all_categories,
+                                    incremental=args.incremental, resume=args.resume):
+            pass
+    except Exception as _e:
+        log_error('',output_dir,_e)
+
+    if work_queue is not None:
+        for process in local_workers:
+            process.wait()
+        if broker is not None:
+            broker.close()
+        queue_stats = work_queue.counts()
+        work_queue.close()
+        print(f"File de travail : {queue_stats['done']} livre(s) récupéré(s) par les workers - "
+              f"{queue_stats['failed']} en échec")
+
+    http_stats_run = scraper.configure().get_stats()
+    log_info(f"Statistiques http : {http_stats_run}")
+    print(f"Requêtes http : {http_stats_run['requests']} - "
+          f"nouvelles tentatives : {http_stats_run['retries']} - "
+          f"réponses 429/503 : {http_stats_run['throttled']} - "
+          f"connexions ouvertes : {http_stats_run['connections']} - "
+          f"réutilisation des connexions : {http_stats_run['pool_hit_rate']:.1%}")
+
+    cache_stats = scraper.stats.get('cache')
+    if cache_stats is not None:
+        print(f"Cache http : {cache_stats['hits']} page(s) servie(s) depuis le cache - "
+              f"{cache_stats['misses']} page(s) téléchargée(s)")
+
+    if args.profile:
+        stage_metrics.print_report()
+        try:
+            stage_metrics.write_report(f'{output_dir}/profile.json')
+        except Exception as _e:
+            log_error('',output_dir,_e)
+    if metrics.parse_profiler is not None and \
+       metrics.parse_profiler.dump(f'{output_dir}/profile_parse.prof'):
+        print(f'Profil de l\'analyse des pages : {output_dir}/profile_parse.prof')
+
+    nb_log_dropped = shutdown_logging()
+    if nb_log_dropped:
+        print(f'{nb_log_dropped} log(s) abandonné(s) (file de logs pleine)')
+
+    nb_error = error_registry.total
+    if nb_error!=0:
+        print('###########')
+        print(f'Le programme à recontré {nb_error} erreur(s), consultez les logs')
+        print('Erreurs par fonction : '+', '.join(f'{func_name} ({count})' for func_name, count
+                                                  in error_registry.summary()['by_function'].items()))
+        print(f'Résumé des erreurs : {output_dir}/errors_summary.json')
+    else:
+        print('Tout c\'est bien déroulé, le programme n\'a pas rencontré d\'erreur')
+    print('###########')
+    print('Fin du programme')
+    print('###########')
@@ -0,0 +1,14 @@
+"""Constantes partagées par les modules du scrapper"""
+APP_NAME = 'OpenClassRoom projet_2 Test' #Nom de l'application pour les logs
+DEFAULT_URL = 'http://books.toscrape.com/' #url par défaut sinon précisé par l'utilisateur
+BOOK_FIELDS = ('product_page_url', 'universal_product_code', 'title', 'price_including_tax',
+               'price_excluding_tax', 'number_available', 'product_description',
+               'category', 'review_rating', 'image_url') #colonnes des fichiers de sortie
+IMAGE_PATH_FIELD = 'image_path' #colonne du chemin local de l'image (post-traitement des images)
+DICT_STARS = {
+                'One':1,
+                'Two':2,
+                'Three':3,
+                'Four':4,
+                'Five':5,
+            }
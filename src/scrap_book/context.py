@@ -0,0 +1,40 @@
+"""Contexte d'un scrapping transmis aux différentes étapes : client http, cache http,
+empreintes des pages et analyseur des pages livres"""
+from .network import HttpClient
+
+
+class ScrapeContext():
+    """Configuration d'un scrapping, transmise aux étapes (découverte, récupération, images)
+    au lieu de variables de module : chaque Scraper a son propre contexte, deux scrappers
+    (ou un scrapper utilisé depuis un autre thread) ne partagent pas leur configuration
+    """
+    def __init__(self, http=None, http_cache=None, fingerprint_store=None, parser='lxml'):
+        """
+        Args:
+            http (HttpClient, optional): client http, un client avec les paramètres par défaut
+                                         est créé s'il n'est pas fourni. Defaults to None.
+            http_cache (HttpCache, optional): cache http (None : pas de cache).
+                                              Defaults to None.
+            fingerprint_store (FingerprintStore, optional): empreintes des pages livres
+                                                            (None : désactivées).
+                                                            Defaults to None.
+            parser (str, optional): analyseur des pages livres (clé de parsing.BOOK_PARSERS).
+                                    Defaults to 'lxml'.
+        """
+        self.http = http if http is not None else HttpClient()
+        self.http_cache = http_cache
+        self.fingerprint_store = fingerprint_store
+        self.parser = parser
+
+default_context = ScrapeContext() #contexte des fonctions appelées sans contexte (hors Scraper)
+
+def get_context(context=None):
+    """Renvoie le contexte fourni ou, à défaut, le contexte par défaut
+
+    Args:
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Returns:
+        ScrapeContext: le contexte
+    """
+    return context if context is not None else default_context
@@ -0,0 +1,374 @@
+"""Découverte des livres : index des catégories et pages de liste"""
+import fnmatch
+import posixpath
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from .cache import cached_get
+from .logs import log_error, log_info
+from .metrics import stage_metrics
+from .utils import convert_price, get_number_in_string
+
+DEFAULT_PORTS = {'http': 80, 'https': 443} #ports implicites supprimés des url canoniques
+
+category_index = {} #index des catégories de chaque site {url: ({catégorie: url}, [sous-catégories])}
+category_index_lock = threading.Lock()
+
+def get_category_index(url, context=None):
+    """Renvoie l'index des catégories du site, la page d'accueil n'est téléchargée
+    et analysée qu'une seule fois puis l'index est conservé en mémoire
+
+    Args:
+        url (string): url du site
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Returns:
+        tuple(dict, list): ({catégorie: url de la catégorie}, liste des sous-catégories)
+    """
+    with category_index_lock:
+        if url not in category_index:
+            category_index[url] = parse_category_index(url, cached_get(url, context).text)
+        return category_index[url]
+
+def parse_category_index(url, page):
+    """Construit l'index des catégories à partir du html de la page d'accueil du site
+
+    Args:
+        url (string): url du site
+        page (str): html de la page d'accueil
+
+    Returns:
+        tuple(dict, list): ({catégorie: url de la catégorie}, liste des sous-catégories)
+    """
+    from bs4 import BeautifulSoup #import différé : bs4 n'est pas chargé à l'import du paquet
+    soup = BeautifulSoup(page,features="lxml")
+    soup = soup.find('div',{'class':'side_categories'})
+    index = {}
+    for li in soup.find_all('a'):
+        index.setdefault(li.text.strip().lower().replace(' ','-'), urljoin(url,li['href']))
+    #les sous-catégories sont imbriquées sous la catégorie racine (tous les livres)
+    sub_categories = [li.text.strip().lower().replace(' ','-')
+                      for li in soup.select('ul ul a')]
+    return index, sub_categories or list(index)
+
+def get_category(url,category,context=None):
+    """Renvoie l'url de la catégorie fournie en entrée
+
+    Args:
+        url (string): url du site
+        category (string): catégorie recherchée
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Returns:
+        string: url de la catégoerie
+    """
+    try:
+        return get_category_index(url, context)[0].get(category)
+    except Exception as _e:
+        log_error('', [url,category],_e)
+        return None
+
+def resolve_categories(url, list_pattern=None, context=None):
+    """Renvoie les catégories du site correspondant aux noms ou motifs fournis
+    (ex: "travel", "sci*", "*fiction"), toutes les sous-catégories si aucun motif n'est fourni
+
+    Args:
+        url (string): url du site
+        list_pattern (list[str], optional): noms ou motifs de catégories. Defaults to None.
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Returns:
+        list[str]: catégories trouvées, dans l'ordre de l'index du site
+    """
+    try:
+        index, sub_categories = get_category_index(url, context)
+    except Exception as _e:
+        log_error('', [url,list_pattern],_e)
+        return []
+    if not list_pattern:
+        return list(sub_categories)
+    list_category = []
+    for pattern in list_pattern:
+        pattern = pattern.strip().lower().replace(' ','-')
+        matches = [cat for cat in index if fnmatch.fnmatchcase(cat, pattern)]
+        if not matches:
+            log_error('Catégorie introuvable', [url,pattern],'')
+        list_category.extend(cat for cat in matches if cat not in list_category)
+    return list_category
+
+def canonicalize_url(url):
+    """Renvoie la forme canonique d'une url pour qu'un même livre publié sous des url
+    écrites différemment ne soit récupéré qu'une fois : schéma et site en minuscules,
+    port par défaut supprimé, segments "." et ".." et "/" répétés résolus, "index.html"
+    ajouté aux répertoires, paramètres triés et fragment supprimé
+
+    Args:
+        url (str): url absolue
+
+    Returns:
+        str: url canonique
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+    if parts.port is not None and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{netloc}:{parts.port}'
+    path = posixpath.normpath(parts.path) if parts.path else '/'
+    if path.startswith('//'): #normpath conserve deux "/" initiaux (POSIX)
+        path = '/' + path.lstrip('/')
+    if parts.path.endswith('/') and path != '/':
+        path += '/index.html'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+def get_url_page(url_base, num_page):
+    """Genere l'url de la page num_page
+       Attention, uniquement valide pour la page de test
+
+    Args:
+        url_base (str): url_de base
+        num_page (int): numéro de la page recherchée
+
+    Returns:
+        str: url de sortie
+    """
+    return f'{url_base}/catalogue/page-{num_page}.html'
+
+def get_url_category_page(url_base,num_page):
+    """Renvoie l'url paginée on essaie de remplacer "index.html" par "page-{num_page}.html"
+
+    Args:
+        url_base (str): url de base 
+        num_page (int): numéro de pages
+
+    Returns:
+        str: url de sortie
+    """
+    try:
+        return url_base.replace('index.html',f'page-{num_page}.html')
+    except Exception as _e:
+        log_error('', [url_base,num_page],_e)
+        return None
+
+def get_list_books_url(url_base, context=None):
+    """Renvoie la liste des url de tous les livres présent sur la page
+
+    Args:
+        url_base (str): url a scrapper
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Returns:
+        list: liste d'url pour tous les livres de la page
+    """
+    return [info['product_page_url'] for info in get_list_books_info(url_base, context)]
+
+def get_list_books_info(url_base, context=None):
+    """Renvoie les informations affichées sur la page de liste pour chaque livre :
+    url, prix et disponibilité
+
+    Args:
+        url_base (str): url a scrapper
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Returns:
+        list[dict]: liste de {product_page_url, price_including_tax, is_available}
+    """
+    return get_list_page_info(url_base, context)[0]
+
+def get_list_page_info(url_base, context=None):
+    """Renvoie les informations des livres de la page de liste (get_list_books_info)
+    et le nombre total de pages de la liste
+
+    Args:
+        url_base (str): url a scrapper
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Returns:
+        tuple(list[dict], int): (informations des livres, nombre de pages)
+    """
+    with stage_metrics.timer('discovery'):
+        return parse_list_page(url_base, cached_get(url_base, context).content)
+
+def parse_list_page(url_base, content):
+    """Analyse le contenu d'une page de liste (get_list_page_info)
+
+    Args:
+        url_base (str): url de la page
+        content (bytes): contenu brut de la page
+
+    Returns:
+        tuple(list[dict], int): (informations des livres, nombre de pages)
+    """
+    from bs4 import BeautifulSoup #import différé : bs4 n'est pas chargé à l'import du paquet
+    #on laisse BeautifulSoup détecter l'encodage déclaré par la page pour lire le symbole monétaire
+    soup = BeautifulSoup(content,features="lxml")
+    list_info = []
+    for article in soup.find('ol',{'class':'row'}).findAll('article',{'class':'product_pod'}):
+        price = article.find('p',{'class':'price_color'})
+        availability = article.find('p',{'class':'availability'})
+        list_info.append({
+            'product_page_url': canonicalize_url(urljoin(url_base,
+                                                         article.find('h3').find('a')['href'])),
+            'price_including_tax': convert_price(price.text.strip()) if price else None,
+            'is_available': availability is not None and \
+                            availability.text.strip().lower() == 'in stock',
+        })
+    return list_info, get_nb_pages(soup, len(list_info))
+
+PAGER_PATTERN = re.compile(r'of\s+(\d+)') #pagination "Page 1 of N"
+
+def get_nb_pages(soup, nb_book_page):
+    """Renvoie le nombre de pages d'une liste à partir de la pagination ("Page 1 of N")
+    ou à défaut du nombre de résultats de la liste
+
+    Args:
+        soup (BeautifulSoup): soupe de la page de liste
+        nb_book_page (int): nombre de livres sur la page
+
+    Returns:
+        int: nombre de pages de la liste
+    """
+    pager = soup.find('li',{'class':'current'})
+    if pager is not None:
+        match = PAGER_PATTERN.search(pager.text)
+        if match:
+            return int(match.group(1))
+    results = soup.find('form',{'class':'form-horizontal'})
+    if results is not None and results.find('strong') is not None and nb_book_page > 0:
+        nb_results = get_number_in_string(results.find('strong').text)
+        if nb_results:
+            return -(-nb_results//nb_book_page)
+    return 1
+
+def get_first_list_page_info(url_to_scrap, category=None, context=None):
+    """Télécharge la première page de liste du site (ou de la catégorie), qui donne le
+    nombre de pages de la liste
+
+    Args:
+        url_to_scrap (str): url du site
+        category (str, optional): catégorie à scrapper, None pour tout le site. Defaults to None.
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Returns:
+        tuple(list[dict], list[str]): (informations des livres de la première page,
+                                       url des pages suivantes),
+                                      None si la catégorie ou la page est introuvable
+    """
+    if category is not None:
+        log_info(f"Catégorie: {category} - Scrapping des url de chaque livre")
+        url_first_page = get_category(url_to_scrap,category,context) #on récupère l'url de la catégorie
+        if url_first_page is None:
+            log_error('Catégorie introuvable',[url_to_scrap,category],'')
+            return None
+    else:
+        log_info(f"Aucune catégorie - Scrapping des url de chaque livre")
+        url_first_page = get_url_page(url_to_scrap,1)
+
+    try:
+        list_info, nb_pages = get_list_page_info(url_first_page, context)
+    except Exception as _e:
+        log_error('',url_first_page,_e)
+        return None
+    log_info(f"Catégorie: {category or 'toutes'} - {nb_pages} page(s) de liste à scrapper")
+    if category is not None:
+        list_url_page = [get_url_category_page(url_first_page,n) for n in range(2,nb_pages+1)]
+    else:
+        list_url_page = [get_url_page(url_to_scrap,n) for n in range(2,nb_pages+1)]
+    return list_info, list_url_page
+
+def iter_list_pages_info(url_to_scrap, category=None, workers=8, context=None):
+    """Parcourt les pages de liste du site (ou de la catégorie) : la première page donne
+    le nombre de pages, les pages suivantes sont ensuite téléchargées en parallèle.
+    Les informations de chaque page sont renvoyées dès que la page est analysée
+
+    Args:
+        url_to_scrap (str): url du site
+        category (str, optional): catégorie à scrapper, None pour tout le site. Defaults to None.
+        workers (int, optional): nombre de pages téléchargées en parallèle. Defaults to 8.
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Yields:
+        list[dict]: informations des livres de chaque page (get_list_books_info)
+    """
+    first_page = get_first_list_page_info(url_to_scrap, category, context)
+    if first_page is None:
+        return
+    list_info, list_url_page = first_page
+    yield list_info
+    if not list_url_page:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(get_list_books_info, url, context): url
+                   for url in list_url_page}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as _e:
+                log_error('',futures[future],_e)
+
+def iter_categories_pages_info(url_to_scrap, list_category, workers=8, context=None):
+    """Parcourt les pages de liste de plusieurs catégories en parallèle,
+    les pages de toutes les catégories sont renvoyées dans un flux unique.
+    Premières pages et pages suivantes de toutes les catégories partagent un seul pool
+    de {workers} threads
+
+    Args:
+        url_to_scrap (str): url du site
+        list_category (list[str]): catégories à scrapper
+        workers (int, optional): nombre de pages téléchargées en parallèle. Defaults to 8.
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Yields:
+        list[dict]: informations des livres de chaque page (get_list_books_info)
+    """
+    nb_book = dict.fromkeys(list_category, 0)
+    nb_pages_left = {} #pages de liste de chaque catégorie pas encore récupérées
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        #url None : première page de la catégorie, qui donne les url des pages suivantes
+        futures = {executor.submit(get_first_list_page_info, url_to_scrap, category, context):
+                   (category, None) for category in list_category}
+        while futures:
+            finished, _pending = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                category, url = futures.pop(future)
+                list_info = None
+                try:
+                    result = future.result()
+                except Exception as _e:
+                    log_error('',url or [url_to_scrap,category],_e)
+                    result = None
+                if url is None:
+                    list_url_page = []
+                    if result is not None:
+                        list_info, list_url_page = result
+                    for url_page in list_url_page:
+                        futures[executor.submit(get_list_books_info, url_page, context)] = \
+                            (category, url_page)
+                    nb_pages_left[category] = len(list_url_page)
+                else:
+                    list_info = result
+                    nb_pages_left[category] -= 1
+                if list_info is not None:
+                    nb_book[category] += len(list_info)
+                    yield list_info
+                if not nb_pages_left[category]:
+                    log_info(f"Catégorie: {category} - {nb_book[category]} livre(s) trouvé(s)")
+
+def discover_list_books_info(url_to_scrap, category=None, workers=8, context=None):
+    """Parcourt les pages de liste du site (ou de la catégorie) et renvoie les informations
+    de tous les livres trouvés
+
+    Args:
+        url_to_scrap (str): url du site
+        category (str, optional): catégorie à scrapper, None pour tout le site. Defaults to None.
+        workers (int, optional): nombre de pages téléchargées en parallèle. Defaults to 8.
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Returns:
+        list[dict]: informations des pages de liste (get_list_books_info)
+    """
+    return [info for list_info in iter_list_pages_info(url_to_scrap, category, workers, context)
+            for info in list_info]
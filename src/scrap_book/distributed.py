@@ -0,0 +1,529 @@
+"""Mode distribué : file de travail partagée entre un coordinateur (découverte, enregistrement)
+et des workers (récupération des livres), directement (SQLite WAL) ou par un courtier http"""
+import functools
+import hmac
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tqdm import tqdm
+
+from . import parsing
+from .book import Book
+from .logs import log_error, log_info
+
+POLL_INTERVAL = 0.2 #attente en secondes entre deux lectures de la file
+LEASE_RENEWAL = 3 #le délai du lot en cours est prolongé {LEASE_RENEWAL} fois par délai
+PUSH_BATCH = 20 #nombre d'url ajoutées à la file en une transaction
+TOKEN_HEADER = 'X-Scrap-Book-Token' #en-tête du secret partagé entre le courtier et les workers
+
+class WorkQueue():
+    """File de travail persistante (base SQLite en mode WAL) partagée par les processus
+    d'une même machine : le coordinateur y ajoute les url des livres, chaque worker prend
+    un lot d'url pour {visibility_timeout} secondes puis renvoie les livres récupérés.
+    Une url dont le délai a expiré (worker arrêté) est de nouveau distribuée, au plus
+    {max_attempts} fois, puis elle est marquée en échec
+    """
+    def __init__(self, path, reset=False, max_attempts=3):
+        """
+        Args:
+            path (str): chemin de la base
+            reset (bool, optional): vide la file (nouvelle exécution du coordinateur).
+                                    Defaults to False.
+            max_attempts (int, optional): nombre maximum de distributions d'une url,
+                                          utilisé si {reset}. Defaults to 3.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                    check_same_thread=False)
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS tasks (
+                                    url TEXT PRIMARY KEY,
+                                    status TEXT,
+                                    attempts INTEGER,
+                                    worker TEXT,
+                                    lease_until REAL)""")
+            self.conn.execute('CREATE INDEX IF NOT EXISTS tasks_status '
+                              'ON tasks (status, lease_until)')
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS results (
+                                    url TEXT PRIMARY KEY,
+                                    book TEXT,
+                                    worker TEXT,
+                                    created_at REAL)""")
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            if reset:
+                self.conn.execute('BEGIN IMMEDIATE')
+                for table in ('tasks', 'results', 'meta'):
+                    self.conn.execute(f'DELETE FROM {table}')
+                self.conn.execute("INSERT INTO meta VALUES ('max_attempts', ?)",
+                                  (str(max(1, max_attempts)),))
+                self.conn.execute('COMMIT')
+
+    def get_meta(self, key, default=None):
+        """Renvoie une valeur des paramètres de la file
+
+        Args:
+            key (str): nom du paramètre
+            default (str, optional): valeur par défaut. Defaults to None.
+
+        Returns:
+            str: valeur du paramètre
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT value FROM meta WHERE key=?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def push(self, urls):
+        """Ajoute des url à la file (une url déjà présente est ignorée)
+
+        Args:
+            urls (list[str]): url des livres
+        """
+        if not urls:
+            return
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.executemany("INSERT OR IGNORE INTO tasks VALUES (?, 'pending', 0, NULL, NULL)",
+                                  [(url,) for url in urls])
+            self.conn.execute('COMMIT')
+
+    def set_discovery_done(self):
+        """Indique que toutes les url ont été ajoutées à la file
+        """
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('discovery_done', '1')")
+
+    def lease(self, worker, nb_url, visibility_timeout=60):
+        """Prend un lot d'url à récupérer : url en attente ou dont le délai a expiré
+
+        Args:
+            worker (str): identifiant du worker
+            nb_url (int): nombre maximum d'url
+            visibility_timeout (float, optional): délai en secondes après lequel les url
+                                                  sont de nouveau distribuées. Defaults to 60.
+
+        Returns:
+            list[str]: url à récupérer (liste vide si aucune url n'est disponible)
+        """
+        max_attempts = int(self.get_meta('max_attempts', 3))
+        now = time.time()
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                self.conn.execute("UPDATE tasks SET status='failed' WHERE status='leased' "
+                                  "AND lease_until<? AND attempts>=?", (now, max_attempts))
+                urls = [row[0] for row in self.conn.execute(
+                    "SELECT url FROM tasks WHERE status='pending' OR "
+                    "(status='leased' AND lease_until<?) LIMIT ?", (now, nb_url))]
+                self.conn.executemany("UPDATE tasks SET status='leased', attempts=attempts+1, "
+                                      "worker=?, lease_until=? WHERE url=?",
+                                      [(worker, now+visibility_timeout, url) for url in urls])
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+        return urls
+
+    def extend(self, worker, urls, visibility_timeout=60):
+        """Prolonge le délai des url toujours prises par le worker (lot en cours de récupération)
+
+        Args:
+            worker (str): identifiant du worker
+            urls (list[str]): url du lot en cours
+            visibility_timeout (float, optional): nouveau délai en secondes. Defaults to 60.
+        """
+        if not urls:
+            return
+        lease_until = time.time()+visibility_timeout
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.executemany("UPDATE tasks SET lease_until=? "
+                                  "WHERE url=? AND status='leased' AND worker=?",
+                                  [(lease_until, url, worker) for url in urls])
+            self.conn.execute('COMMIT')
+
+    def ack(self, worker, results):
+        """Enregistre les livres récupérés, seul le premier résultat d'une url est conservé
+        (une url distribuée de nouveau peut être récupérée deux fois)
+
+        Args:
+            worker (str): identifiant du worker
+            results (list[tuple(str, dict)]): (url, livre au format Book.to_dict)
+        """
+        if not results:
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.executemany('INSERT OR IGNORE INTO results VALUES (?,?,?,?)',
+                                  [(url, json.dumps(book, ensure_ascii=False), worker, now)
+                                   for url, book in results])
+            self.conn.executemany("UPDATE tasks SET status='done', lease_until=NULL WHERE url=?",
+                                  [(url,) for url, _book in results])
+            self.conn.execute('COMMIT')
+
+    def fail(self, worker, urls):
+        """Remet en attente les url qu'un worker n'a pas pu récupérer,
+        ou les marque en échec après {max_attempts} distributions
+
+        Args:
+            worker (str): identifiant du worker
+            urls (list[str]): url en erreur
+        """
+        if not urls:
+            return
+        max_attempts = int(self.get_meta('max_attempts', 3))
+        with self.lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.executemany("UPDATE tasks SET status=CASE WHEN attempts>=? THEN 'failed' "
+                                  "ELSE 'pending' END, lease_until=NULL "
+                                  "WHERE url=? AND status='leased' AND worker=?",
+                                  [(max_attempts, url, worker) for url in urls])
+            self.conn.execute('COMMIT')
+
+    def get_results(self, after=0):
+        """Renvoie les livres enregistrés après le résultat {after}
+
+        Args:
+            after (int, optional): numéro du dernier résultat déjà lu. Defaults to 0.
+
+        Returns:
+            list[tuple(int, Book)]: (numéro du résultat, livre)
+        """
+        with self.lock:
+            rows = self.conn.execute('SELECT rowid, book FROM results WHERE rowid>? '
+                                     'ORDER BY rowid', (after,)).fetchall()
+        return [(rowid, Book.from_dict(json.loads(book))) for rowid, book in rows]
+
+    def get_failed(self):
+        """Renvoie les url en échec
+
+        Returns:
+            list[str]: url en échec
+        """
+        with self.lock:
+            return [row[0] for row in
+                    self.conn.execute("SELECT url FROM tasks WHERE status='failed'")]
+
+    def counts(self):
+        """Renvoie le nombre d'url de la file par état
+
+        Returns:
+            dict: {pending, leased, done, failed}
+        """
+        stats = dict.fromkeys(('pending', 'leased', 'done', 'failed'), 0)
+        with self.lock:
+            for status, count in self.conn.execute('SELECT status, COUNT(*) FROM tasks '
+                                                   'GROUP BY status'):
+                stats[status] = count
+        return stats
+
+    def is_finished(self):
+        """Indique si toutes les url ont été ajoutées puis récupérées (ou sont en échec)
+
+        Returns:
+            bool: True si la file est terminée
+        """
+        if self.get_meta('discovery_done') is None:
+            return False
+        counts = self.counts()
+        return counts['pending'] == 0 and counts['leased'] == 0
+
+    def close(self):
+        """Ferme la base
+        """
+        with self.lock:
+            self.conn.close()
+
+class RemoteWorkQueue():
+    """File de travail d'un coordinateur distant (BrokerServer), même interface
+    que WorkQueue pour les workers
+    """
+    def __init__(self, url, token=None):
+        """
+        Args:
+            url (str): url du courtier (http://hôte:port)
+            token (str, optional): secret partagé attendu par le courtier. Defaults to None.
+        """
+        import requests
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+        if token:
+            self.session.headers[TOKEN_HEADER] = token
+
+    def call(self, method, **params):
+        """Appelle une méthode de la file du coordinateur
+
+        Args:
+            method (str): nom de la méthode
+            **params: paramètres de la méthode
+
+        Returns:
+            object: résultat de la méthode
+        """
+        response = self.session.post(f'{self.url}/{method}', json=params, timeout=30)
+        response.raise_for_status()
+        return response.json()['result']
+
+    def lease(self, worker, nb_url, visibility_timeout=60):
+        """Voir WorkQueue.lease
+        """
+        return self.call('lease', worker=worker, nb_url=nb_url,
+                         visibility_timeout=visibility_timeout)
+
+    def extend(self, worker, urls, visibility_timeout=60):
+        """Voir WorkQueue.extend
+        """
+        return self.call('extend', worker=worker, urls=urls,
+                         visibility_timeout=visibility_timeout)
+
+    def ack(self, worker, results):
+        """Voir WorkQueue.ack
+        """
+        return self.call('ack', worker=worker, results=results)
+
+    def fail(self, worker, urls):
+        """Voir WorkQueue.fail
+        """
+        return self.call('fail', worker=worker, urls=urls)
+
+    def counts(self):
+        """Voir WorkQueue.counts
+        """
+        return self.call('counts')
+
+    def is_finished(self):
+        """Voir WorkQueue.is_finished
+        """
+        return self.call('is_finished')
+
+    def close(self):
+        """Ferme la session http
+        """
+        self.session.close()
+
+class BrokerServer():
+    """Serveur http du coordinateur qui donne accès à sa file de travail aux workers
+    d'autres machines (RemoteWorkQueue), les appels sont des POST json /{méthode}.
+    Seuls les appels qui portent le secret partagé dans l'en-tête TOKEN_HEADER sont acceptés
+    """
+    METHODS = ('lease', 'extend', 'ack', 'fail', 'counts', 'is_finished')
+
+    def __init__(self, work_queue, token, host='127.0.0.1', port=8700):
+        """
+        Args:
+            work_queue (WorkQueue): file de travail du coordinateur
+            token (str): secret partagé avec les workers
+            host (str, optional): adresse d'écoute, '0.0.0.0' pour toutes les interfaces.
+                                  Defaults to '127.0.0.1'.
+            port (int, optional): port d'écoute. Defaults to 8700.
+        """
+        if not token:
+            raise ValueError('le courtier nécessite un secret partagé')
+        self.work_queue = work_queue
+        self.token = token
+        self.server = ThreadingHTTPServer((host, port), self.get_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def get_handler(self):
+        """Renvoie la classe de traitement des requêtes des workers
+
+        Returns:
+            type: classe dérivée de BaseHTTPRequestHandler
+        """
+        work_queue = self.work_queue
+        methods = self.METHODS
+        token = self.token.encode('utf-8')
+
+        class BrokerHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                method = self.path.strip('/')
+                size = int(self.headers.get('Content-Length') or 0)
+                if not hmac.compare_digest(self.headers.get(TOKEN_HEADER, '').encode('utf-8'),
+                                           token):
+                    self.rfile.read(size)
+                    self.send_response(401)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                try:
+                    if method not in methods:
+                        raise ValueError(f'méthode inconnue : {method}')
+                    params = json.loads(self.rfile.read(size) or b'{}')
+                    body = json.dumps({'result': getattr(work_queue, method)(**params)})
+                    status = 200
+                except Exception as _e:
+                    log_error('',self.path,_e)
+                    body = json.dumps({'error': str(_e)})
+                    status = 400
+                body = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return BrokerHandler
+
+    def start(self):
+        """Démarre le serveur dans un thread
+        """
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        log_info(f"Courtier de la file de travail à l'écoute sur {host}:{port}")
+
+    def close(self, grace=5*POLL_INTERVAL):
+        """Arrête le serveur, après avoir laissé aux workers en attente le temps
+        de constater la fin du scrapping
+
+        Args:
+            grace (float, optional): délai en secondes avant l'arrêt. Defaults to 5*POLL_INTERVAL.
+        """
+        time.sleep(grace)
+        self.server.shutdown()
+        self.server.server_close()
+
+def open_work_queue(location, token=None):
+    """Ouvre la file de travail d'un worker : base SQLite locale ou coordinateur distant
+
+    Args:
+        location (str): chemin de la base ou url du courtier (http://hôte:port)
+        token (str, optional): secret partagé avec le courtier. Defaults to None.
+
+    Returns:
+        WorkQueue | RemoteWorkQueue: la file de travail
+    """
+    if location.startswith(('http://', 'https://')):
+        return RemoteWorkQueue(location, token)
+    return WorkQueue(location)
+
+def iter_books_from_queue(work_queue, list_url):
+    """Ajoute les url des livres à la file de travail au fur et à mesure de la découverte
+    (dans un thread) et renvoie les livres récupérés par les workers
+
+    Args:
+        work_queue (WorkQueue): la file de travail
+        list_url (iterable[str]): url des livres
+
+    Yields:
+        Book: les livres dans l'ordre de leur récupération
+    """
+    def push_urls():
+        batch = []
+        try:
+            for url in list_url:
+                batch.append(url)
+                if len(batch) >= PUSH_BATCH:
+                    work_queue.push(batch)
+                    batch = []
+            work_queue.push(batch)
+        except Exception as _e:
+            log_error('',work_queue.path,_e)
+        finally:
+            work_queue.set_discovery_done()
+
+    def iter_results():
+        last_result = 0
+        while True:
+            finished = work_queue.is_finished()
+            results = work_queue.get_results(last_result)
+            for last_result, book in results:
+                yield book
+            if finished:
+                return
+            if not results:
+                time.sleep(POLL_INTERVAL)
+
+    pusher = threading.Thread(target=push_urls, daemon=True)
+    pusher.start()
+    yield from tqdm(iter_results())
+    pusher.join()
+    for url in work_queue.get_failed():
+        log_error('Livre non récupéré par les workers',url,'')
+    log_info(f"File de travail : {work_queue.counts()}")
+
+def run_worker(work_queue, workers=8, worker_id=None, batch_size=None, visibility_timeout=60,
+               context=None):
+    """Récupère les livres de la file de travail jusqu'à ce qu'elle soit terminée
+
+    Args:
+        work_queue (WorkQueue | RemoteWorkQueue): la file de travail
+        workers (int, optional): nombre de livres récupérés en parallèle. Defaults to 8.
+        worker_id (str, optional): identifiant du worker, par défaut "{machine}-{pid}".
+                                   Defaults to None.
+        batch_size (int, optional): nombre d'url prises à chaque fois, par défaut
+                                    2 fois {workers} : des lots plus grands laissent des
+                                    workers inactifs en fin de scrapping. Defaults to None.
+        visibility_timeout (float, optional): délai en secondes après lequel les url prises
+                                              sont de nouveau distribuées, prolongé
+                                              tant que le lot est en cours de récupération.
+                                              Defaults to 60.
+        context (ScrapeContext, optional): contexte du scrapping (client et cache http,
+                                           analyseur). Defaults to None.
+
+    Returns:
+        dict: nombre de livres récupérés et en erreur
+    """
+    worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+    batch_size = batch_size or 2*max(1, workers)
+    stats = {'fetched':0, 'errors':0}
+    get_book = functools.partial(parsing.get_book_from_url, context=context)
+    leased = [] #url du lot en cours, dont le délai est prolongé tant qu'il est récupéré
+    stop = threading.Event()
+
+    def renew_leases():
+        while not stop.wait(visibility_timeout/LEASE_RENEWAL):
+            urls = list(leased)
+            if not urls:
+                continue
+            try:
+                work_queue.extend(worker_id, urls, visibility_timeout)
+            except Exception as _e:
+                log_error('',worker_id,_e)
+
+    renewer = threading.Thread(target=renew_leases, daemon=True)
+    renewer.start()
+    log_info(f"Worker {worker_id} : démarrage")
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            while True:
+                urls = work_queue.lease(worker_id, batch_size, visibility_timeout)
+                if not urls:
+                    if work_queue.is_finished():
+                        break
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                leased[:] = urls
+                results = []
+                failed = []
+                for url, book in zip(urls, executor.map(get_book, urls)):
+                    if book is None:
+                        failed.append(url)
+                    else:
+                        results.append((url, book.to_dict()))
+                work_queue.ack(worker_id, results)
+                work_queue.fail(worker_id, failed)
+                leased[:] = []
+                stats['fetched'] += len(results)
+                stats['errors'] += len(failed)
+    finally:
+        stop.set()
+        renewer.join()
+    log_info(f"Worker {worker_id} : {stats}")
+    return stats
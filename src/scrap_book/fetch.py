@@ -0,0 +1,183 @@
+"""Récupération concurrente des livres (threads de téléchargement,
+processus d'analyse optionnels)"""
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from tqdm import tqdm
+
+from . import cache, parsing
+from .book import Book
+from .context import get_context
+from .logs import get_process_pool_logging, log_error
+from .metrics import stage_metrics
+
+PARSE_QUEUE_FACTOR = 4 #nombre de pages en attente d'analyse par processus d'analyse
+WINDOW_FACTOR = 4 #nombre de livres soumis en avance par thread de téléchargement
+
+def iter_bounded_map(executor, func, iterable, window):
+    """Équivalent d'executor.map qui consomme {iterable} au fur et à mesure : au plus
+    {window} tâches sont soumises en avance et les résultats terminés sont renvoyés dès que
+    possible (dans l'ordre), sans attendre la fin de {iterable}
+
+    Args:
+        executor (Executor): pool d'exécution
+        func (callable): fonction appliquée à chaque élément
+        iterable (iterable): éléments, un générateur est lu au fur et à mesure
+        window (int): nombre maximum de tâches en cours
+
+    Yields:
+        object: résultat de {func} pour chaque élément, dans l'ordre des éléments
+    """
+    futures = deque()
+    for item in iterable:
+        #on renvoie les résultats déjà terminés avant d'attendre l'élément suivant
+        while futures and (futures[0].done() or len(futures) >= window):
+            yield futures.popleft().result()
+        futures.append(executor.submit(func, item))
+    while futures:
+        yield futures.popleft().result()
+
+def iter_books_from_urls(list_url, workers=8, parse_workers=0, context=None):
+    """Récupère les livres d'une liste d'url en parallèle et les renvoie au fur et à mesure,
+    dans le même ordre que les url
+
+    Args:
+        list_url (iterable[str]): url des livres, les url d'un générateur sont soumises
+                                  au fur et à mesure qu'elles sont produites
+        workers (int, optional): nombre de livres récupérés en parallèle. Defaults to 8.
+        parse_workers (int, optional): nombre de processus dédiés à l'analyse des pages,
+                                       0 pour analyser les pages dans les threads de téléchargement.
+                                       Defaults to 0.
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Yields:
+        Book: les livres (None si le livre n'a pas pu être récupéré)
+    """
+    total = len(list_url) if hasattr(list_url, '__len__') else None
+    if parse_workers > 0:
+        yield from tqdm(iter_books_process_pool(list_url, workers, parse_workers, context),
+                        total=total)
+    else:
+        get_book = functools.partial(parsing.get_book_from_url, context=context)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            yield from tqdm(iter_bounded_map(executor, get_book, list_url,
+                                             max(1, workers)*WINDOW_FACTOR), total=total)
+
+def get_books_from_urls(list_url, workers=8, on_book=None, parse_workers=0, context=None):
+    """Récupère les livres d'une liste d'url en parallèle,
+    les livres sont renvoyés dans le même ordre que les url
+
+    Args:
+        list_url (list[str]): liste d'url des livres
+        workers (int, optional): nombre de livres récupérés en parallèle. Defaults to 8.
+        on_book (callable, optional): fonction appelée avec chaque livre dès qu'il est récupéré.
+                                      Defaults to None.
+        parse_workers (int, optional): nombre de processus dédiés à l'analyse des pages,
+                                       0 pour analyser les pages dans les threads de téléchargement.
+                                       Defaults to 0.
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Returns:
+        list[Book]: liste des livres (None si le livre n'a pas pu être récupéré)
+    """
+    list_book = []
+    for book in iter_books_from_urls(list_url, workers, parse_workers, context):
+        if on_book is not None:
+            on_book(book)
+        list_book.append(book)
+    return list_book
+
+def fetch_book_page(url, context=None):
+    """Télécharge la page d'un livre sans l'analyser
+
+    Args:
+        url (str): url du livre
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Returns:
+        tuple(bytes, str): (contenu brut de la page, encodage) ou None en cas d'erreur
+    """
+    try:
+        with stage_metrics.timer('fetch'):
+            _reponse = cache.cached_get(url, context)
+        return _reponse.content, _reponse.encoding or _reponse.apparent_encoding
+    except Exception as _e:
+        log_error('',url,_e)
+        return None
+
+def parse_book_page(url, content, encoding, parser_name):
+    """Analyse la page d'un livre (exécuté dans un processus du pool d'analyse)
+
+    Args:
+        url (str): url du livre
+        content (bytes): contenu brut de la page
+        encoding (str): encodage de la page
+        parser_name (str): analyseur à utiliser (clé de parsing.BOOK_PARSERS)
+
+    Returns:
+        tuple(tuple, float): (valeurs du livre (Book.to_tuple), durée de l'analyse en secondes)
+    """
+    start = time.perf_counter()
+    page = str(content, encoding, errors='replace')
+    return parsing.BOOK_PARSERS[parser_name](url, page).to_tuple(), time.perf_counter()-start
+
+def iter_books_process_pool(list_url, workers, parse_workers, context=None):
+    """Télécharge les pages des livres dans un pool de threads et les analyse dans un
+    pool de processus, le nombre de pages téléchargées en attente d'analyse est limité
+    à {parse_workers}*PARSE_QUEUE_FACTOR pour borner la mémoire.
+    Les pages dont l'empreinte n'a pas changé ne sont pas envoyées au pool (fingerprint)
+
+    Args:
+        list_url (iterable[str]): url des livres
+        workers (int): nombre de pages téléchargées en parallèle
+        parse_workers (int): nombre de processus d'analyse
+        context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+    Yields:
+        Book: les livres dans l'ordre des url (None si le livre n'a pas pu être récupéré)
+    """
+    pending_pages = threading.BoundedSemaphore(parse_workers*PARSE_QUEUE_FACTOR)
+    context = get_context(context)
+    parser_name = context.parser
+    store = context.fingerprint_store
+
+    with ProcessPoolExecutor(max_workers=parse_workers,
+                             **get_process_pool_logging()) as parse_pool, \
+         ThreadPoolExecutor(max_workers=max(1, workers)) as fetch_pool:
+
+        def fetch_and_submit(url):
+            pending_pages.acquire()
+            page = fetch_book_page(url, context)
+            if page is None:
+                pending_pages.release()
+                return url, None, None, None
+            content_hash = None
+            if store is not None:
+                book, content_hash = store.lookup(url, page[0])
+                if book is not None:
+                    pending_pages.release()
+                    return url, book, None, None
+            future = parse_pool.submit(parse_book_page, url, *page, parser_name)
+            future.add_done_callback(lambda _f: pending_pages.release())
+            return url, None, future, content_hash
+
+        window = max(1, workers)*WINDOW_FACTOR
+        for url, book, parse_future, content_hash in iter_bounded_map(fetch_pool,
+                                                                      fetch_and_submit,
+                                                                      list_url, window):
+            if parse_future is None:
+                yield book
+                continue
+            try:
+                book_values, duration = parse_future.result()
+                stage_metrics.record('parse', duration)
+                book = Book.from_tuple(book_values)
+                if content_hash is not None:
+                    store.record(url, content_hash, book)
+                yield book
+            except Exception as _e:
+                log_error('',url,_e)
+                yield None
@@ -0,0 +1,173 @@
+"""Empreintes du contenu des pages livres : détection des pages inchangées et des doublons"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from .book import Book
+
+WHITESPACE_PATTERN = re.compile(rb'\s+') #blancs ignorés par l'empreinte d'une page
+
+def hash_content(content):
+    """Renvoie l'empreinte du html normalisé d'une page (blancs successifs réduits à un espace)
+
+    Args:
+        content (bytes): contenu brut de la page
+
+    Returns:
+        str: empreinte hexadécimale
+    """
+    normalized = WHITESPACE_PATTERN.sub(b' ', content).strip()
+    return hashlib.blake2b(normalized, digest_size=16).hexdigest()
+
+def hash_book(book):
+    """Renvoie l'empreinte des champs d'un livre (hors url de la page, pour reconnaître
+    un même livre publié sous plusieurs url)
+
+    Args:
+        book (Book): le livre
+
+    Returns:
+        str: empreinte hexadécimale
+    """
+    fields = json.dumps(book.to_tuple()[1:], ensure_ascii=False).encode('utf-8')
+    return hashlib.blake2b(fields, digest_size=16).hexdigest()
+
+class FingerprintStore():
+    """Empreintes des pages livres conservées d'une exécution à l'autre (base SQLite) :
+        - l'empreinte du html de chaque url : une page identique n'est pas analysée,
+          le livre de l'exécution précédente est réutilisé
+        - l'empreinte des champs de chaque livre, indexée par UPC : un livre dont la page
+          a changé mais pas les champs est considéré comme inchangé
+    Pendant l'exécution, un livre déjà renvoyé sous une autre url (même UPC) est un doublon
+    """
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.status = {} #état des livres récupérés {url: 'new' | 'changed' | 'unchanged'}
+        self.seen_upc = set() #UPC des livres déjà renvoyés pendant l'exécution
+        self.stats = {'unchanged_pages':0, 'unchanged_books':0, 'changed':0, 'new':0,
+                      'duplicates':0}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS pages (
+                                    url TEXT PRIMARY KEY,
+                                    content_hash TEXT,
+                                    upc TEXT)""")
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS books (
+                                    upc TEXT PRIMARY KEY,
+                                    fields_hash TEXT,
+                                    book TEXT,
+                                    updated_at REAL)""")
+            self.conn.commit()
+
+    def lookup(self, url, content):
+        """Renvoie le livre de l'exécution précédente si la page n'a pas changé
+
+        Args:
+            url (str): url du livre
+            content (bytes): contenu brut de la page
+
+        Returns:
+            tuple(Book, str): (livre précédent, None si la page a changé ou est nouvelle ;
+                              empreinte de la page à transmettre à record)
+        """
+        content_hash = hash_content(content)
+        with self.lock:
+            row = self.conn.execute('SELECT pages.content_hash, books.book FROM pages '
+                                    'JOIN books ON books.upc=pages.upc WHERE pages.url=?',
+                                    (url,)).fetchone()
+            if row is None or row[0] != content_hash:
+                return None, content_hash
+            self.status[url] = 'unchanged'
+            self.stats['unchanged_pages'] += 1
+        book = Book.from_dict(json.loads(row[1]))
+        book.product_page_url = url
+        return book, content_hash
+
+    def record(self, url, content_hash, book):
+        """Enregistre les empreintes d'une page analysée et compare les champs du livre
+        avec ceux de l'exécution précédente
+
+        Args:
+            url (str): url du livre
+            content_hash (str): empreinte de la page (lookup)
+            book (Book): le livre
+        """
+        upc = book.universal_product_code or url
+        fields_hash = hash_book(book)
+        with self.lock:
+            row = self.conn.execute('SELECT fields_hash FROM books WHERE upc=?',
+                                    (upc,)).fetchone()
+            if row is None:
+                status = 'new'
+            elif row[0] == fields_hash:
+                status = 'unchanged'
+            else:
+                status = 'changed'
+            self.status[url] = status
+            self.stats['unchanged_books' if status == 'unchanged' else status] += 1
+            self.conn.execute('INSERT OR REPLACE INTO pages VALUES (?,?,?)',
+                              (url, content_hash, upc))
+            if status != 'unchanged':
+                self.conn.execute('INSERT OR REPLACE INTO books VALUES (?,?,?,?)',
+                                  (upc, fields_hash,
+                                   json.dumps(book.to_dict(), ensure_ascii=False), time.time()))
+            self.conn.commit()
+
+    def pop_status(self, book):
+        """Renvoie l'état d'un livre récupéré pendant l'exécution,
+        'duplicate' si le même livre (UPC) a déjà été renvoyé sous une autre url
+
+        Args:
+            book (Book): le livre
+
+        Returns:
+            str: 'new', 'changed', 'unchanged' ou 'duplicate'
+        """
+        with self.lock:
+            status = self.status.pop(book.product_page_url, 'new')
+            if book.universal_product_code is not None:
+                if book.universal_product_code in self.seen_upc:
+                    self.stats['duplicates'] += 1
+                    return 'duplicate'
+                self.seen_upc.add(book.universal_product_code)
+        return status
+
+    def close(self):
+        """Ferme la base
+
+        Returns:
+            dict: statistiques des empreintes
+        """
+        with self.lock:
+            self.conn.close()
+        return self.stats
+
+def get_book_from_content(url, content, parse, store=None):
+    """Renvoie le livre d'une page : le livre de l'exécution précédente si la page
+    n'a pas changé, sinon le résultat de l'analyse dont les empreintes sont enregistrées
+
+    Args:
+        url (str): url du livre
+        content (bytes): contenu brut de la page
+        parse (callable): analyse de la page, renvoie le livre
+        store (FingerprintStore, optional): empreintes des pages (None : la page est
+                                            toujours analysée). Defaults to None.
+
+    Returns:
+        Book: le livre
+    """
+    if store is None:
+        return parse()
+    book, content_hash = store.lookup(url, content)
+    if book is None:
+        book = parse()
+        store.record(url, content_hash, book)
+    return book
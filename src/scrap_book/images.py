@@ -0,0 +1,425 @@
+"""Téléchargement des images des livres et post-traitement optionnel (stockage par empreinte,
+vignettes, empreintes perceptuelles)"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from tqdm import tqdm
+
+from .logs import get_process_pool_logging, log_error
+from .metrics import stage_metrics
+from .context import get_context
+
+IMAGE_CHUNK_SIZE = 64*1024 #taille des blocs écrits sur le disque lors du téléchargement
+THUMBNAIL_SIZE = 128 #côté en pixels des vignettes carrées
+THUMBNAIL_QUALITY = 85 #qualité jpeg des vignettes
+DHASH_SIZE = 8 #côté de la grille de l'empreinte perceptuelle (dHash de 64 bits)
+
+def download_image(url, path, etag=None, dest=None, context=None):
+    """Télécharge une image par blocs dans un fichier temporaire puis le renomme en {path},
+    si le fichier existe déjà avec le même ETag ou la même taille, il n'est pas re-téléchargé
+
+    Args:
+        url (str): url de l'image
+        path (str): chemin du fichier existant (None s'il n'y en a pas)
+        etag (str, optional): ETag connu du fichier existant. Defaults to None.
+        dest (str, optional): chemin du fichier téléchargé, s'il est différent de {path}.
+                              Defaults to None.
+        context (ScrapeContext, optional): contexte du scrapping (client http).
+                                           Defaults to None.
+
+    Returns:
+        tuple(bool, str): (True si l'image a été téléchargée, ETag de l'image)
+    """
+    exists = path is not None and os.path.exists(path)
+    headers = {'If-None-Match': etag} if exists and etag else {}
+    with get_context(context).http.get(url, stream=True, headers=headers) as _response:
+        if _response.status_code == 304:
+            return False, etag
+        _response.raise_for_status()
+        etag = _response.headers.get('ETag')
+        size = _response.headers.get('Content-Length')
+        if exists and size is not None and int(size) == os.path.getsize(path):
+            return False, etag
+        dest = dest or path
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest) or '.', suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in _response.iter_content(chunk_size=IMAGE_CHUNK_SIZE):
+                    f.write(chunk)
+            os.replace(tmp_path, dest)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    return True, etag
+
+def get_image_from_book(book,output_dir,context=None):
+    """Télécharge et enregistre l'image du livre
+
+    Args:
+        book (Book): le livre dont il faut télécharger et enregistrer l'image
+        output_dir (str): le repertoire parent de destination
+        context (ScrapeContext, optional): contexte du scrapping (client http).
+                                           Defaults to None.
+
+    """
+    try:
+        url = book.image_url
+        image_name = url.split('/')[-1]
+    except Exception as _e:
+        log_error('',book,_e)
+        return None 
+
+    try:
+        download_image(url, f"{output_dir}/images/{image_name}", context=context)
+    except Exception as _e:
+        log_error('',[url,image_name],_e)
+        return None
+
+class ImageDownloader():
+    """Télécharge les images des livres en parallèle dans {output_dir}/images,
+    les images peuvent être soumises pendant que les livres sont encore en cours de scrapping.
+    Chaque url n'est téléchargée qu'une fois et les ETag sont conservés dans
+    {output_dir}/images/.etags.json pour les exécutions suivantes.
+    Si un journal est fourni, les images qu'il contient ne sont pas re-téléchargées
+    """
+    defer_books = False #les livres sont enregistrés après le traitement de leur image
+
+    def __init__(self, output_dir, workers=4, journal=None, context=None):
+        self.context = context
+        self.image_dir = f'{output_dir}/images'
+        self.etag_file = f'{self.image_dir}/.etags.json'
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.lock = threading.Lock()
+        self.journal = journal
+        self.seen_url = set(journal.images) if journal is not None else set()
+        self.futures = []
+        self.stats = {'downloaded':0, 'skipped':0, 'errors':0}
+        try:
+            with open(self.etag_file, encoding='utf-8') as f:
+                self.etags = json.load(f)
+        except (OSError, ValueError):
+            self.etags = {}
+
+    def submit(self, book, download=True):
+        """Ajoute l'image du livre à la file de téléchargement
+
+        Args:
+            book (Book): le livre dont il faut télécharger l'image
+            download (bool, optional): False pour un livre dont l'image n'est pas
+                                       téléchargée (livre inchangé). Defaults to True.
+        """
+        if book is None or not download:
+            return
+        url = book.image_url
+        with self.lock:
+            if url in self.seen_url:
+                return
+            self.seen_url.add(url)
+        self.futures.append(self.executor.submit(self.download, url))
+
+    def download(self, url):
+        """Télécharge une image (exécuté dans le pool de threads)
+
+        Args:
+            url (str): url de l'image
+        """
+        image_name = url.split('/')[-1]
+        try:
+            with stage_metrics.timer('image'):
+                downloaded, etag = download_image(url, f'{self.image_dir}/{image_name}',
+                                                  self.etags.get(url), context=self.context)
+            with self.lock:
+                if etag:
+                    self.etags[url] = etag
+                self.stats['downloaded' if downloaded else 'skipped'] += 1
+            if self.journal is not None:
+                self.journal.add_image(url)
+        except Exception as _e:
+            with self.lock:
+                self.stats['errors'] += 1
+            log_error('',[url,image_name],_e)
+
+    def close(self):
+        """Attend la fin des téléchargements en cours et enregistre les ETag
+
+        Returns:
+            dict: nombre d'images téléchargées, ignorées (déjà présentes) et en erreur
+        """
+        for _future in tqdm(as_completed(self.futures), total=len(self.futures)):
+            pass
+        self.executor.shutdown(wait=True)
+        self.save_etags()
+        return self.stats
+
+    def pop_ready_books(self):
+        """Renvoie les livres dont l'image est traitée et qui peuvent être enregistrés
+        (uniquement si defer_books)
+
+        Returns:
+            list[Book]: les livres
+        """
+        return []
+
+    def save_etags(self):
+        """Enregistre les ETag des images pour les exécutions suivantes
+        """
+        try:
+            with open(self.etag_file, 'w', encoding='utf-8') as f:
+                json.dump(self.etags, f)
+        except Exception as _e:
+            log_error('',self.etag_file,_e)
+
+def compute_dhash(image, size=DHASH_SIZE):
+    """Renvoie l'empreinte perceptuelle (dHash) d'une image : chaque bit indique si un pixel
+    de l'image réduite en niveaux de gris est plus clair que son voisin de droite,
+    deux images visuellement proches ont des empreintes proches (distance de Hamming)
+
+    Args:
+        image (PIL.Image.Image): l'image
+        size (int, optional): côté de la grille. Defaults to DHASH_SIZE.
+
+    Returns:
+        str: empreinte hexadécimale de size*size bits
+    """
+    gray = image.convert('L').resize((size+1, size))
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row*(size+1)+col]
+            value = value << 1 | (left > pixels[row*(size+1)+col+1])
+    return f'{value:0{size*size//4}x}'
+
+def process_image(path, image_dir, thumbnail_size=THUMBNAIL_SIZE):
+    """Range une image téléchargée par empreinte de contenu et crée sa vignette
+    (exécuté dans un processus du pool de traitement) :
+        - originals/{empreinte[:2]}/{empreinte}{extension}, une image identique déjà présente
+          n'est pas stockée une deuxième fois
+        - thumbnails/{empreinte[:2]}/{empreinte}.jpg, vignette carrée de {thumbnail_size} pixels
+
+    Args:
+        path (str): fichier téléchargé (déplacé ou supprimé)
+        image_dir (str): répertoire des images
+        thumbnail_size (int, optional): côté des vignettes. Defaults to THUMBNAIL_SIZE.
+
+    Returns:
+        dict: {hash, path, thumbnail, dhash, size}, chemins relatifs à {image_dir}
+              (thumbnail et dhash à None si l'image est illisible)
+    """
+    from PIL import Image, ImageOps #dépendance optionnelle, uniquement pour le post-traitement
+    with open(path, 'rb') as f:
+        content = f.read()
+    content_hash = hashlib.sha256(content).hexdigest()
+    extension = os.path.splitext(path)[1].lower() or '.jpg'
+    original = f'originals/{content_hash[:2]}/{content_hash}{extension}'
+    thumbnail = f'thumbnails/{content_hash[:2]}/{content_hash}.jpg'
+    os.makedirs(os.path.dirname(f'{image_dir}/{original}'), exist_ok=True)
+    if os.path.exists(f'{image_dir}/{original}'):
+        os.remove(path)
+    else:
+        os.replace(path, f'{image_dir}/{original}')
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            dhash = compute_dhash(image)
+            if not os.path.exists(f'{image_dir}/{thumbnail}'):
+                os.makedirs(os.path.dirname(f'{image_dir}/{thumbnail}'), exist_ok=True)
+                thumb = ImageOps.fit(image.convert('RGB'), (thumbnail_size, thumbnail_size))
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(f'{image_dir}/{thumbnail}'),
+                                                suffix='.part')
+                with os.fdopen(fd, 'wb') as f:
+                    thumb.save(f, 'JPEG', quality=THUMBNAIL_QUALITY)
+                os.replace(tmp_path, f'{image_dir}/{thumbnail}')
+    except OSError:
+        #image illisible : l'original est conservé, sans vignette ni empreinte perceptuelle
+        dhash = thumbnail = None
+    return {'hash': content_hash, 'path': original, 'thumbnail': thumbnail, 'dhash': dhash,
+            'size': len(content)}
+
+class ImageProcessor(ImageDownloader):
+    """Téléchargement des images suivi d'un post-traitement dans un pool de processus :
+    stockage des originaux par empreinte de contenu (une image identique publiée sous
+    plusieurs url n'est stockée qu'une fois), vignettes de taille fixe et empreintes
+    perceptuelles. Le manifeste {output_dir}/images/manifest.json associe chaque UPC et chaque
+    url à l'empreinte de son image, chaque image traitée y est ajoutée immédiatement par
+    {output_dir}/images/manifest.jsonl (avant le journal de reprise) puis le manifeste est
+    réécrit en entier à la fermeture. Les livres reçoivent le chemin local de leur image
+    (image_path) et ne sont enregistrés qu'une fois leur image traitée (pop_ready_books)
+    """
+    defer_books = True
+
+    def __init__(self, output_dir, workers=4, journal=None, process_workers=0,
+                 thumbnail_size=THUMBNAIL_SIZE, context=None):
+        super().__init__(output_dir, workers, journal, context)
+        self.manifest_file = f'{self.image_dir}/manifest.json'
+        self.manifest_log_file = f'{self.image_dir}/manifest.jsonl'
+        self.incoming_dir = f'{self.image_dir}/.incoming'
+        os.makedirs(self.incoming_dir, exist_ok=True)
+        self.thumbnail_size = thumbnail_size
+        self.pool = ProcessPoolExecutor(max_workers=process_workers or None,
+                                        **get_process_pool_logging())
+        self.pending = {} #livres en attente de leur image {url: [Book]}
+        self.ready = [] #livres dont l'image est traitée, à enregistrer
+        self.stats.update({'processed':0, 'duplicates':0})
+        self.manifest = self.load_manifest()
+        #une image marquée téléchargée par le journal mais absente du manifeste
+        #(exécution interrompue) est de nouveau traitée
+        self.seen_url = {url for url in self.seen_url if url in self.manifest['urls']}
+        self.manifest_log = open(self.manifest_log_file, 'a', encoding='utf-8')
+
+    def load_manifest(self):
+        """Lit le manifeste et lui ajoute les images traitées par une exécution interrompue
+        (manifest.jsonl)
+
+        Returns:
+            dict: manifeste {books: {upc: empreinte}, urls: {url: empreinte},
+                  images: {empreinte: {path, thumbnail, dhash, size}}}
+        """
+        try:
+            with open(self.manifest_file, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {'books': {}, 'urls': {}, 'images': {}}
+        try:
+            with open(self.manifest_log_file, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError: #dernière ligne incomplète
+                        continue
+                    manifest['images'][entry['hash']] = entry['image']
+                    manifest['urls'][entry['url']] = entry['hash']
+        except OSError:
+            pass
+        return manifest
+
+    def submit(self, book, download=True):
+        """Ajoute l'image du livre à la file de téléchargement, le livre est prêt à être
+        enregistré quand son image est traitée ; une image déjà traitée (ou non téléchargée)
+        est retrouvée dans le manifeste
+
+        Args:
+            book (Book): le livre dont il faut télécharger l'image
+            download (bool, optional): False pour un livre dont l'image n'est pas
+                                       téléchargée (livre inchangé). Defaults to True.
+        """
+        if book is None:
+            return
+        url = book.image_url
+        with self.lock:
+            if url in self.pending:
+                self.pending[url].append(book)
+                return
+            if url in self.seen_url or not download:
+                self.set_image(book, self.manifest['urls'].get(url))
+                return
+            self.seen_url.add(url)
+            self.pending[url] = [book]
+        self.futures.append(self.executor.submit(self.download, url))
+
+    def set_image(self, book, content_hash):
+        """Renseigne le chemin local de l'image du livre et le rend prêt à être enregistré
+        (appelé avec le verrou)
+
+        Args:
+            book (Book): le livre
+            content_hash (str): empreinte de l'image (None si inconnue)
+        """
+        info = self.manifest['images'].get(content_hash)
+        if info is not None:
+            book.image_path = f'images/{info["path"]}'
+            if book.universal_product_code is not None:
+                self.manifest['books'][book.universal_product_code] = content_hash
+        self.ready.append(book)
+
+    def download(self, url):
+        """Télécharge une image puis la traite dans le pool de processus
+        (exécuté dans le pool de threads)
+
+        Args:
+            url (str): url de l'image
+        """
+        image_name = url.split('/')[-1]
+        with self.lock:
+            known_hash = self.manifest['urls'].get(url)
+            info = self.manifest['images'].get(known_hash)
+        #nom unique par url : chaque url n'est téléchargée qu'une fois par exécution
+        url_hash = hashlib.md5(url.encode('utf-8')).hexdigest()
+        incoming = f'{self.incoming_dir}/{url_hash}{os.path.splitext(image_name)[1]}'
+        content_hash = known_hash
+        try:
+            #fichier laissé par une exécution interrompue avant son traitement : il n'est
+            #pas dans le manifeste, l'image est de nouveau téléchargée puis traitée
+            if os.path.exists(incoming):
+                os.remove(incoming)
+            with stage_metrics.timer('image'):
+                known_path = f'{self.image_dir}/{info["path"]}' if info is not None else None
+                downloaded, etag = download_image(url, known_path, self.etags.get(url),
+                                                  dest=incoming, context=self.context)
+            if downloaded:
+                with stage_metrics.timer('image_process'):
+                    result = self.pool.submit(process_image, incoming, self.image_dir,
+                                              self.thumbnail_size).result()
+                content_hash = result.pop('hash')
+            with self.lock:
+                if etag:
+                    self.etags[url] = etag
+                if downloaded:
+                    if content_hash != known_hash and content_hash in self.manifest['images']:
+                        self.stats['duplicates'] += 1
+                    self.stats['processed'] += 1
+                    self.manifest['images'][content_hash] = result
+                    self.manifest['urls'][url] = content_hash
+                    #l'image est enregistrée dans le manifeste avant d'être marquée
+                    #téléchargée dans le journal de reprise
+                    self.manifest_log.write(json.dumps({'url': url, 'hash': content_hash,
+                                                        'image': result})+'\n')
+                    self.manifest_log.flush()
+                self.stats['downloaded' if downloaded else 'skipped'] += 1
+            if self.journal is not None:
+                self.journal.add_image(url)
+        except Exception as _e:
+            with self.lock:
+                self.stats['errors'] += 1
+            log_error('',[url,image_name],_e)
+            if os.path.exists(incoming):
+                os.remove(incoming)
+        finally:
+            with self.lock:
+                for book in self.pending.pop(url, []):
+                    self.set_image(book, content_hash)
+
+    def pop_ready_books(self):
+        """Renvoie les livres dont l'image est traitée et qui peuvent être enregistrés
+
+        Returns:
+            list[Book]: les livres
+        """
+        with self.lock:
+            ready, self.ready = self.ready, []
+        return ready
+
+    def close(self):
+        """Attend la fin des téléchargements et des traitements en cours, enregistre
+        les ETag et le manifeste
+
+        Returns:
+            dict: nombre d'images téléchargées, ignorées, en erreur, traitées et en double
+        """
+        stats = super().close()
+        self.pool.shutdown(wait=True)
+        self.manifest_log.close()
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.image_dir, suffix='.part')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f)
+            os.replace(tmp_path, self.manifest_file)
+            #le manifeste complet contient les entrées ajoutées pendant l'exécution
+            os.remove(self.manifest_log_file)
+        except Exception as _e:
+            log_error('',self.manifest_file,_e)
+        return stats
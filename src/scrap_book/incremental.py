@@ -0,0 +1,155 @@
+"""Mode incrémental : comparaison avec les livres de l'exécution précédente"""
+import csv
+import glob
+
+from .book import Book
+from .logs import log_error
+
+def load_previous_books(output_dir, fmt='csv'):
+    """Charge les livres enregistrés par l'exécution précédente dans {output_dir}/books
+
+    Args:
+        output_dir (str): le répertoire de sortie
+        fmt (str, optional): format de sortie (csv, parquet ou feather). Defaults to 'csv'.
+
+    Returns:
+        dict: livres précédents {product_page_url: Book}
+    """
+    if fmt != 'csv':
+        return load_previous_books_arrow(output_dir, fmt)
+    previous_books = {}
+    for file_name in glob.glob(f'{output_dir}/books/*.csv'):
+        try:
+            with open(file_name, newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f, delimiter=';'):
+                    data = {k: (v if v != '' else None) for k, v in row.items()}
+                    for field in ('price_including_tax', 'price_excluding_tax'):
+                        if data.get(field) is not None:
+                            data[field] = float(data[field])
+                    for field in ('number_available', 'review_rating'):
+                        if data.get(field) is not None:
+                            data[field] = int(float(data[field]))
+                    previous_books[data['product_page_url']] = Book.from_dict(data)
+        except Exception as _e:
+            log_error('',file_name,_e)
+    return previous_books
+
+def load_previous_books_arrow(output_dir, fmt):
+    """Charge les livres du jeu de données parquet ou feather de l'exécution précédente
+
+    Args:
+        output_dir (str): le répertoire de sortie
+        fmt (str): format de sortie (parquet ou feather)
+
+    Returns:
+        dict: livres précédents {product_page_url: Book}
+    """
+    previous_books = {}
+    if not glob.glob(f'{output_dir}/books/category=*/*.{fmt}'):
+        return previous_books
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        partitioning = ds.partitioning(pa.schema([('category', pa.string())]), flavor='hive')
+        dataset = ds.dataset(f'{output_dir}/books', format='ipc' if fmt == 'feather' else fmt,
+                             partitioning=partitioning)
+        for row in dataset.to_table().to_pylist():
+            previous_books[row['product_page_url']] = Book.from_dict(row)
+    except Exception as _e:
+        log_error('',output_dir,_e)
+    return previous_books
+
+def is_book_unchanged(info, book):
+    """Indique si le prix et la disponibilité affichés sur la page de liste
+    sont identiques à ceux du livre précédent
+
+    Args:
+        info (dict): informations de la page de liste (get_list_books_info)
+        book (Book): livre précédent (None si le livre est nouveau)
+
+    Returns:
+        bool: True si le livre n'a pas changé
+    """
+    if book is None:
+        return False
+    was_available = book.number_available is not None and book.number_available > 0
+    same_price = info['price_including_tax'] is not None and \
+                 book.price_including_tax is not None and \
+                 round(info['price_including_tax'], 2) == round(book.price_including_tax, 2)
+    return same_price and was_available == info['is_available']
+
+class UrlSelector():
+    """Sélectionne, parmi les livres découverts sur les pages de liste, les url à récupérer :
+    les url en double, les url de {done_url} et, si {previous_books} est fourni,
+    les livres inchangés sont écartés
+    """
+    def __init__(self, previous_books=None, done_url=(), on_unchanged=None):
+        """
+        Args:
+            previous_books (dict, optional): livres précédents {product_page_url: Book}.
+                                             Defaults to None.
+            done_url (set, optional): url déjà récupérées. Defaults to ().
+            on_unchanged (callable, optional): fonction appelée avec chaque livre inchangé.
+                                               Defaults to None.
+        """
+        self.previous_books = previous_books
+        self.done_url = done_url
+        self.on_unchanged = on_unchanged
+        self.seen_url = set()
+
+    def select(self, info):
+        """Renvoie l'url du livre s'il doit être récupéré
+
+        Args:
+            info (dict): informations du livre sur la page de liste (get_list_books_info)
+
+        Returns:
+            str: url du livre (None si le livre est écarté)
+        """
+        url = info['product_page_url']
+        if url in self.seen_url or url in self.done_url:
+            return None
+        self.seen_url.add(url)
+        if self.previous_books is not None and \
+           is_book_unchanged(info, self.previous_books.get(url)):
+            if self.on_unchanged is not None:
+                self.on_unchanged(self.previous_books[url])
+            return None
+        return url
+
+def iter_url_to_fetch(list_info, previous_books=None, done_url=(), on_unchanged=None):
+    """Filtre un flux d'informations de pages de liste et renvoie les url à récupérer
+    (UrlSelector)
+
+    Args:
+        list_info (iterable[dict]): informations des pages de liste (get_list_books_info)
+        previous_books (dict, optional): livres précédents {product_page_url: Book}.
+                                         Defaults to None.
+        done_url (set, optional): url déjà récupérées. Defaults to ().
+        on_unchanged (callable, optional): fonction appelée avec chaque livre inchangé.
+                                           Defaults to None.
+
+    Yields:
+        str: url des livres à récupérer
+    """
+    selector = UrlSelector(previous_books, done_url, on_unchanged)
+    for info in list_info:
+        url = selector.select(info)
+        if url is not None:
+            yield url
+
+def select_books_to_update(list_info, previous_books):
+    """Compare les informations des pages de liste avec les livres précédents :
+    seuls les livres nouveaux ou dont le prix ou la disponibilité a changé sont à récupérer
+
+    Args:
+        list_info (list[dict]): informations des pages de liste (get_list_books_info)
+        previous_books (dict): livres précédents {product_page_url: Book}
+
+    Returns:
+        tuple(list[str], list[Book]): (url des livres à récupérer, livres inchangés)
+    """
+    list_unchanged = []
+    list_url = list(iter_url_to_fetch(list_info, previous_books,
+                                      on_unchanged=list_unchanged.append))
+    return list_url, list_unchanged
@@ -0,0 +1,149 @@
+"""Journal de reprise d'une exécution interrompue"""
+import json
+import os
+import threading
+
+from .book import Book
+from .logs import log_error
+
+class CrawlJournal():
+    """Journal de l'exécution (fichier JSONL en ajout seul) qui enregistre les livres découverts,
+    les livres récupérés et les images téléchargées pour pouvoir reprendre une exécution interrompue.
+    Les entrées ne sont pas conservées en mémoire : en reprise, seules les url des livres
+    récupérés et des images téléchargées sont chargées, les livres et les informations de
+    découverte de l'exécution précédente sont relus depuis le fichier (iter_books,
+    iter_previous_discovered)
+    """
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.discovery_done = False #découverte de l'exécution précédente terminée
+        self.nb_discovered = 0 #nombre de livres découverts par l'exécution précédente
+        self.done_url = set() #url des livres récupérés par l'exécution précédente
+        self.images = set() #url des images téléchargées par l'exécution précédente
+        self.resume_size = 0 #taille du journal de l'exécution précédente (octets)
+        if resume:
+            self.load()
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    def iter_entries(self):
+        """Relit les entrées du journal de l'exécution précédente (sans celles de l'exécution
+        en cours), une dernière ligne incomplète (arrêt pendant l'écriture) est ignorée
+
+        Yields:
+            dict: les entrées
+        """
+        with open(self.path, 'rb') as f:
+            for line in iter(f.readline, b''):
+                if f.tell() > self.resume_size:
+                    break
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def load(self):
+        """Relit le journal d'une exécution précédente : url des livres récupérés et des images
+        téléchargées, état de la découverte
+        """
+        try:
+            self.resume_size = os.path.getsize(self.path)
+            for entry in self.iter_entries():
+                if entry['type'] == 'discovered':
+                    self.nb_discovered += 1
+                elif entry['type'] == 'discovery_done':
+                    self.discovery_done = True
+                elif entry['type'] == 'book':
+                    self.done_url.add(entry['book']['product_page_url'])
+                elif entry['type'] == 'image':
+                    self.images.add(entry['url'])
+        except FileNotFoundError:
+            pass
+        except Exception as _e:
+            log_error('',self.path,_e)
+
+    def iter_previous_discovered(self):
+        """Relit les informations des livres découverts par l'exécution précédente
+
+        Yields:
+            dict: informations de chaque livre découvert (get_list_books_info)
+        """
+        for entry in self.iter_entries():
+            if entry['type'] == 'discovered':
+                yield entry['info']
+
+    def iter_books(self):
+        """Relit les livres récupérés par l'exécution précédente (une fois chacun)
+
+        Yields:
+            Book: les livres
+        """
+        if not self.done_url:
+            return
+        seen_url = set()
+        for entry in self.iter_entries():
+            if entry['type'] == 'book' and entry['book']['product_page_url'] not in seen_url:
+                seen_url.add(entry['book']['product_page_url'])
+                yield Book.from_dict(entry['book'])
+
+    def record(self, entries):
+        """Ajoute des entrées au journal et les écrit immédiatement sur le disque
+
+        Args:
+            entries (list[dict]): entrées à ajouter
+        """
+        with self.lock:
+            for entry in entries:
+                self.file.write(json.dumps(entry, ensure_ascii=False)+'\n')
+            self.file.flush()
+
+    def add_discovered(self, list_info):
+        """Enregistre les livres découverts sur une page de liste
+
+        Args:
+            list_info (list[dict]): informations de la page de liste
+        """
+        self.record([{'type':'discovered', 'info':info} for info in list_info])
+
+    def set_discovery_done(self):
+        """Marque la découverte des livres comme terminée
+        """
+        self.record([{'type':'discovery_done'}])
+
+    def iter_discovered(self, list_pages_info):
+        """Enregistre au fur et à mesure les pages de liste d'un flux de découverte
+
+        Args:
+            list_pages_info (iterable[list[dict]]): informations de chaque page de liste
+
+        Yields:
+            dict: informations de chaque livre découvert
+        """
+        for list_info in list_pages_info:
+            self.add_discovered(list_info)
+            yield from list_info
+        self.set_discovery_done()
+
+    def add_book(self, book):
+        """Enregistre un livre récupéré
+
+        Args:
+            book (Book): le livre (None est ignoré)
+        """
+        if book is None:
+            return
+        self.record([{'type':'book', 'book':book.to_dict()}])
+
+    def add_image(self, url):
+        """Enregistre une image téléchargée
+
+        Args:
+            url (str): url de l'image
+        """
+        self.record([{'type':'image', 'url':url}])
+
+    def close(self):
+        """Ferme le journal
+        """
+        with self.lock:
+            self.file.close()
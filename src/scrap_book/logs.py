@@ -0,0 +1,378 @@
+"""Logs du scrapper : file d'attente bornée, fichier, console, envoi Loki par lots
+et registre des erreurs"""
+import atexit
+import collections
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import reprlib
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+from .constants import APP_NAME
+
+LOKI_URL = "http://molp.fr:3100/loki/api/v1/push" #serveur Loki par défaut
+
+logger = logging.getLogger(APP_NAME)
+logger.addHandler(logging.NullHandler()) #aucun envoi tant que setup_logging n'est pas appelé
+logger.setLevel(logging.DEBUG)
+is_log_to_file = True
+log_file = 'log.log'
+is_log_to_var = True
+is_verbose=False
+is_log_to_remote = True
+log_listener = None #thread qui traite les logs en file d'attente
+log_queue_handler = None
+process_log_queue = None #file des logs des processus enfants (pools d'analyse et d'images)
+process_log_listener = None #thread qui transmet au logger les logs des processus enfants
+process_log_lock = threading.Lock()
+
+class ErrorRegistry():
+    """Registre compact des erreurs : un compteur par fonction et type d'exception
+    et les {max_samples} dernières erreurs, la mémoire utilisée reste constante
+    """
+    def __init__(self, max_samples=100):
+        self.lock = threading.Lock()
+        self.counts = collections.Counter() #nombre d'erreurs {(fonction, type d'exception): n}
+        self.samples = collections.deque(maxlen=max_samples)
+        self.total = 0
+
+    def add(self, time, func_name, message, data_in, exception_type, exception):
+        """Enregistre une erreur
+
+        Args:
+            time (str): heure
+            func_name (str): fonction qui log
+            message (str): message du log
+            data_in (str): données d'entrée (déjà tronquées)
+            exception_type (str): type de l'exception
+            exception (str): message de l'exception
+        """
+        with self.lock:
+            self.total += 1
+            self.counts[(func_name, exception_type)] += 1
+            self.samples.append({'time':time,
+                                 'fonction':func_name,
+                                 'message':message,
+                                 'data_in':data_in,
+                                 'exception_type':exception_type,
+                                 'exception':exception})
+
+    def summary(self):
+        """Renvoie le résumé des erreurs
+
+        Returns:
+            dict: nombre total d'erreurs, erreurs par fonction, par fonction et type d'exception
+                  et dernières erreurs
+        """
+        with self.lock:
+            by_function = collections.Counter()
+            for (func_name, _exception_type), count in self.counts.items():
+                by_function[func_name] += count
+            return {'total': self.total,
+                    'by_function': dict(by_function.most_common()),
+                    'by_function_exception': [{'fonction':func_name,
+                                               'exception_type':exception_type,
+                                               'count':count}
+                                              for (func_name, exception_type), count
+                                              in self.counts.most_common()],
+                    'samples': list(self.samples)}
+
+    def write_summary(self, path):
+        """Enregistre le résumé des erreurs au format json
+
+        Args:
+            path (str): fichier de destination
+        """
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        except OSError:
+            pass
+
+error_registry = ErrorRegistry() #registre des erreurs de l'exécution
+
+log_repr = reprlib.Repr() #représentation tronquée des données d'entrée des logs
+log_repr.maxstring = 200
+log_repr.maxother = 200
+log_repr.maxlist = 10
+
+def log_to_console(time, statuts='',message='', func_name='', data_in='', exception=''):
+    """ Affiche les logs dans la console
+
+    Args:
+        time (str): heure
+        statuts (str, optional): status du log. Defaults to ''.
+        message (str, optional):  message du log. Defaults to ''.
+        func_name (str, optional):  fonction qui log. Defaults to ''.
+        data_in (str, optional): données d'entrée. Defaults to ''.
+        exception (str, optional):  message de l'exception. Defaults to ''.
+    """
+    print(time, statuts,message,func_name,data_in,exception)
+
+def get_log_fields(record):
+    """Renvoie les champs affichés d'un log créé par log_error ou log_info
+
+    Args:
+        record (logging.LogRecord): le log
+
+    Returns:
+        tuple: (heure, status, message, fonction, données d'entrée, exception)
+    """
+    tags = getattr(record, 'tags', {})
+    return (tags.get('date-time', ''), record.levelname, tags.get('message', ''),
+            record.funcName, tags.get('input', ''), tags.get('exception', ''))
+
+class ErrorRegistryHandler(logging.Handler):
+    """Handler qui enregistre les erreurs dans error_registry
+    """
+    def emit(self, record):
+        if is_log_to_var and record.levelno >= logging.ERROR:
+            tags = getattr(record, 'tags', {})
+            error_registry.add(tags.get('date-time', ''), record.funcName, tags.get('message', ''),
+                               tags.get('input', ''), tags.get('exception_type', ''),
+                               tags.get('exception', ''))
+
+class ColumnFormatter(logging.Formatter):
+    """Formate les logs en colonnes alignées pour le fichier de log
+    """
+    def format(self, record):
+        return ''.join(field.ljust(width) for field, width in
+                       zip(get_log_fields(record), (30, 10, 30, 30, 30, 30)))
+
+class ConsoleHandler(logging.Handler):
+    """Handler qui affiche les logs dans la console (mode verbose)
+    """
+    def emit(self, record):
+        time, statuts, message, func_name, data_in, exception = get_log_fields(record)
+        if record.levelno >= logging.ERROR:
+            log_to_console(time, statuts, message, func_name, data_in, exception)
+        else:
+            log_to_console(time, message)
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler dont la file est bornée : quand la file est pleine le log est abandonné
+    au lieu de bloquer le scrapping
+    """
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class BatchLokiHandler(logging.Handler):
+    """Handler qui envoie les logs à Loki par lots de {batch_size} ou toutes les
+    {flush_interval} secondes (thread dédié, même si aucun nouveau log n'arrive).
+    Si le serveur n'est pas joignable, les lots sont écrits dans le fichier local
+    {fallback_file} et aucun envoi n'est tenté pendant {retry_after} secondes
+    """
+    def __init__(self, url, labels, fallback_file, batch_size=100, flush_interval=5,
+                 timeout=3, retry_after=60):
+        super().__init__()
+        self.url = url
+        self.labels = labels
+        self.fallback_file = fallback_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.unreachable_until = 0
+        import requests #importé uniquement quand les logs sont envoyés à Loki
+        self.session = requests.Session()
+        self.stats = {'pushed':0, 'fallback':0}
+        self.closed = threading.Event()
+        self.flush_thread = threading.Thread(target=self.flush_periodically, daemon=True)
+        self.flush_thread.start()
+
+    def flush_periodically(self):
+        """Envoie le lot en cours toutes les {flush_interval} secondes jusqu'à la fermeture
+        du handler (exécuté dans un thread dédié)
+        """
+        while not self.closed.wait(self.flush_interval):
+            #le verrou du handler est aussi pris par handle() autour de emit()
+            with self.lock:
+                if self.buffer and time.monotonic()-self.last_flush >= self.flush_interval:
+                    self.flush()
+
+    def emit(self, record):
+        tags = getattr(record, 'tags', {})
+        line = json.dumps(dict(tags, function=record.funcName), ensure_ascii=False)
+        self.buffer.append((record.levelname.lower(), str(int(record.created*1e9)), line))
+        if len(self.buffer) >= self.batch_size or \
+           time.monotonic()-self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Envoie le lot en cours à Loki (ou dans le fichier local si Loki n'est pas joignable)
+        """
+        batch, self.buffer = self.buffer, []
+        self.last_flush = time.monotonic()
+        if not batch:
+            return
+        if time.monotonic() >= self.unreachable_until:
+            streams = {}
+            for level, timestamp, line in batch:
+                streams.setdefault(level, []).append([timestamp, line])
+            payload = {'streams': [{'stream': dict(self.labels, level=level), 'values': values}
+                                   for level, values in streams.items()]}
+            try:
+                _reponse = self.session.post(self.url, json=payload, timeout=self.timeout)
+                _reponse.raise_for_status()
+                self.stats['pushed'] += len(batch)
+                return
+            except Exception:
+                self.unreachable_until = time.monotonic()+self.retry_after
+        try:
+            with open(self.fallback_file, 'a', encoding='utf-8') as f:
+                for level, timestamp, line in batch:
+                    f.write(json.dumps({'ts':timestamp, 'labels':dict(self.labels, level=level),
+                                        'line':line}, ensure_ascii=False)+'\n')
+            self.stats['fallback'] += len(batch)
+        except OSError:
+            pass
+
+    def close(self):
+        self.closed.set()
+        self.flush_thread.join()
+        with self.lock:
+            self.flush()
+        self.session.close()
+        super().close()
+
+class ParentLoggerHandler(logging.Handler):
+    """Handler du processus principal qui transmet au logger les logs reçus des processus
+    enfants (mêmes handlers et même registre des erreurs que les logs du processus principal)
+    """
+    def emit(self, record):
+        logger.handle(record)
+
+def init_process_logging(log_queue):
+    """Initialise les logs d'un processus enfant (initializer d'un ProcessPoolExecutor) :
+    ses logs sont envoyés au processus principal au lieu des handlers hérités ou absents
+
+    Args:
+        log_queue (multiprocessing.Queue): file des logs du processus principal
+    """
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(log_queue))
+
+def get_process_pool_logging():
+    """Renvoie les paramètres d'un ProcessPoolExecutor dont les processus envoient leurs logs
+    au processus principal, la file et son thread de lecture sont créés au premier appel
+
+    Returns:
+        dict: paramètres initializer et initargs du ProcessPoolExecutor
+    """
+    global process_log_queue, process_log_listener
+    with process_log_lock:
+        if process_log_listener is None:
+            process_log_queue = multiprocessing.Queue()
+            process_log_listener = QueueListener(process_log_queue, ParentLoggerHandler())
+            process_log_listener.start()
+        return {'initializer': init_process_logging, 'initargs': (process_log_queue,)}
+
+def stop_process_logging():
+    """Transmet les derniers logs des processus enfants puis arrête le thread de lecture
+    """
+    global process_log_queue, process_log_listener
+    with process_log_lock:
+        if process_log_listener is None:
+            return
+        process_log_listener.stop()
+        process_log_queue.close()
+        process_log_listener = None
+        process_log_queue = None
+
+def setup_logging(remote=True, loki_url=LOKI_URL, queue_size=10000):
+    """Met en place les handlers de log : les logs sont placés dans une file bornée
+    et traités par un thread dédié (fichier de log ouvert en continu, console, envoi Loki par lots)
+
+    Args:
+        remote (bool, optional): envoie les logs au serveur Loki. Defaults to True.
+        loki_url (str, optional): url d'envoi du serveur Loki. Defaults to LOKI_URL.
+        queue_size (int, optional): nombre maximum de logs en attente. Defaults to 10000.
+    """
+    global log_listener, log_queue_handler, is_log_to_remote
+    shutdown_logging()
+    is_log_to_remote = remote
+    handlers = []
+    if is_log_to_file:
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler.setLevel(logging.ERROR)
+        file_handler.setFormatter(ColumnFormatter())
+        handlers.append(file_handler)
+    if is_verbose:
+        handlers.append(ConsoleHandler())
+    if remote:
+        handlers.append(BatchLokiHandler(loki_url, {'application': APP_NAME},
+                                         f'{os.path.splitext(log_file)[0]}_loki.jsonl'))
+    log_queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    log_listener = QueueListener(log_queue_handler.queue, *handlers,
+                                 respect_handler_level=True)
+    log_listener.start()
+    logger.addHandler(log_queue_handler)
+
+def shutdown_logging():
+    """Attend le traitement des logs en file d'attente puis ferme les handlers
+
+    Returns:
+        int: nombre de logs abandonnés car la file était pleine
+    """
+    global log_listener, log_queue_handler
+    stop_process_logging()
+    if log_listener is None:
+        return 0
+    logger.removeHandler(log_queue_handler)
+    log_listener.stop()
+    for handler in log_listener.handlers:
+        handler.close()
+    dropped = log_queue_handler.dropped
+    log_listener = None
+    log_queue_handler = None
+    return dropped
+
+logger.addHandler(ErrorRegistryHandler())
+atexit.register(shutdown_logging)
+    
+def log_error(message,data_in,exception):
+    """fonction qui permet de logger une erreur
+
+    Args:
+        message (str): status du log
+        data_in (Object): données d'entrée
+        exception (Exception): exception
+    """
+    time = datetime.now().isoformat(timespec='seconds', sep=' ')
+    try:
+        data_in = data_in if isinstance(data_in, str) else log_repr.repr(data_in)
+    except Exception as _e:
+        data_in = ''
+    exception_type = type(exception).__name__ if isinstance(exception, BaseException) else ''
+    logger.error('error',stacklevel=2,extra={"tags": {"message": message, 
+                                                      "input":data_in[:log_repr.maxstring], 
+                                                      "exception":str(exception)[:500], 
+                                                      "exception_type":exception_type,
+                                                      'date-time': time}})
+
+def log_info(message):
+    """Fonction qui permet de logger une info
+
+    Args:
+        message (str): message
+    """
+    time = datetime.now().isoformat(timespec='seconds', sep=' ')
+    logger.info('info',stacklevel=2,extra={"tags": {"message": message, 
+                                                    "input":"", 
+                                                    "exception":"", 
+                                                    'date-time':time}})
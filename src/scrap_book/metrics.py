@@ -0,0 +1,220 @@
+"""Instrumentation : durées par étape, histogrammes de latence et profilage de l'analyse"""
+import collections
+import cProfile
+import json
+import math
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+class LatencyHistogram():
+    """Histogramme de durées à buckets logarithmiques (précision d'environ 5%),
+    la mémoire utilisée ne dépend pas du nombre de mesures
+    """
+    MIN_DURATION = 1e-5 #durée du premier bucket en secondes
+    FACTOR = 1.05 #rapport entre deux buckets successifs
+
+    def __init__(self):
+        self.buckets = collections.Counter()
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, duration):
+        """Ajoute une mesure
+
+        Args:
+            duration (float): durée en secondes
+        """
+        self.count += 1
+        self.total += duration
+        if duration <= self.MIN_DURATION:
+            self.buckets[0] += 1
+        else:
+            self.buckets[int(math.log(duration/self.MIN_DURATION, self.FACTOR))+1] += 1
+
+    def percentile(self, q):
+        """Renvoie le percentile {q} des durées mesurées
+
+        Args:
+            q (float): percentile recherché (entre 0 et 100)
+
+        Returns:
+            float: durée en secondes (borne haute du bucket)
+        """
+        if not self.count:
+            return 0.0
+        rank = q/100*self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return self.MIN_DURATION*self.FACTOR**bucket
+        return self.MIN_DURATION*self.FACTOR**max(self.buckets)
+
+class StageMetrics():
+    """Compteurs, durées (histogrammes) et volumes transférés par étape du programme
+    (découverte, téléchargement, analyse, nettoyage, enregistrement, images) et par site
+    """
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.stages = {} #{(étape, site): {'histogram', 'errors', 'bytes'}}
+
+    def reset(self, enabled=True):
+        """Remet les mesures à zéro et active (ou désactive) la collecte
+
+        Args:
+            enabled (bool, optional): active la collecte. Defaults to True.
+        """
+        with self.lock:
+            self.enabled = enabled
+            self.start = time.perf_counter()
+            self.stages = {}
+
+    def record(self, stage, duration, nbytes=0, host='', error=False):
+        """Enregistre une mesure
+
+        Args:
+            stage (str): nom de l'étape
+            duration (float): durée en secondes
+            nbytes (int, optional): octets transférés. Defaults to 0.
+            host (str, optional): site concerné. Defaults to ''.
+            error (bool, optional): l'étape a échoué. Defaults to False.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            metrics = self.stages.get((stage, host))
+            if metrics is None:
+                metrics = {'histogram': LatencyHistogram(), 'errors': 0, 'bytes': 0}
+                self.stages[(stage, host)] = metrics
+            metrics['histogram'].add(duration)
+            metrics['bytes'] += nbytes
+            if error:
+                metrics['errors'] += 1
+
+    @contextmanager
+    def timer(self, stage, host=''):
+        """Mesure la durée du bloc de code, une exception est comptée comme une erreur
+
+        Args:
+            stage (str): nom de l'étape
+            host (str, optional): site concerné. Defaults to ''.
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.record(stage, time.perf_counter()-start, host=host, error=True)
+            raise
+        self.record(stage, time.perf_counter()-start, host=host)
+
+    def report(self):
+        """Renvoie le rapport des mesures
+
+        Returns:
+            dict: durée totale et pour chaque étape (et chaque site) : nombre, erreurs,
+                  durée totale, moyenne, p50/p95/p99 en ms, octets et débit par seconde
+        """
+        with self.lock:
+            wall = time.perf_counter()-self.start
+            stages = []
+            for (stage, host), metrics in sorted(self.stages.items()):
+                histogram = metrics['histogram']
+                stages.append({'stage': stage,
+                               'host': host,
+                               'count': histogram.count,
+                               'errors': metrics['errors'],
+                               'total_s': round(histogram.total, 3),
+                               'mean_ms': round(histogram.total/histogram.count*1000, 3),
+                               'p50_ms': round(histogram.percentile(50)*1000, 3),
+                               'p95_ms': round(histogram.percentile(95)*1000, 3),
+                               'p99_ms': round(histogram.percentile(99)*1000, 3),
+                               'bytes': metrics['bytes'],
+                               'per_second': round(histogram.count/wall, 2) if wall else 0.0})
+        return {'wall_s': round(wall, 3), 'stages': stages}
+
+    def print_report(self):
+        """Affiche le rapport des mesures sous forme de tableau
+        """
+        report = self.report()
+        columns = ('stage', 'host', 'count', 'errors', 'total_s', 'mean_ms', 'p50_ms',
+                   'p95_ms', 'p99_ms', 'bytes', 'per_second')
+        rows = [[str(stage[c]) for c in columns] for stage in report['stages']]
+        widths = [max([len(c)]+[len(row[i]) for row in rows]) for i, c in enumerate(columns)]
+        print(f"Durée totale : {report['wall_s']} s")
+        print('  '.join(c.ljust(w) for c, w in zip(columns, widths)))
+        for row in rows:
+            print('  '.join(v.ljust(w) for v, w in zip(row, widths)))
+
+    def write_report(self, path):
+        """Enregistre le rapport des mesures au format json
+
+        Args:
+            path (str): fichier de destination
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+
+stage_metrics = StageMetrics() #mesures de l'exécution (collecte activée par --profile)
+
+class ParseProfiler():
+    """Profilage cProfile de l'analyse des pages, un profileur par thread
+    est créé puis les résultats sont fusionnés
+    """
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.profiles = []
+
+    @contextmanager
+    def profile(self):
+        """Profile le bloc de code dans le profileur du thread courant
+        """
+        profile = getattr(self.local, 'profile', None)
+        if profile is None:
+            profile = cProfile.Profile()
+            self.local.profile = profile
+            with self.lock:
+                self.profiles.append(profile)
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+
+    def dump(self, path):
+        """Fusionne les profils de tous les threads et les enregistre (format pstats)
+
+        Args:
+            path (str): fichier de destination
+
+        Returns:
+            bool: False si aucune page n'a été profilée
+        """
+        with self.lock:
+            profiles = [p for p in self.profiles if p.getstats()]
+        if not profiles:
+            return False
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+        return True
+
+parse_profiler = None #profileur de l'analyse des pages (activé par --profile-parse)
+
+@contextmanager
+def profile_parse():
+    """Profile le bloc de code avec parse_profiler s'il est activé
+    """
+    if parse_profiler is None:
+        yield
+    else:
+        with parse_profiler.profile():
+            yield
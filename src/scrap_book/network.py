@@ -0,0 +1,446 @@
+"""Client http d'un scrapper : pool de connexions, limiteur de débit par site
+et nouvelles tentatives"""
+import collections
+import email.utils
+import random
+import threading
+import time
+import urllib.robotparser
+from datetime import datetime, timezone
+from urllib.parse import urljoin, urlparse
+
+import requests
+
+from .logs import log_error, log_info
+from .metrics import stage_metrics
+
+RETRY_STATUS = (429, 500, 502, 503, 504) #codes http considérés comme transitoires
+THROTTLE_STATUS = (429, 503) #codes http indiquant que le site limite les requêtes
+MAX_RETRY_AFTER = 300 #attente maximale en secondes demandée par un en-tête Retry-After
+
+class HostRateLimiter():
+    """Limiteur de débit d'un site (seau à jetons) qui s'adapte aux réponses du site :
+        - une réponse 429/503 divise le débit par deux et suspend les requêtes
+          pendant la durée demandée par l'en-tête Retry-After
+        - tant que la latence reste proche de la latence de référence, le débit remonte
+          progressivement jusqu'au maximum configuré (ou jusqu'à lever la limite)
+        - une latence qui se dégrade réduit légèrement le débit
+    """
+    DECREASE_FACTOR = 0.5 #réduction du débit sur une réponse 429/503
+    INCREASE_FACTOR = 1.05 #augmentation du débit sur une réponse à la latence saine
+    SLOW_FACTOR = 0.9 #réduction du débit quand la latence se dégrade
+    HEALTHY_LATENCY_RATIO = 2 #latence saine : inférieure à 2 fois la latence de référence
+    HEALTHY_LATENCY_MARGIN = 0.05 #marge en secondes ajoutée à la latence saine
+    MIN_RATE = 0.2 #débit minimum en requêtes par seconde
+    OBSERVED_WINDOW = 5 #fenêtre en secondes de mesure du débit observé
+
+    def __init__(self, rate=None, crawl_delay=None):
+        if crawl_delay:
+            rate = min(rate or float('inf'), 1/crawl_delay)
+        self.max_rate = rate #None : pas de limite tant que le site ne limite pas les requêtes
+        self.rate = rate
+        self.burst = 1 if crawl_delay else max(1, rate or 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self.last_decrease = 0 #date de la dernière réduction du débit
+        self.latency = None #moyenne mobile de la latence
+        self.base_latency = None #latence de référence (plus petite moyenne observée)
+        self.sent = collections.deque() #dates des dernières requêtes
+        self.lock = threading.Lock()
+
+    def get_observed_rate(self, now):
+        """Renvoie le débit observé sur les dernières secondes
+
+        Args:
+            now (float): date actuelle (time.monotonic)
+
+        Returns:
+            float: requêtes par seconde
+        """
+        while self.sent and self.sent[0] < now-self.OBSERVED_WINDOW:
+            self.sent.popleft()
+        return len(self.sent)/self.OBSERVED_WINDOW
+
+    def reserve(self):
+        """Consomme un jeton si une requête vers le site est autorisée maintenant, sans attendre
+
+        Returns:
+            tuple(float, float): (date d'autorisation de la requête (time.monotonic),
+                                  None si la requête n'est pas autorisée ;
+                                  attente en secondes avant de réessayer)
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return None, self.blocked_until-now
+            if self.rate is None:
+                self.sent.append(now)
+                return now, 0.0
+            self.tokens = min(self.burst, self.tokens+(now-self.updated)*self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.sent.append(now)
+                return now, 0.0
+            return None, (1-self.tokens)/self.rate
+
+    def acquire(self):
+        """Attend qu'une requête vers le site soit autorisée et consomme un jeton
+
+        Returns:
+            float: date d'autorisation de la requête (time.monotonic)
+        """
+        while True:
+            sent_at, delay = self.reserve()
+            if sent_at is not None:
+                return sent_at
+            time.sleep(delay)
+
+    def throttle(self, sent_at, retry_after=None):
+        """Réduit le débit après une réponse 429/503 et suspend les requêtes vers le site.
+        Le débit n'est réduit qu'une fois pour les requêtes envoyées avant la dernière réduction
+        (les réponses 429 d'une même rafale ne divisent pas le débit plusieurs fois)
+
+        Args:
+            sent_at (float): date d'autorisation de la requête (acquire)
+            retry_after (float, optional): attente demandée par le site en secondes
+        """
+        with self.lock:
+            now = time.monotonic()
+            if sent_at >= self.last_decrease:
+                current = self.rate or self.get_observed_rate(now) or self.MIN_RATE
+                self.rate = max(self.MIN_RATE, current*self.DECREASE_FACTOR)
+                self.burst = 1
+                self.tokens = 0
+                self.updated = now
+                self.last_decrease = now
+            delay = retry_after if retry_after is not None else 1/self.rate
+            self.blocked_until = max(self.blocked_until, now+delay)
+
+    def record_latency(self, sent_at, latency):
+        """Adapte le débit à la latence d'une réponse réussie
+
+        Args:
+            sent_at (float): date d'autorisation de la requête (acquire)
+            latency (float): durée de la requête en secondes
+        """
+        with self.lock:
+            self.latency = latency if self.latency is None else 0.8*self.latency+0.2*latency
+            if self.base_latency is None or self.latency < self.base_latency:
+                self.base_latency = self.latency
+            if self.rate is None:
+                return
+            healthy = self.base_latency*self.HEALTHY_LATENCY_RATIO+self.HEALTHY_LATENCY_MARGIN
+            if self.latency <= healthy:
+                self.rate *= self.INCREASE_FACTOR
+                if self.max_rate is not None:
+                    self.rate = min(self.rate, self.max_rate)
+                elif self.rate > 2*self.get_observed_rate(time.monotonic()):
+                    self.rate = None #le débit n'est plus le facteur limitant : on lève la limite
+            elif sent_at >= self.last_decrease:
+                self.rate = max(self.MIN_RATE, self.rate*self.SLOW_FACTOR)
+                self.last_decrease = time.monotonic()
+
+def get_retry_after(response):
+    """Renvoie l'attente demandée par l'en-tête Retry-After d'une réponse
+    (nombre de secondes ou date http)
+
+    Args:
+        response (requests.Response): la réponse
+
+    Returns:
+        float: attente en secondes (None si absente ou invalide)
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = (email.utils.parsedate_to_datetime(value)-
+                     datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(0.0, delay), MAX_RETRY_AFTER)
+
+class HttpClient():
+    """Client http d'un scrapper : session (pool de connexions), sémaphore et limiteur de débit
+    de chaque site, nouvelles tentatives et statistiques. Chaque Scraper a son propre client,
+    les connexions et les limiteurs sont conservés d'un scrapping à l'autre
+    """
+    def __init__(self, timeout=10, retries=3, backoff=0.5, pool_size=8, per_host=8, rate=None,
+                 robots=True):
+        """
+        Args:
+            timeout (float, optional): délai maximum d'attente d'une réponse en secondes.
+                                       Defaults to 10.
+            retries (int, optional): nombre de nouvelles tentatives en cas d'erreur transitoire.
+                                     Defaults to 3.
+            backoff (float, optional): délai de base en secondes du backoff exponentiel.
+                                       Defaults to 0.5.
+            pool_size (int, optional): nombre de connexions conservées par site. Defaults to 8.
+            per_host (int, optional): nombre maximum de requêtes simultanées vers un même site.
+                                      Defaults to 8.
+            rate (float, optional): nombre maximum de requêtes par seconde vers un même site
+                                    (None ou 0 : sans limite). Defaults to None.
+            robots (bool, optional): respect du crawl-delay du robots.txt de chaque site.
+                                     Defaults to True.
+        """
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.backoff = max(0, backoff)
+        self.pool_size = max(1, pool_size)
+        self.max_per_host = max(1, per_host)
+        self.max_rate = rate if rate else None
+        self.use_robots = robots
+        self.session = None
+        self.session_lock = threading.Lock()
+        self.host_semaphores = {} #sémaphore de chaque site {netloc: BoundedSemaphore}
+        self.host_semaphores_lock = threading.Lock()
+        self.host_limiters = {} #limiteur de débit de chaque site {netloc: HostRateLimiter}
+        self.host_limiters_lock = threading.Lock()
+        self.host_limiter_init_locks = {} #verrou de création du limiteur de chaque site
+        #async : connexions du connecteur aiohttp (aio)
+        self.stats = {'requests':0, 'retries':0, 'errors':0, 'throttled':0,
+                      'async_connections':0, 'async_reused':0}
+        self.stats_lock = threading.Lock()
+
+    def configure(self, timeout=None, retries=None, backoff=None, pool_size=None, per_host=None,
+                  rate=None, robots=None):
+        """Modifie les paramètres du client. Seul ce qui dépend d'un paramètre modifié est
+        recréé à la prochaine requête (session, sémaphores ou limiteurs de débit)
+
+        Args:
+            timeout (float, optional): délai maximum d'attente d'une réponse en secondes
+            retries (int, optional): nombre de nouvelles tentatives en cas d'erreur transitoire
+            backoff (float, optional): délai de base en secondes du backoff exponentiel
+            pool_size (int, optional): nombre de connexions conservées par site
+            per_host (int, optional): nombre maximum de requêtes simultanées par site
+            rate (float, optional): nombre maximum de requêtes par seconde par site
+                                    (0 : sans limite)
+            robots (bool, optional): respect du crawl-delay du robots.txt de chaque site
+        """
+        with self.session_lock:
+            if timeout is not None:
+                self.timeout = timeout
+            if retries is not None:
+                self.retries = max(0, retries)
+            if backoff is not None:
+                self.backoff = max(0, backoff)
+            if pool_size is not None and max(1, pool_size) != self.pool_size:
+                self.pool_size = max(1, pool_size)
+                if self.session is not None:
+                    self.session.close()
+                    self.session = None
+        if per_host is not None and max(1, per_host) != self.max_per_host:
+            self.max_per_host = max(1, per_host)
+            with self.host_semaphores_lock:
+                self.host_semaphores.clear()
+        new_rate = rate if rate is None or rate > 0 else None
+        if (rate is not None and new_rate != self.max_rate) or \
+           (robots is not None and robots != self.use_robots):
+            if rate is not None:
+                self.max_rate = new_rate
+            if robots is not None:
+                self.use_robots = robots
+            with self.host_limiters_lock:
+                self.host_limiters.clear()
+
+    def get_session(self):
+        """Renvoie la session http du client (créée au premier appel),
+        les connexions sont conservées et réutilisées pour chaque site
+
+        Returns:
+            requests.Session: la session
+        """
+        with self.session_lock:
+            if self.session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=16,
+                                                        pool_maxsize=self.pool_size,
+                                                        max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self.session = session
+            return self.session
+
+    def get_host_semaphore(self, url):
+        """Renvoie le sémaphore qui limite les requêtes simultanées vers le site de l'url
+
+        Args:
+            url (str): url à requêter
+
+        Returns:
+            threading.BoundedSemaphore: sémaphore du site
+        """
+        host = urlparse(url).netloc
+        with self.host_semaphores_lock:
+            if host not in self.host_semaphores:
+                self.host_semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self.host_semaphores[host]
+
+    def get_robots_crawl_delay(self, url):
+        """Renvoie le délai entre deux requêtes demandé par le robots.txt du site de l'url
+        (Crawl-delay ou Request-rate)
+
+        Args:
+            url (str): url du site
+
+        Returns:
+            float: délai en secondes (None si aucun délai n'est demandé)
+        """
+        url_robots = urljoin(url, '/robots.txt')
+        try:
+            response = self.get_session().get(url_robots, timeout=self.timeout)
+            if response.status_code != 200:
+                return None
+            robots = urllib.robotparser.RobotFileParser(url_robots)
+            robots.parse(response.text.splitlines())
+            robots.modified() #sans date de lecture, robotparser ignore les délais
+            user_agent = self.get_session().headers.get('User-Agent', '*')
+            delay = robots.crawl_delay(user_agent)
+            request_rate = robots.request_rate(user_agent)
+            if request_rate is not None and request_rate.requests > 0:
+                delay = max(delay or 0, request_rate.seconds/request_rate.requests)
+            if delay:
+                log_info(f"robots.txt : {delay} s entre deux requêtes vers {urlparse(url).netloc}")
+            return float(delay) if delay else None
+        except Exception as _e:
+            log_error('',url_robots,_e)
+            return None
+
+    def get_host_limiter(self, url):
+        """Renvoie le limiteur de débit du site de l'url,
+        créé à la première requête à partir du débit configuré et du robots.txt du site
+
+        Args:
+            url (str): url à requêter
+
+        Returns:
+            HostRateLimiter: limiteur du site
+        """
+        host = urlparse(url).netloc
+        with self.host_limiters_lock:
+            if host in self.host_limiters:
+                return self.host_limiters[host]
+            init_lock = self.host_limiter_init_locks.setdefault(host, threading.Lock())
+        #le robots.txt est lu une seule fois par site, sans bloquer les requêtes des autres sites
+        with init_lock:
+            with self.host_limiters_lock:
+                if host in self.host_limiters:
+                    return self.host_limiters[host]
+            crawl_delay = self.get_robots_crawl_delay(url) if self.use_robots else None
+            limiter = HostRateLimiter(self.max_rate, crawl_delay)
+            with self.host_limiters_lock:
+                return self.host_limiters.setdefault(host, limiter)
+
+    def count_stat(self, name):
+        """Incrémente un compteur des statistiques http
+
+        Args:
+            name (str): nom du compteur
+        """
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def get_backoff_delay(self, attempt):
+        """Renvoie le délai d'attente avant la tentative suivante :
+        backoff exponentiel avec jitter complet
+
+        Args:
+            attempt (int): numéro de la tentative qui vient d'échouer (à partir de 0)
+
+        Returns:
+            float: délai en secondes
+        """
+        return random.uniform(0, self.backoff * 2**attempt)
+
+    def get(self, url, **kwargs):
+        """Effectue une requête GET avec la session du client, au rythme autorisé par le
+        limiteur de débit du site. Les erreurs de connexion et les réponses 429/5xx sont
+        retentées avec un backoff exponentiel (ou après l'attente demandée par le site)
+
+        Args:
+            url (str): url à requêter
+            **kwargs: paramètres supplémentaires transmis à requests (headers, stream...)
+
+        Returns:
+            requests.Response: la réponse
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlparse(url).netloc
+        limiter = self.get_host_limiter(url)
+        attempt = 0
+        while True:
+            self.count_stat('requests')
+            throttled = False
+            try:
+                #on attend son tour auprès du limiteur avant de prendre une place du site,
+                #pour ne pas bloquer une place pendant l'attente
+                sent_at = limiter.acquire()
+                with self.get_host_semaphore(url):
+                    start = time.perf_counter()
+                    response = self.get_session().get(url, **kwargs)
+                if kwargs.get('stream'):
+                    nbytes = int(response.headers.get('Content-Length') or 0)
+                else:
+                    nbytes = len(response.content)
+                duration = time.perf_counter()-start
+                stage_metrics.record('http', duration, nbytes, host,
+                                     error=response.status_code >= 400)
+                if response.status_code in THROTTLE_STATUS:
+                    self.count_stat('throttled')
+                    limiter.throttle(sent_at, get_retry_after(response))
+                    throttled = True
+                elif response.status_code < 400:
+                    limiter.record_latency(sent_at, duration)
+                if response.status_code not in RETRY_STATUS or attempt >= self.retries:
+                    return response
+                response.close()
+            except (requests.ConnectionError, requests.Timeout) as _e:
+                stage_metrics.record('http', time.perf_counter()-start, host=host, error=True)
+                if attempt >= self.retries:
+                    self.count_stat('errors')
+                    raise
+            self.count_stat('retries')
+            if not throttled: #le limiteur du site attend déjà le délai demandé
+                time.sleep(self.get_backoff_delay(attempt))
+            attempt += 1
+
+    def get_stats(self):
+        """Renvoie les statistiques du client : nombre de requêtes, de nouvelles tentatives,
+        de réponses 429/503, de connexions ouvertes, taux de réutilisation des connexions
+        (pools de la session et connecteur du moteur asynchrone) et débit courant de chaque site
+
+        Returns:
+            dict: statistiques http
+        """
+        with self.stats_lock:
+            stats = dict(self.stats)
+        connections = stats.pop('async_connections')
+        pool_requests = connections+stats.pop('async_reused')
+        if self.session is not None:
+            for adapter in set(self.session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools[key]
+                    connections += pool.num_connections
+                    pool_requests += pool.num_requests
+        stats['connections'] = connections
+        stats['reused_connections'] = max(0, pool_requests-connections)
+        stats['pool_hit_rate'] = round(stats['reused_connections']/pool_requests, 3) \
+                                 if pool_requests else 0.0
+        with self.host_limiters_lock:
+            stats['host_rates'] = {host: round(limiter.rate, 2) if limiter.rate else None
+                                   for host, limiter in self.host_limiters.items()}
+        return stats
+
+    def close(self):
+        """Ferme la session http et ses connexions
+        """
+        with self.session_lock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
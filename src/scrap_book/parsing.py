@@ -0,0 +1,129 @@
+"""Analyse des pages livres (lxml ou BeautifulSoup)"""
+from lxml import html, etree
+
+from .cache import cached_get
+from .book import Book
+from .context import get_context
+from .fingerprint import get_book_from_content
+from .logs import log_error
+from .metrics import profile_parse, stage_metrics
+from .utils import find_specific_td_in_table
+
+def get_book_from_url(url, context=None):
+    """Renvoi un object livre à partir d'un url,
+    la page n'est pas analysée si son empreinte n'a pas changé (fingerprint)
+
+    Args:
+        url (str): url du livre
+        context (ScrapeContext, optional): contexte du scrapping (client et cache http,
+                                           empreintes, analyseur). Defaults to None.
+
+    Returns:
+        Book: le livre
+    """
+    context = get_context(context)
+    try:
+        with stage_metrics.timer('fetch'):
+            _reponse = cached_get(url, context)
+
+        def parse():
+            with stage_metrics.timer('parse'), profile_parse():
+                return BOOK_PARSERS[context.parser](url, _reponse.text)
+
+        return get_book_from_content(url, _reponse.content, parse, context.fingerprint_store)
+
+    except Exception as _e:
+        log_error('',url,_e)
+        return None
+
+def parse_book_bs4(url, page, clean=True):
+    """Construit le livre à partir du html de sa page avec BeautifulSoup
+
+    Args:
+        url (str): url du livre
+        page (str): html de la page du livre
+        clean (bool, optional): nettoie les valeurs, sinon le livre est brut. Defaults to True.
+
+    Returns:
+        Book: le livre
+    """
+    from bs4 import BeautifulSoup #import différé : bs4 n'est pas chargé à l'import du paquet
+    soup = BeautifulSoup(page,features="lxml")
+    table = soup.find('table',{'class':'table table-striped'})
+
+    product_page_url = url
+    universal_product_code = find_specific_td_in_table(table,'UPC')
+    title = soup.find('div',{'class':'product_main'}).find('h1').text.strip()
+    price_including_tax = find_specific_td_in_table(table,'Price (incl. tax)')[1:]
+    price_excluding_tax = find_specific_td_in_table(table,'Price (excl. tax)')[1:]
+    number_available = find_specific_td_in_table(table,'Availability')
+    product_description = soup.find('article',{'class':'product_page'})\
+                          .findAll('p')[3].text
+    category = soup.find('ul',{'class':'breadcrumb'}).findAll('li')[-2].text
+    review_rating = soup.find('p',{'class':'star-rating'})['class']
+    image_url = soup.find('div',{'class':'carousel-inner'}).find('img')['src']
+    return Book(product_page_url,
+                universal_product_code,
+                title,
+                price_including_tax,
+                price_excluding_tax,
+                number_available,
+                product_description,
+                category,
+                review_rating,
+                image_url,
+                clean=clean)
+
+def xpath_class(tag, class_name):
+    """Renvoie l'expression XPath d'une balise possédant la classe css {class_name}
+
+    Args:
+        tag (str): nom de la balise
+        class_name (str): classe css recherchée
+
+    Returns:
+        str: expression XPath
+    """
+    return f'{tag}[contains(concat(" ", normalize-space(@class), " "), " {class_name} ")]'
+
+#expressions XPath compilées une seule fois pour la page d'un livre
+XPATH_BOOK_TABLE_ROWS = etree.XPath('(//table[@class="table table-striped"])[1]//tr')
+XPATH_BOOK_TITLE = etree.XPath(f'(//{xpath_class("div", "product_main")})[1]//h1[1]')
+XPATH_BOOK_DESCRIPTION = etree.XPath(f'(//{xpath_class("article", "product_page")})[1]//p')
+XPATH_BOOK_BREADCRUMB = etree.XPath(f'(//{xpath_class("ul", "breadcrumb")})[1]//li')
+XPATH_BOOK_RATING = etree.XPath(f'(//{xpath_class("p", "star-rating")})[1]/@class')
+XPATH_BOOK_IMAGE = etree.XPath(f'(//{xpath_class("div", "carousel-inner")})[1]//img[1]/@src')
+
+def parse_book_lxml(url, page, clean=True):
+    """Construit le livre à partir du html de sa page avec des expressions XPath compilées,
+    le tableau d'informations est lu une seule fois sous forme de dictionnaire
+
+    Args:
+        url (str): url du livre
+        page (str): html de la page du livre
+        clean (bool, optional): nettoie les valeurs, sinon le livre est brut. Defaults to True.
+
+    Returns:
+        Book: le livre
+    """
+    tree = html.fromstring(page)
+    table = {}
+    for tr in XPATH_BOOK_TABLE_ROWS(tree):
+        th = tr.find('th')
+        td = tr.find('td')
+        if th is not None and td is not None:
+            table.setdefault(th.text_content(), td.text_content().strip())
+
+    return Book(url,
+                table.get('UPC'),
+                XPATH_BOOK_TITLE(tree)[0].text_content().strip(),
+                table['Price (incl. tax)'][1:],
+                table['Price (excl. tax)'][1:],
+                table.get('Availability'),
+                XPATH_BOOK_DESCRIPTION(tree)[3].text_content(),
+                XPATH_BOOK_BREADCRUMB(tree)[-2].text_content(),
+                XPATH_BOOK_RATING(tree)[0].split(),
+                XPATH_BOOK_IMAGE(tree)[0],
+                clean=clean)
+
+BOOK_PARSERS = {'lxml': parse_book_lxml, 'bs4': parse_book_bs4} #analyseurs de page disponibles
@@ -0,0 +1,483 @@
+"""Interface de programmation du scrapper : Scraper et scrape"""
+import os
+import shutil
+
+from .constants import DEFAULT_URL
+from .logs import log_error, log_info
+
+
+def normalize_categories(categories):
+    """Renvoie la liste des catégories (ou motifs) en minuscules,
+    chaque élément peut contenir plusieurs catégories séparées par des virgules
+
+    Args:
+        categories (str | list[str]): catégories ou motifs de catégories
+
+    Returns:
+        list[str]: catégories (None si aucune catégorie n'est fournie)
+    """
+    if categories is None:
+        return None
+    if isinstance(categories, str):
+        categories = [categories]
+    return [cat.strip().lower() for arg in categories for cat in arg.split(',') if cat.strip()]
+
+
+class Scraper():
+    """Scrapper du catalogue d'un site, réutilisable pour plusieurs scrappings successifs :
+    son client http (connexions, limiteurs de débit), l'index des catégories et les
+    dépendances importées sont conservés d'un appel à l'autre. Chaque scrapping reçoit son
+    propre contexte (client http, cache, empreintes, analyseur) : plusieurs Scraper peuvent
+    être utilisés en même temps sans partager leur configuration.
+    Les modules des différentes étapes (et leurs dépendances : requests, bs4, lxml, tqdm...)
+    ne sont importés qu'au premier scrapping
+    """
+    def __init__(self, url=DEFAULT_URL, workers=8, parse_workers=0, parser='lxml',
+                 image_workers=4, download_images=True, max_per_host=8, rate=0, robots=True,
+                 timeout=10, retries=3, cache_dir=None, use_cache=True, cache_max_age=30,
+                 cache_max_size=500, fmt='csv', engine='threads', max_in_flight=64,
+                 work_queue=None, fingerprint=False, changed_only=False, process_images=False,
+                 thumbnail_size=128, catalogue=False):
+        """
+        Args:
+            url (str, optional): url du site. Defaults to DEFAULT_URL.
+            workers (int, optional): nombre de livres récupérés en parallèle. Defaults to 8.
+            parse_workers (int, optional): nombre de processus dédiés à l'analyse des pages,
+                                           0 pour analyser les pages dans les threads de
+                                           téléchargement. Defaults to 0.
+            parser (str, optional): analyseur des pages livres (lxml ou bs4). Defaults to 'lxml'.
+            image_workers (int, optional): nombre d'images téléchargées en parallèle.
+                                           Defaults to 4.
+            download_images (bool, optional): télécharge les images des livres dans le
+                                              répertoire de sortie. Defaults to True.
+            max_per_host (int, optional): nombre maximum de requêtes simultanées par site.
+                                          Defaults to 8.
+            rate (float, optional): nombre maximum de requêtes par seconde par site
+                                    (0 : sans limite). Defaults to 0.
+            robots (bool, optional): respect du crawl-delay du robots.txt. Defaults to True.
+            timeout (float, optional): délai maximum d'attente d'une réponse en secondes.
+                                       Defaults to 10.
+            retries (int, optional): nombre de nouvelles tentatives en cas d'erreur réseau.
+                                     Defaults to 3.
+            cache_dir (str, optional): répertoire du cache http, par défaut
+                                       "{output}/.cache" si un répertoire de sortie est fourni.
+                                       Defaults to None.
+            use_cache (bool, optional): utilise le cache http. Defaults to True.
+            cache_max_age (float, optional): nombre de jours après lequel une page non
+                                             revalidée est supprimée du cache. Defaults to 30.
+            cache_max_size (float, optional): taille maximale du cache en Mo. Defaults to 500.
+            fmt (str, optional): format de sortie (csv, parquet ou feather). Defaults to 'csv'.
+            engine (str, optional): moteur de scrapping : threads (pools de threads) ou async
+                                    (une seule boucle asyncio, nécessite aiohttp).
+                                    Defaults to 'threads'.
+            max_in_flight (int, optional): nombre maximum de requêtes en cours avec le moteur
+                                           async, tous sites confondus. Defaults to 64.
+            work_queue (WorkQueue, optional): file de travail du mode distribué : les url
+                                              découvertes y sont ajoutées et les livres sont
+                                              récupérés par les workers (le moteur n'est
+                                              alors pas utilisé). Defaults to None.
+            fingerprint (bool, optional): conserve l'empreinte des pages livres dans
+                                          "{output}/fingerprints.sqlite" : une page inchangée
+                                          n'est pas analysée et un livre déjà récupéré sous
+                                          une autre url est ignoré. Defaults to False.
+            changed_only (bool, optional): avec {fingerprint}, enregistre aussi les livres
+                                           nouveaux ou modifiés depuis l'exécution précédente
+                                           dans "{output}/changes" (les fichiers complets
+                                           restent écrits). Defaults to False.
+            process_images (bool, optional): post-traite les images dans un pool de processus :
+                                             originaux stockés par empreinte de contenu,
+                                             vignettes, empreintes perceptuelles et chemin
+                                             local de l'image dans les livres (image_path),
+                                             nécessite Pillow. Defaults to False.
+            thumbnail_size (int, optional): côté en pixels des vignettes. Defaults to 128.
+            catalogue (bool, optional): enregistre aussi les livres dans le catalogue SQLite
+                                        indexé "{output}/catalogue.sqlite", avec l'historique
+                                        des prix et de la disponibilité. Defaults to False.
+        """
+        self.url = url
+        self.workers = workers
+        self.parse_workers = parse_workers
+        self.parser = parser
+        self.image_workers = image_workers
+        self.download_images = download_images
+        self.max_per_host = max_per_host
+        self.rate = rate
+        self.robots = robots
+        self.timeout = timeout
+        self.retries = retries
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self.cache_max_age = cache_max_age
+        self.cache_max_size = cache_max_size
+        self.format = fmt
+        self.engine = engine
+        self.max_in_flight = max_in_flight
+        self.work_queue = work_queue
+        self.fingerprint = fingerprint
+        self.changed_only = changed_only
+        self.process_images = process_images
+        self.thumbnail_size = thumbnail_size
+        self.catalogue = catalogue
+        self.stats = {}
+        self.http = None #client http, créé au premier scrapping
+
+    def configure(self):
+        """Crée ou met à jour le client http du scrapper avec ses paramètres
+
+        Returns:
+            HttpClient: le client http
+        """
+        from .network import HttpClient
+        if self.http is None:
+            self.http = HttpClient()
+        self.http.configure(timeout=self.timeout,
+                            retries=self.retries,
+                            pool_size=max(self.workers, self.max_per_host),
+                            per_host=self.max_per_host,
+                            rate=self.rate,
+                            robots=self.robots)
+        return self.http
+
+    def open_context(self, output):
+        """Renvoie le contexte d'un scrapping : client http du scrapper, cache http,
+        empreintes des pages et analyseur
+
+        Args:
+            output (str): répertoire de sortie (None si aucun)
+
+        Returns:
+            ScrapeContext: le contexte
+        """
+        from .context import ScrapeContext
+        return ScrapeContext(self.configure(), self.open_cache(output),
+                             self.open_fingerprint_store(output), self.parser)
+
+    def open_cache(self, output):
+        """Ouvre le cache http du scrapping
+
+        Args:
+            output (str): répertoire de sortie (None si aucun)
+
+        Returns:
+            HttpCache: le cache (None si le cache est désactivé ou n'a pas pu être ouvert)
+        """
+        cache_dir = self.cache_dir
+        if cache_dir is None and output is not None:
+            cache_dir = f'{output}/.cache'
+        if not self.use_cache or cache_dir is None:
+            return None
+        from .cache import HttpCache
+        log_info(f"Lecteur parametre cache : {cache_dir}")
+        try:
+            return HttpCache(cache_dir,
+                             max_age=self.cache_max_age*24*3600,
+                             max_size=int(self.cache_max_size*1024*1024))
+        except Exception as _e:
+            log_error('',cache_dir,_e)
+            return None
+
+    def open_fingerprint_store(self, output):
+        """Ouvre la base des empreintes des pages livres du scrapping
+
+        Args:
+            output (str): répertoire de sortie (None si aucun)
+
+        Returns:
+            FingerprintStore: les empreintes (None si désactivées ou si la base
+                              n'a pas pu être ouverte)
+        """
+        if not self.fingerprint or output is None:
+            return None
+        from .fingerprint import FingerprintStore
+        try:
+            return FingerprintStore(f'{output}/fingerprints.sqlite')
+        except Exception as _e:
+            log_error('',output,_e)
+            return None
+
+    @staticmethod
+    def open_change_dir(output):
+        """Vide et renvoie le répertoire des différences de l'exécution (changed_only) :
+        {output}/changes/books ne contient que les livres nouveaux ou modifiés
+
+        Args:
+            output (str): répertoire de sortie
+
+        Returns:
+            str: répertoire de sortie des différences
+        """
+        change_dir = f'{output}/changes'
+        shutil.rmtree(change_dir, ignore_errors=True)
+        os.makedirs(f'{change_dir}/books', exist_ok=True)
+        return change_dir
+
+    def iter_discovery(self, categories, all_categories, journal=None, context=None):
+        """Renvoie le flux des informations des livres découverts sur les pages de liste
+
+        Args:
+            categories (list[str]): catégories ou motifs de catégories (None pour tout le site)
+            all_categories (bool): scrappe toutes les catégories du site en parallèle
+            journal (CrawlJournal, optional): journal de reprise. Defaults to None.
+            context (ScrapeContext, optional): contexte du scrapping. Defaults to None.
+
+        Returns:
+            iterable[dict]: informations des livres (get_list_books_info)
+        """
+        from .discovery import iter_categories_pages_info, iter_list_pages_info, \
+                               resolve_categories
+        if journal is not None and journal.discovery_done:
+            log_info(f"Reprise : {journal.nb_discovered} livre(s) déjà découvert(s)")
+            return journal.iter_previous_discovered()
+        if categories is not None or all_categories:
+            liste_category = resolve_categories(self.url, categories, context)
+            log_info(f"{len(liste_category)} catégorie(s) à scrapper : {liste_category}")
+            flux_pages = iter_categories_pages_info(self.url, liste_category, self.workers,
+                                                    context)
+        else:
+            flux_pages = iter_list_pages_info(self.url, None, self.workers, context)
+        if journal is not None:
+            return journal.iter_discovered(flux_pages)
+        return (info for list_info in flux_pages for info in list_info)
+
+    def scrape(self, categories=None, output=None, all_categories=False, incremental=False,
+               resume=False):
+        """Scrappe les livres du site (ou des catégories) et les renvoie au fur et à mesure.
+        Si un répertoire de sortie est fourni, les livres y sont enregistrés au format
+        du scrapper, les images téléchargées et l'exécution est journalisée pour la reprise.
+        Les statistiques de l'exécution sont disponibles dans {stats} à la fin du flux
+
+        Args:
+            categories (str | list[str], optional): catégories ou motifs de catégories
+                                                    (ex: "sci*"), None pour tout le site.
+                                                    Defaults to None.
+            output (str, optional): répertoire de sortie, None pour ne rien enregistrer.
+                                    Defaults to None.
+            all_categories (bool, optional): scrappe toutes les catégories du site en parallèle.
+                                             Defaults to False.
+            incremental (bool, optional): ne récupère que les livres nouveaux ou modifiés
+                                          depuis l'exécution précédente (nécessite {output}).
+                                          Defaults to False.
+            resume (bool, optional): reprend l'exécution précédente interrompue
+                                     (nécessite {output}). Defaults to False.
+
+        Yields:
+            Book: les livres récupérés (et, en mode incrémental, les livres inchangés)
+        """
+        from .fetch import iter_books_from_urls
+        from .incremental import UrlSelector, load_previous_books
+
+        categories = normalize_categories(categories)
+        self.stats = {'discovered':0, 'fetched':0, 'unchanged':0, 'resumed':0, 'saved':0,
+                      'duplicates':0, 'changed':0, 'images':None, 'cache':None,
+                      'fingerprint':None}
+
+        journal = None
+        book_sink = None
+        image_downloader = None
+        pipeline = None
+        context = self.open_context(output)
+        fingerprint_store = context.fingerprint_store
+        #avec changed_only, url des livres nouveaux ou modifiés enregistrés aussi dans les
+        #fichiers de différences
+        changed_url = set() if self.changed_only and fingerprint_store is not None else None
+        try:
+            if self.engine == 'async' and self.work_queue is None:
+                from .aio import AsyncPipeline
+                pipeline = AsyncPipeline(self.url, self.workers, self.parse_workers,
+                                         self.max_in_flight, context)
+            if output is not None:
+                from .images import ImageDownloader, ImageProcessor
+                from .journal import CrawlJournal
+                from .sinks import creation_repertoire_sortie, get_book_sink
+                #on créer les répertoire de sortie
+                creation_repertoire_sortie(output)
+                #on ouvre le journal de reprise
+                journal = CrawlJournal(f'{output}/journal.jsonl', resume=resume)
+                book_sink = get_book_sink(output, self.format,
+                                          image_path=self.download_images and self.process_images)
+                if self.catalogue:
+                    from .catalogue import CatalogueStore
+                    from .sinks import MultiBookSink
+                    book_sink = MultiBookSink([book_sink,
+                                               CatalogueStore(f'{output}/catalogue.sqlite',
+                                                              url=self.url)])
+                if changed_url is not None:
+                    from .sinks import FilteredBookSink, MultiBookSink
+                    change_sink = get_book_sink(self.open_change_dir(output), self.format,
+                                                image_path=self.download_images and \
+                                                           self.process_images)
+                    book_sink = MultiBookSink([book_sink, FilteredBookSink(
+                        change_sink, lambda book: book.product_page_url in changed_url)])
+                if self.download_images and self.process_images:
+                    #le post-traitement utilise ses propres threads de téléchargement,
+                    #quel que soit le moteur
+                    image_downloader = ImageProcessor(output, self.image_workers, journal,
+                                                      thumbnail_size=self.thumbnail_size,
+                                                      context=context)
+                elif self.download_images and pipeline is not None:
+                    image_downloader = pipeline.get_image_downloader(output, self.image_workers,
+                                                                     journal)
+                elif self.download_images:
+                    image_downloader = ImageDownloader(output, self.image_workers, journal,
+                                                       context)
+
+            #en mode incrémental on ne récupère que les livres nouveaux ou modifiés
+            previous_books = None
+            liste_book_unchanged = []
+            if incremental and output is not None:
+                previous_books = load_previous_books(output, self.format)
+
+            def on_unchanged_book(book):
+                liste_book_unchanged.append(book)
+                if journal is not None:
+                    journal.add_book(book)
+
+            #en cas de reprise, les livres déjà récupérés ne sont pas scrappés à nouveau
+            done_url = journal.done_url if journal is not None else set()
+            if done_url:
+                log_info(f"Reprise : {len(done_url)} livre(s) déjà récupéré(s)")
+            selector = UrlSelector(previous_books, done_url=done_url,
+                                   on_unchanged=on_unchanged_book)
+
+            def select_url(info):
+                self.stats['discovered'] += 1
+                return selector.select(info)
+
+            #on découvre les url des livres (ou on les relit depuis le journal en cas de reprise),
+            #les url sont transmises à l'étape de récupération au fur et à mesure
+            if pipeline is not None:
+                flux_book = pipeline.iter_books(categories, all_categories, select_url, journal)
+            else:
+                flux_url_book = (url for url in map(select_url,
+                                                    self.iter_discovery(categories,
+                                                                        all_categories, journal,
+                                                                        context))
+                                 if url is not None)
+                if self.work_queue is not None:
+                    from .distributed import iter_books_from_queue
+                    flux_book = iter_books_from_queue(self.work_queue, flux_url_book)
+                else:
+                    flux_book = iter_books_from_urls(flux_url_book, self.workers,
+                                                     self.parse_workers, context)
+            log_info(f"Scrapping des informations des livres en cours")
+
+            #on scrappe tous les url des livres en parallèle, chaque livre est enregistré
+            #et son image téléchargée au fur et à mesure:
+            for book in (journal.iter_books() if journal is not None else ()):
+                self.stats['resumed'] += 1
+                yield self.store_book(book, book_sink, image_downloader)
+                self.write_ready_books(image_downloader, book_sink)
+            for book in flux_book:
+                if book is None:
+                    continue
+                status = fingerprint_store.pop_status(book) \
+                         if fingerprint_store is not None else 'new'
+                if status == 'duplicate':
+                    #même livre (UPC) déjà récupéré sous une autre url
+                    self.stats['duplicates'] += 1
+                    continue
+                self.stats['fetched'] += 1
+                if journal is not None:
+                    journal.add_book(book)
+                if status in ('new', 'changed'):
+                    self.stats['changed'] += 1
+                    if changed_url is not None:
+                        changed_url.add(book.product_page_url)
+                yield self.store_book(book, book_sink, image_downloader)
+                self.write_ready_books(image_downloader, book_sink)
+            for book in liste_book_unchanged:
+                self.stats['unchanged'] += 1
+                #l'image d'un livre inchangé n'est pas téléchargée à nouveau
+                yield self.store_book(book, book_sink, image_downloader, download=False)
+                self.write_ready_books(image_downloader, book_sink)
+
+            log_info(f"{self.stats['discovered']} livres trouvés")
+            if fingerprint_store is not None:
+                log_info(f"Empreintes : {self.stats['changed']} livre(s) nouveau(x) ou "
+                         f"modifié(s), {self.stats['duplicates']} doublon(s) ignoré(s)")
+            if incremental:
+                log_info(f"Mode incrémental : {self.stats['fetched']} livre(s) nouveau(x) ou "
+                         f"modifié(s), {self.stats['unchanged']} livre(s) inchangé(s)")
+        finally:
+            if image_downloader is not None:
+                #on attend la fin du téléchargement des images:
+                log_info(f"Téléchargement des images en cours")
+                self.stats['images'] = image_downloader.close()
+                log_info(f"Images : {self.stats['images']}")
+                self.write_ready_books(image_downloader, book_sink)
+            if book_sink is not None:
+                try:
+                    self.stats['saved'] = book_sink.close()
+                    log_info(f"{self.stats['saved']} livre(s) enregistré(s)")
+                except Exception as _e:
+                    log_error('',output,_e)
+            if pipeline is not None:
+                pipeline.close()
+            if journal is not None:
+                journal.close()
+            if context.http_cache is not None:
+                self.stats['cache'] = context.http_cache.close()
+                log_info(f"Statistiques cache : {self.stats['cache']}")
+            if fingerprint_store is not None:
+                self.stats['fingerprint'] = fingerprint_store.close()
+                log_info(f"Statistiques empreintes : {self.stats['fingerprint']}")
+
+    @staticmethod
+    def store_book(book, book_sink, image_downloader, download=True):
+        """Enregistre le livre et ajoute son image à la file de téléchargement,
+        avec le post-traitement des images le livre n'est enregistré qu'une fois son image
+        traitée (write_ready_books)
+
+        Args:
+            book (Book): le livre
+            book_sink (CsvBookSink | ArrowBookSink): objet d'enregistrement (None si aucun)
+            image_downloader (ImageDownloader): téléchargeur d'images (None si aucun)
+            download (bool, optional): télécharge l'image du livre. Defaults to True.
+
+        Returns:
+            Book: le livre
+        """
+        if image_downloader is not None:
+            image_downloader.submit(book, download)
+            if image_downloader.defer_books:
+                return book
+        if book_sink is not None:
+            try:
+                book_sink.write(book)
+            except Exception as _e:
+                log_error('',book.product_page_url,_e)
+        return book
+
+    @staticmethod
+    def write_ready_books(image_downloader, book_sink):
+        """Enregistre les livres dont l'image a été traitée (post-traitement des images)
+
+        Args:
+            image_downloader (ImageDownloader): téléchargeur d'images (None si aucun)
+            book_sink (CsvBookSink | ArrowBookSink): objet d'enregistrement (None si aucun)
+        """
+        if image_downloader is None:
+            return
+        for book in image_downloader.pop_ready_books():
+            if book_sink is not None:
+                try:
+                    book_sink.write(book)
+                except Exception as _e:
+                    log_error('',book.product_page_url,_e)
+
+
+def scrape(categories=None, output=None, url=DEFAULT_URL, **options):
+    """Scrappe les livres du site (ou des catégories) avec un Scraper créé pour l'occasion
+
+    Args:
+        categories (str | list[str], optional): catégories ou motifs de catégories,
+                                                None pour tout le site. Defaults to None.
+        output (str, optional): répertoire de sortie, None pour ne rien enregistrer.
+                                Defaults to None.
+        url (str, optional): url du site. Defaults to DEFAULT_URL.
+        **options: paramètres supplémentaires du Scraper (workers, parser, rate...)
+
+    Yields:
+        Book: les livres récupérés
+    """
+    yield from Scraper(url, **options).scrape(categories, output)
@@ -0,0 +1,297 @@
+"""Enregistrement des livres (csv, parquet ou feather)"""
+import csv
+import os
+import threading
+
+from .constants import BOOK_FIELDS, IMAGE_PATH_FIELD
+from .logs import log_error, log_info
+from .metrics import stage_metrics
+
+def creation_repertoire_sortie(rep):
+    """Créer les répertoire de sortie {rep}, {rep}/data et {rep}/images 
+    (les répertoires existants sont conservés)
+
+    Args:
+        rep (str): répertoire à créer
+    """
+    try:
+        os.makedirs(rep+'/books', exist_ok=True)
+        os.makedirs(rep+'/images', exist_ok=True)
+    except Exception as _e:
+        log_error('',rep,_e)
+        return None
+
+class CsvBookSink():
+    """Enregistre les livres au fur et à mesure dans {output_dir}/books/{category}.csv,
+    un fichier reste ouvert par catégorie et les écritures sont vidées sur le disque
+    tous les {flush_every} livres
+    """
+    def __init__(self, output_dir, flush_every=50, fields=BOOK_FIELDS):
+        self.output_dir = output_dir
+        self.fields = fields
+        self.flush_every = max(1, flush_every)
+        self.files = {} #fichier ouvert de chaque catégorie {category: (file, csv.writer)}
+        self.lock = threading.Lock()
+        self.nb_book = 0
+        self.nb_pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_writer(self, category):
+        """Renvoie le csv.writer de la catégorie, le fichier est créé avec son en-tête
+
+        Args:
+            category (str): catégorie du livre
+
+        Returns:
+            csv.writer: writer du fichier de la catégorie
+        """
+        if category not in self.files:
+            f = open(f'{self.output_dir}/books/{category}.csv', 'w',
+                     newline='', encoding='utf-8')
+            writer = csv.writer(f, delimiter=';', lineterminator='\n')
+            writer.writerow(self.fields)
+            self.files[category] = (f, writer)
+        return self.files[category][1]
+
+    def write(self, book):
+        """Ajoute le livre au fichier de sa catégorie
+
+        Args:
+            book (Book): le livre à enregistrer (None est ignoré)
+        """
+        if book is None:
+            return
+        row = [getattr(book, field) for field in self.fields]
+        with self.lock, stage_metrics.timer('save'):
+            self.get_writer(book.category).writerow(row)
+            self.nb_book += 1
+            self.nb_pending += 1
+            if self.nb_pending >= self.flush_every:
+                self.flush()
+
+    def flush(self):
+        """Vide les écritures en attente de tous les fichiers sur le disque
+        """
+        for f, _writer in self.files.values():
+            f.flush()
+        self.nb_pending = 0
+
+    def close(self):
+        """Vide et ferme tous les fichiers
+
+        Returns:
+            int: nombre de livres enregistrés
+        """
+        with self.lock:
+            for f, _writer in self.files.values():
+                f.close()
+            self.files = {}
+        return self.nb_book
+
+class ArrowBookSink():
+    """Enregistre les livres dans un unique jeu de données parquet ou feather partitionné par
+    catégorie ({output_dir}/books/category={category}/part-0.{format}), les colonnes sont typées
+    et les livres sont écrits par lots de {batch_size} sous forme de RecordBatch Arrow
+    """
+    EXTENSIONS = {'parquet': 'parquet', 'feather': 'feather'}
+
+    def __init__(self, output_dir, fmt='parquet', batch_size=1000, image_path=False):
+        import pyarrow as pa #dépendance optionnelle, uniquement pour ces formats
+        self.pa = pa
+        self.output_dir = output_dir
+        self.format = fmt
+        self.batch_size = max(1, batch_size)
+        self.schema = pa.schema([
+            ('product_page_url', pa.string()),
+            ('universal_product_code', pa.string()),
+            ('title', pa.string()),
+            ('price_including_tax', pa.float64()),
+            ('price_excluding_tax', pa.float64()),
+            ('number_available', pa.int32()),
+            ('product_description', pa.string()),
+            ('review_rating', pa.int8()),
+            ('image_url', pa.string()),
+        ])
+        if image_path:
+            self.schema = self.schema.append(pa.field(IMAGE_PATH_FIELD, pa.string()))
+        self.columns = {} #colonnes en attente d'écriture {category: {champ: [valeurs]}}
+        self.writers = {} #fichier ouvert de chaque catégorie {category: writer}
+        self.lock = threading.Lock()
+        self.nb_book = 0
+        self.nb_pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_writer(self, category):
+        """Renvoie le writer du fichier de la catégorie, le fichier est créé au premier appel
+
+        Args:
+            category (str): catégorie des livres
+
+        Returns:
+            pyarrow.parquet.ParquetWriter | pyarrow.ipc.RecordBatchFileWriter: writer
+        """
+        if category not in self.writers:
+            partition_dir = f'{self.output_dir}/books/category={category}'
+            os.makedirs(partition_dir, exist_ok=True)
+            path = f'{partition_dir}/part-0.{self.EXTENSIONS[self.format]}'
+            if self.format == 'parquet':
+                import pyarrow.parquet as pq
+                self.writers[category] = pq.ParquetWriter(path, self.schema)
+            else:
+                import pyarrow.ipc as ipc
+                self.writers[category] = ipc.new_file(path, self.schema)
+        return self.writers[category]
+
+    def write(self, book):
+        """Ajoute le livre au lot de sa catégorie
+
+        Args:
+            book (Book): le livre à enregistrer (None est ignoré)
+        """
+        if book is None:
+            return
+        with self.lock, stage_metrics.timer('save'):
+            columns = self.columns.setdefault(book.category,
+                                              {name: [] for name in self.schema.names})
+            for name in self.schema.names:
+                columns[name].append(getattr(book, name))
+            self.nb_book += 1
+            self.nb_pending += 1
+            if self.nb_pending >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """Écrit les lots en attente de chaque catégorie
+        """
+        for category, columns in self.columns.items():
+            batch = self.pa.RecordBatch.from_pydict(columns, schema=self.schema)
+            writer = self.get_writer(category)
+            if self.format == 'parquet':
+                writer.write_batch(batch)
+            else:
+                writer.write(batch)
+        self.columns = {}
+        self.nb_pending = 0
+
+    def close(self):
+        """Écrit les derniers lots et ferme tous les fichiers
+
+        Returns:
+            int: nombre de livres enregistrés
+        """
+        with self.lock:
+            try:
+                self.flush()
+            finally:
+                for writer in self.writers.values():
+                    writer.close()
+                self.writers = {}
+        return self.nb_book
+
+class MultiBookSink():
+    """Enregistre chaque livre dans plusieurs objets d'enregistrement
+    (fichiers de sortie et catalogue SQLite)
+    """
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, book):
+        """Ajoute le livre à chaque objet d'enregistrement
+
+        Args:
+            book (Book): le livre à enregistrer (None est ignoré)
+        """
+        for sink in self.sinks:
+            sink.write(book)
+
+    def close(self):
+        """Ferme tous les objets d'enregistrement
+
+        Returns:
+            int: nombre de livres enregistrés par le premier objet
+        """
+        counts = []
+        for sink in self.sinks:
+            try:
+                counts.append(sink.close())
+            except Exception as _e:
+                log_error('',sink,_e)
+                counts.append(None)
+        return counts[0] if counts else 0
+
+class FilteredBookSink():
+    """Enregistre uniquement les livres acceptés par {accept}
+    (par exemple les livres nouveaux ou modifiés)
+    """
+    def __init__(self, sink, accept):
+        self.sink = sink
+        self.accept = accept
+
+    def write(self, book):
+        """Ajoute le livre s'il est accepté
+
+        Args:
+            book (Book): le livre à enregistrer (None est ignoré)
+        """
+        if book is not None and self.accept(book):
+            self.sink.write(book)
+
+    def close(self):
+        """Ferme l'objet d'enregistrement
+
+        Returns:
+            int: nombre de livres enregistrés
+        """
+        return self.sink.close()
+
+OUTPUT_FORMATS = ('csv', 'parquet', 'feather') #formats de sortie disponibles
+
+def get_book_sink(output_dir, fmt='csv', image_path=False):
+    """Renvoie l'objet d'enregistrement des livres correspondant au format de sortie
+
+    Args:
+        output_dir (str): le répertoire de sortie
+        fmt (str, optional): format de sortie (csv, parquet ou feather). Defaults to 'csv'.
+        image_path (bool, optional): ajoute la colonne du chemin local de l'image.
+                                     Defaults to False.
+
+    Returns:
+        CsvBookSink | ArrowBookSink: objet d'enregistrement des livres
+    """
+    if fmt == 'csv':
+        fields = BOOK_FIELDS + (IMAGE_PATH_FIELD,) if image_path else BOOK_FIELDS
+        return CsvBookSink(output_dir, fields=fields)
+    return ArrowBookSink(output_dir, fmt, image_path=image_path)
+
+def save_list_book(list_book,output_dir):
+    """Enregistre la liste des livres en csv dans le répertoire spécifié
+
+    Args:
+        list_book (list[Book]): la liste de livres à enregistrer
+        output_dir (str): le répertoire de sortie
+
+    """
+    try:
+        with CsvBookSink(output_dir) as sink:
+            for book in list_book:
+                sink.write(book)
+        log_info(f"Liste de livre enregistré")
+    except Exception as _e:
+        log_error('',output_dir,_e)
+        return None
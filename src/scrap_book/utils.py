@@ -0,0 +1,92 @@
+"""Fonctions générales de conversion des champs des livres"""
+import functools
+import re
+import unicodedata
+
+from .constants import DICT_STARS
+from .logs import log_error
+
+#entier isolé (entouré d'espaces ou en début/fin de chaine), une fois les "(" supprimées
+NUMBER_PATTERN = re.compile(r'(?<!\S)(\d+)(?!\S)')
+
+@functools.lru_cache(maxsize=None)
+def get_currency_pattern():
+    """Renvoie l'expression régulière compilée des symboles monétaires (catégorie Unicode Sc,
+    équivalent de \\p{Sc}), la liste des symboles est construite une seule fois au premier appel
+
+    Returns:
+        re.Pattern: expression régulière d'un symbole monétaire
+    """
+    symbols = ''.join(c for c in map(chr, range(0x20000)) if unicodedata.category(c) == 'Sc')
+    return re.compile(f'[{re.escape(symbols)}]')
+
+def convert_price(price):
+    """Renvoie la valeur numérique d'une chaine de caractère indicant l'unité de monnaie
+    
+    Args:
+        price (string): montant financier au format string 
+                        avec la monnaie indiquée type: €, £ ou EUR, USD
+
+    Returns:
+        float: valeur en numérique (float) de la valeur d'entrée
+    """
+    try:
+        currency_unit = get_currency_pattern().search(price).group()
+        return float(price.replace(currency_unit,''))
+    except Exception as _e:
+        log_error('',price,_e)
+        return None
+
+def get_number_in_string(s):
+    """Renvoie le premier entier isolé trouvé dans une chaine de caractères,
+    l'entier peut être précédé de "(" sans espace, toutes les parenthèse ouvrante sont ignorées
+
+    Args:
+        s (string): chaine de caractère contenant au moins un entier
+
+    Returns:
+        int: le premier entier de la chaine d'entrée
+    """
+    try:
+        return int(NUMBER_PATTERN.search(s.replace('(','')).group(1))
+    except Exception as _e:
+        log_error('',s,_e)        
+        return None
+
+
+def find_specific_td_in_table(table,text_search,delta=1):
+    """Renvoie la valeur de la cellule d'un tableau sur la meme ligne :
+        si le texte recherché est un td : avec une décalage de colonne de "delta"
+        si le texte recherché est un th : on renvoie le premier td de la ligne
+
+    Args:
+        table (string): tableau dans lequel rechercher sous forme de soup de tr / td
+        text_search (string): texte titre du champs rechercher
+        delta (int, optional): décalage de colonne. Defaults to 1.
+
+    Returns:
+        string: valeur du champ rechercher si aucun champ trouver renvoi None
+    """
+    for tr in table.findAll('tr'):
+        if tr.find('th'):
+            if tr.find('th').text == text_search:
+                return  tr.find('td').text.strip()
+        else:
+            i=0
+            for td in tr.findAll('td'):
+                if td.text == text_search:
+                    return  tr.findAll('td')[i+delta].text
+                i+=1
+
+    return None
+
+def get_stars_rating(soup):
+    """Renvoi le nombre d'étoile d'un livre
+
+    Args:
+        soup (bs4.class.array): Liste des classes de la soupe d'entrée sous forme de tuple(array)
+
+    Returns:
+        int: nombre d'étoile
+    """
+    return DICT_STARS[soup[1]]
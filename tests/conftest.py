@@ -0,0 +1,75 @@
+"""Configuration des tests : le paquet est importé depuis src, un serveur http local
+sert les pages des tests qui ont besoin du réseau"""
+import hashlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+
+class PageServer():
+    """Serveur http local qui sert {pages} ({chemin: bytes}) avec un ETag et un
+    Last-Modified, répond 304 aux requêtes conditionnelles et conserve les en-têtes
+    des requêtes reçues
+    """
+    LAST_MODIFIED = 'Mon, 05 Oct 2026 10:00:00 GMT'
+
+    def __init__(self):
+        self.pages = {}
+        self.requests = [] #(chemin, en-têtes) de chaque requête reçue
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.get_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def get_handler(self):
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def send_empty(self, status, headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def do_GET(self):
+                fixture.requests.append((self.path, dict(self.headers)))
+                body = fixture.pages.get(self.path)
+                if body is None:
+                    self.send_empty(404)
+                    return
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_empty(304, [('ETag', etag)])
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', fixture.LAST_MODIFIED)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+@pytest.fixture
+def page_server():
+    server = PageServer()
+    server.thread.start()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
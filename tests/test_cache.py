@@ -0,0 +1,81 @@
+"""Tests du cache http persistant et des requêtes conditionnelles"""
+import time
+
+import pytest
+
+from scrap_book.cache import HttpCache, cached_get, get_conditional_headers
+from scrap_book.context import ScrapeContext
+from scrap_book.network import HttpClient
+
+
+@pytest.fixture
+def context(tmp_path):
+    context = ScrapeContext(HttpClient(retries=0, robots=False), HttpCache(str(tmp_path)))
+    yield context
+    context.http_cache.close()
+    context.http.close()
+
+
+def test_conditional_headers():
+    assert get_conditional_headers(None) == {}
+    assert get_conditional_headers({'ETag': '"abc"', 'Last-Modified': 'date'}) == \
+        {'If-None-Match': '"abc"', 'If-Modified-Since': 'date'}
+
+
+def test_first_request_is_stored(page_server, context):
+    page_server.pages['/page.html'] = b'<html>page</html>'
+    response = cached_get(page_server.url+'page.html', context)
+    assert response.status_code == 200
+    assert 'If-None-Match' not in page_server.requests[-1][1]
+    assert context.http_cache.stats['stored'] == 1
+    assert context.http_cache.get(page_server.url+'page.html')['ETag'] == \
+        response.headers['ETag']
+
+
+def test_not_modified_is_served_from_cache(page_server, context):
+    page_server.pages['/page.html'] = '<html>page é</html>'.encode('utf-8')
+    url = page_server.url+'page.html'
+    first = cached_get(url, context)
+    second = cached_get(url, context)
+    headers = page_server.requests[-1][1]
+    assert headers['If-None-Match'] == first.headers['ETag']
+    assert headers['If-Modified-Since'] == page_server.LAST_MODIFIED
+    assert context.http_cache.stats['hits'] == 1
+    assert second.status_code == 200
+    assert second.content == first.content
+    assert second.text == '<html>page é</html>'
+
+
+def test_modified_page_replaces_cache(page_server, context):
+    url = page_server.url+'page.html'
+    page_server.pages['/page.html'] = b'<html>v1</html>'
+    cached_get(url, context)
+    page_server.pages['/page.html'] = b'<html>v2</html>'
+    response = cached_get(url, context)
+    assert response.content == b'<html>v2</html>'
+    assert context.http_cache.stats['hits'] == 0
+    assert context.http_cache.get_response(url).content == b'<html>v2</html>'
+
+
+def test_cache_persists_between_runs(page_server, tmp_path):
+    url = page_server.url+'page.html'
+    page_server.pages['/page.html'] = b'<html>page</html>'
+    http = HttpClient(retries=0, robots=False)
+    cache = HttpCache(str(tmp_path))
+    cached_get(url, ScrapeContext(http, cache))
+    cache.close()
+    cache = HttpCache(str(tmp_path))
+    response = cached_get(url, ScrapeContext(http, cache))
+    assert cache.stats['hits'] == 1
+    assert response.content == b'<html>page</html>'
+    cache.close()
+    http.close()
+
+
+def test_eviction_by_size(tmp_path):
+    cache = HttpCache(str(tmp_path), max_size=0)
+    assert cache.get('http://site/page.html') is None
+    cache.conn.execute('INSERT INTO pages VALUES (?,?,?,?,?,?)',
+                       ('http://site/page.html', '{}', b'', 10, time.time(), time.time()))
+    stats = cache.close()
+    assert stats['evicted'] == 1
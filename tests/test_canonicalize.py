@@ -0,0 +1,57 @@
+"""Tests de la forme canonique des url des livres"""
+import pytest
+
+from scrap_book.discovery import canonicalize_url
+
+BOOK_URL = 'http://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html'
+
+
+@pytest.mark.parametrize('url', [
+    BOOK_URL,
+    'HTTP://Books.ToScrape.com/catalogue/a-light-in-the-attic_1000/index.html',
+    'http://books.toscrape.com:80/catalogue/a-light-in-the-attic_1000/index.html',
+    'http://books.toscrape.com/catalogue/category/../a-light-in-the-attic_1000/index.html',
+    'http://books.toscrape.com/catalogue/./a-light-in-the-attic_1000//index.html',
+    'http://books.toscrape.com/catalogue/a-light-in-the-attic_1000/',
+    'http://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html#description',
+    '  http://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html\n',
+])
+def test_same_book_same_url(url):
+    assert canonicalize_url(url) == BOOK_URL
+
+
+def test_port_kept_unless_default():
+    assert canonicalize_url('https://site:443/a.html') == 'https://site/a.html'
+    assert canonicalize_url('https://site:80/a.html') == 'https://site:80/a.html'
+    assert canonicalize_url('http://127.0.0.1:8000/a.html') == 'http://127.0.0.1:8000/a.html'
+
+
+def test_query_sorted():
+    assert canonicalize_url('http://site/a.html?b=2&a=1&c=') == 'http://site/a.html?a=1&b=2&c='
+
+
+def test_root_and_leading_slashes():
+    assert canonicalize_url('http://site') == 'http://site/'
+    assert canonicalize_url('http://site/') == 'http://site/'
+    assert canonicalize_url('http://site//catalogue/a.html') == 'http://site/catalogue/a.html'
+
+
+def test_distinct_books_stay_distinct():
+    assert canonicalize_url('http://site/catalogue/book-1/index.html') != \
+        canonicalize_url('http://site/catalogue/book-2/index.html')
+    assert canonicalize_url('http://site/a.html?page=1') != \
+        canonicalize_url('http://site/a.html?page=2')
+
+
+def test_list_page_urls_are_canonical():
+    from scrap_book.discovery import parse_list_page
+    page = b'''<html><body><form class="form-horizontal"><strong>2</strong> results.</form>
+<ol class="row">
+<li><article class="product_pod"><h3><a href="../../../book-1_1/index.html">1</a></h3></article></li>
+<li><article class="product_pod"><h3><a href="../../../book-2_2/">2</a></h3></article></li>
+</ol></body></html>'''
+    list_info, nb_pages = parse_list_page(
+        'http://Site:80/catalogue/category/books/travel_2/index.html', page)
+    assert [info['product_page_url'] for info in list_info] == \
+        ['http://site/catalogue/book-1_1/index.html', 'http://site/catalogue/book-2_2/index.html']
+    assert nb_pages == 1
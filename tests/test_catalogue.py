@@ -0,0 +1,94 @@
+"""Tests du catalogue SQLite : filtres et tris des requêtes, historique des exécutions"""
+import json
+
+import pytest
+
+from scrap_book.book import Book
+from scrap_book.catalogue import CatalogueStore
+from scrap_book.cli import main
+
+#(upc, titre, prix ttc, disponibles, catégorie, note)
+BOOKS = [('upc1', 'The Travel Guide', 10.0, 3, 'travel', 5),
+         ('upc2', 'Mystery at Night', 25.5, 0, 'mystery', 2),
+         ('upc3', 'Science of Stars', 40.0, 7, 'science', 4),
+         ('upc4', 'Fiction in Space', 55.0, 1, 'science-fiction', 3),
+         ('upc5', 'Travel Diaries', 18.0, 12, 'travel', 1)]
+
+
+def make_book(upc, title, price, available, category, rating):
+    return Book(f'http://site/catalogue/{upc}/index.html', upc, title, price, price-2,
+                available, 'description', category, rating, f'http://site/media/{upc}.jpg',
+                clean=False)
+
+
+@pytest.fixture
+def catalogue(tmp_path):
+    path = str(tmp_path/'catalogue.sqlite')
+    with CatalogueStore(path, 'http://site/', batch_size=2) as store:
+        for values in BOOKS:
+            store.write(make_book(*values))
+    store = CatalogueStore(path)
+    yield store
+    store.close()
+
+
+def get_upcs(books):
+    return [book.universal_product_code for book in books]
+
+
+def test_all_books_sorted_by_price(catalogue):
+    assert get_upcs(catalogue.query()) == ['upc1', 'upc5', 'upc2', 'upc3', 'upc4']
+
+
+def test_exact_categories(catalogue):
+    assert get_upcs(catalogue.query(['travel'])) == ['upc1', 'upc5']
+    assert get_upcs(catalogue.query(['travel', 'mystery'])) == ['upc1', 'upc5', 'upc2']
+    assert get_upcs(catalogue.query(['science'])) == ['upc3'] #pas de correspondance partielle
+
+
+def test_category_patterns(catalogue):
+    assert get_upcs(catalogue.query(['science*'])) == ['upc3', 'upc4']
+    assert get_upcs(catalogue.query(['myst?ry', 'travel'])) == ['upc1', 'upc5', 'upc2']
+
+
+def test_price_rating_and_availability(catalogue):
+    assert get_upcs(catalogue.query(min_price=18, max_price=40)) == ['upc5', 'upc2', 'upc3']
+    assert get_upcs(catalogue.query(min_rating=4)) == ['upc1', 'upc3']
+    assert get_upcs(catalogue.query(available=True)) == ['upc1', 'upc5', 'upc3', 'upc4']
+    assert get_upcs(catalogue.query(['travel'], max_price=15)) == ['upc1']
+
+
+def test_title_and_upc(catalogue):
+    assert get_upcs(catalogue.query(title='travel')) == ['upc1', 'upc5']
+    assert get_upcs(catalogue.query(upc='upc3')) == ['upc3']
+    assert catalogue.query(upc='inconnu') == []
+
+
+def test_sort_and_limit(catalogue):
+    assert get_upcs(catalogue.query(sort='rating', descending=True, limit=2)) == ['upc1', 'upc3']
+    assert get_upcs(catalogue.query(sort='available', limit=1)) == ['upc2']
+    assert get_upcs(catalogue.query(sort='title')) == ['upc4', 'upc2', 'upc3', 'upc1', 'upc5']
+
+
+def test_queried_books_keep_values(catalogue):
+    book = catalogue.query(upc='upc3')[0]
+    assert book.to_tuple() == make_book(*BOOKS[2]).to_tuple()
+
+
+def test_history_of_runs(tmp_path):
+    path = str(tmp_path/'catalogue.sqlite')
+    for price, available in ((10.0, 3), (12.0, 0)):
+        with CatalogueStore(path, 'http://site/') as store:
+            store.write(make_book('upc1', 'The Travel Guide', price, available, 'travel', 5))
+    with CatalogueStore(path) as store:
+        history = store.get_history('upc1')
+        assert [(entry['price_including_tax'], entry['number_available'])
+                for entry in history] == [(10.0, 3), (12.0, 0)]
+        assert store.query()[0].price_including_tax == 12.0
+        assert store.query(available=True) == []
+
+
+def test_query_command(catalogue, capsys):
+    main(['query', '--db', catalogue.path, '-c', 'Science*', '--json'])
+    rows = json.loads(capsys.readouterr().out)
+    assert [row['universal_product_code'] for row in rows] == ['upc3', 'upc4']
@@ -0,0 +1,132 @@
+"""Tests de la file de travail du mode distribué (prise, prolongation, acquittement,
+expiration des lots) et du courtier http"""
+import pytest
+import requests
+
+from scrap_book import distributed
+from scrap_book.distributed import BrokerServer, RemoteWorkQueue, WorkQueue
+
+URLS = [f'http://site/catalogue/book-{num}/index.html' for num in range(5)]
+
+
+class Clock():
+    """Horloge de test : time.time() renvoie {now}, avancée par les tests"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(distributed.time, 'time', clock.time)
+    return clock
+
+
+@pytest.fixture
+def work_queue(tmp_path):
+    work_queue = WorkQueue(str(tmp_path/'queue.sqlite'), reset=True, max_attempts=2)
+    work_queue.push(URLS)
+    yield work_queue
+    work_queue.close()
+
+
+def test_lease_distributes_each_url_once(work_queue, clock):
+    first = work_queue.lease('w1', 3)
+    second = work_queue.lease('w2', 3)
+    assert len(first) == 3
+    assert sorted(first+second) == sorted(URLS)
+    assert work_queue.lease('w3', 3) == []
+    assert work_queue.counts() == {'pending': 0, 'leased': 5, 'done': 0, 'failed': 0}
+
+
+def test_push_ignores_known_urls(work_queue):
+    work_queue.push(URLS[:2])
+    assert work_queue.counts()['pending'] == len(URLS)
+
+
+def test_ack_stores_first_result(work_queue, clock):
+    urls = work_queue.lease('w1', 2, visibility_timeout=10)
+    work_queue.ack('w1', [(urls[0], {'title': 'premier'})])
+    work_queue.ack('w2', [(urls[0], {'title': 'second'})])
+    results = work_queue.get_results()
+    assert len(results) == 1
+    assert results[0][1].title == 'premier'
+    assert work_queue.get_results(after=results[0][0]) == []
+    assert work_queue.counts()['done'] == 1
+
+
+def test_expired_lease_is_distributed_again(work_queue, clock):
+    urls = work_queue.lease('w1', 5, visibility_timeout=10)
+    clock.now += 5
+    assert work_queue.lease('w2', 5) == []
+    clock.now += 6
+    assert sorted(work_queue.lease('w2', 5)) == sorted(urls)
+
+
+def test_extend_keeps_lease(work_queue, clock):
+    urls = work_queue.lease('w1', 5, visibility_timeout=10)
+    clock.now += 8
+    work_queue.extend('w1', urls, visibility_timeout=10)
+    work_queue.extend('w2', urls, visibility_timeout=100) #le lot n'est pas à w2
+    clock.now += 8
+    assert work_queue.lease('w2', 5) == []
+    clock.now += 3
+    assert sorted(work_queue.lease('w2', 5)) == sorted(urls)
+
+
+def test_expired_lease_fails_after_max_attempts(work_queue, clock):
+    work_queue.lease('w1', 5, visibility_timeout=10)
+    clock.now += 11
+    work_queue.lease('w2', 5, visibility_timeout=10)
+    clock.now += 11
+    assert work_queue.lease('w3', 5) == []
+    assert sorted(work_queue.get_failed()) == sorted(URLS)
+
+
+def test_fail_puts_urls_back_then_marks_failed(work_queue, clock):
+    urls = work_queue.lease('w1', 1)
+    work_queue.fail('w2', urls) #le lot n'est pas à w2
+    assert work_queue.counts()['leased'] == 1
+    work_queue.fail('w1', urls)
+    assert work_queue.counts()['pending'] == 5
+    assert urls[0] in work_queue.lease('w2', 5)
+    work_queue.fail('w2', urls) #deuxième distribution (max_attempts=2)
+    assert work_queue.get_failed() == urls
+
+
+def test_is_finished(work_queue, clock):
+    assert not work_queue.is_finished()
+    work_queue.set_discovery_done()
+    urls = work_queue.lease('w1', 5)
+    assert not work_queue.is_finished()
+    work_queue.ack('w1', [(url, {'title': url}) for url in urls])
+    assert work_queue.is_finished()
+
+
+def test_queue_shared_between_connections(work_queue, tmp_path):
+    other = WorkQueue(work_queue.path)
+    urls = other.lease('w1', 5)
+    assert sorted(urls) == sorted(URLS)
+    assert work_queue.counts()['leased'] == 5
+    other.close()
+
+
+def test_broker_requires_token(work_queue):
+    with pytest.raises(ValueError):
+        BrokerServer(work_queue, '', port=0)
+    broker = BrokerServer(work_queue, 'secret', port=0)
+    broker.start()
+    try:
+        assert broker.server.server_address[0] == '127.0.0.1'
+        url = 'http://127.0.0.1:%d' % broker.server.server_address[1]
+        with pytest.raises(requests.HTTPError):
+            RemoteWorkQueue(url, 'mauvais').counts()
+        remote = RemoteWorkQueue(url, 'secret')
+        assert sorted(remote.lease('w1', 5)) == sorted(URLS)
+        assert remote.counts()['leased'] == 5
+        remote.close()
+    finally:
+        broker.close(grace=0)
@@ -0,0 +1,88 @@
+"""Tests du journal de reprise d'une exécution interrompue"""
+from scrap_book.book import Book
+from scrap_book.journal import CrawlJournal
+
+
+def make_book(num):
+    return Book(f'http://site/catalogue/book-{num}/index.html', f'upc{num}', f'Book {num}',
+                12.5, 10.0, 3, 'description', 'travel', 4,
+                f'http://site/media/{num}.jpg', clean=False)
+
+
+def make_info(num):
+    return {'url': f'http://site/catalogue/book-{num}/index.html'}
+
+
+def test_new_run_starts_empty(tmp_path):
+    path = str(tmp_path/'journal.jsonl')
+    journal = CrawlJournal(path)
+    journal.add_book(make_book(1))
+    journal.close()
+    journal = CrawlJournal(path) #sans reprise, le journal précédent est remplacé
+    journal.close()
+    journal = CrawlJournal(path, resume=True)
+    assert journal.done_url == set()
+    assert list(journal.iter_books()) == []
+    journal.close()
+
+
+def test_resume_interrupted_run(tmp_path):
+    path = str(tmp_path/'journal.jsonl')
+    journal = CrawlJournal(path)
+    discovered = list(journal.iter_discovered(iter([[make_info(1), make_info(2)],
+                                                    [make_info(3)]])))
+    assert discovered == [make_info(1), make_info(2), make_info(3)]
+    journal.add_book(make_book(1))
+    journal.add_book(None)
+    journal.add_image('http://site/media/1.jpg')
+    journal.close()
+
+    journal = CrawlJournal(path, resume=True)
+    assert journal.discovery_done
+    assert journal.nb_discovered == 3
+    assert journal.done_url == {make_book(1).product_page_url}
+    assert journal.images == {'http://site/media/1.jpg'}
+    assert list(journal.iter_previous_discovered()) == discovered
+    assert [book.to_tuple() for book in journal.iter_books()] == [make_book(1).to_tuple()]
+    journal.close()
+
+
+def test_resume_interrupted_discovery(tmp_path):
+    path = str(tmp_path/'journal.jsonl')
+    journal = CrawlJournal(path)
+    journal.add_discovered([make_info(1)])
+    journal.close()
+    journal = CrawlJournal(path, resume=True)
+    assert not journal.discovery_done
+    assert journal.nb_discovered == 1
+    journal.close()
+
+
+def test_resume_ignores_incomplete_last_line(tmp_path):
+    path = str(tmp_path/'journal.jsonl')
+    journal = CrawlJournal(path)
+    journal.add_book(make_book(1))
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"type": "book", "book": {"product_pa') #arrêt pendant l'écriture
+    journal = CrawlJournal(path, resume=True)
+    assert journal.done_url == {make_book(1).product_page_url}
+    journal.close()
+
+
+def test_resume_rereads_only_previous_run(tmp_path):
+    path = str(tmp_path/'journal.jsonl')
+    journal = CrawlJournal(path)
+    journal.add_book(make_book(1))
+    journal.close()
+    journal = CrawlJournal(path, resume=True)
+    #les livres enregistrés par la reprise ne sont pas relus comme livres précédents
+    journal.add_book(make_book(2))
+    journal.add_book(make_book(1))
+    assert [book.universal_product_code for book in journal.iter_books()] == ['upc1']
+    journal.close()
+
+    journal = CrawlJournal(path, resume=True)
+    assert journal.done_url == {make_book(1).product_page_url, make_book(2).product_page_url}
+    assert [book.universal_product_code for book in journal.iter_books()] == ['upc1', 'upc2']
+    journal.close()
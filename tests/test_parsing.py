@@ -0,0 +1,54 @@
+"""Tests des analyseurs de pages livres : lxml et bs4 doivent donner le même livre"""
+import os
+
+import pytest
+
+from scrap_book.parsing import BOOK_PARSERS, parse_book_bs4, parse_book_lxml
+
+BOOK_URL = 'http://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html'
+
+
+@pytest.fixture(scope='module')
+def page():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'book.html')
+    with open(path, 'rb') as f:
+        #comme requests pour books.toscrape.com (pas de charset dans l'en-tête Content-Type)
+        return f.read().decode('iso-8859-1')
+
+
+def test_parsers_parity(page):
+    assert parse_book_lxml(BOOK_URL, page).to_tuple() == \
+        parse_book_bs4(BOOK_URL, page).to_tuple()
+
+
+def test_parsers_parity_raw(page):
+    #bs4 ne garde pas les noeuds texte vides entre les balises : les valeurs brutes peuvent
+    #différer par leurs espaces, les livres nettoyés ensuite doivent être identiques
+    book_lxml = parse_book_lxml(BOOK_URL, page, clean=False)
+    book_bs4 = parse_book_bs4(BOOK_URL, page, clean=False)
+    assert book_lxml.category.strip() == book_bs4.category.strip()
+    book_lxml.transform_clean_book()
+    book_bs4.transform_clean_book()
+    assert book_lxml.to_tuple() == book_bs4.to_tuple()
+
+
+@pytest.mark.parametrize('parser_name', sorted(BOOK_PARSERS))
+def test_parsed_values(page, parser_name):
+    book = BOOK_PARSERS[parser_name](BOOK_URL, page)
+    assert book.universal_product_code == 'a897fe39b1053632'
+    assert book.title == 'A Light in the Attic'
+    assert book.price_including_tax == 51.77
+    assert book.price_excluding_tax == 51.77
+    assert book.number_available == 22
+    assert book.category == 'poetry'
+    assert book.review_rating == 3
+    assert book.image_url == \
+        'http://books.toscrape.com/media/cache/fe/72/fe72f0532301ec28892ae79a629a293c.jpg'
+    assert book.product_description.startswith("It's hard to imagine a world")
+
+
+def test_raw_book_cleaned_later(page):
+    book = parse_book_lxml(BOOK_URL, page, clean=False)
+    assert book.number_available == 'In stock (22 available)'
+    book.transform_clean_book()
+    assert book.to_tuple() == parse_book_lxml(BOOK_URL, page).to_tuple()